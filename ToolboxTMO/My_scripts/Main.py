@@ -88,23 +88,29 @@ meta_path = os.path.join(cf_path, "nom_meta.txt")
 
 
 ##### Ouverture image et sauvegarde métadonnées
-image_metadata = OpenGDAL(im_NY, meta_path)
+# Pool mémorisant les lectures brutes (1 Go) : la lecture normalisée ci-dessous en est déduite
+read_pool = tools_open.DatasetPool(max_read_bytes=1024 ** 3)
+image_metadata = OpenGDAL(im_NY, meta_path, pool=read_pool)
 
 ##### Récupérer la matrice correspondant à l'image
 pixel_matrix = image_metadata.get_pixel_matrix(normalize=False)
+# La vue normalisée est déduite de la lecture brute mémorisée par read_pool, sans seconde lecture du fichier
 ps = image_metadata.get_pixel_matrix(normalize=True)
 
 ####### Enregistre l'image de base dans le fichier Created_files avec les métadonnées intégrés
-CreateImageFromDetails(pixel_matrix, meta_path, 'image_originale').create_image()
+# Les détails sont repris directement de l'objet OpenGDAL, sans relire le fichier texte
+CreateImageFromDetails(pixel_matrix, image_metadata, 'image_originale').create_image()
 
 
 ### Appliquer fonction Gamma et enregistrer Image
-mat_mod2 = GammaTMO(pixel_matrix, gamma=2.2, metadata_file=meta_path).apply_correction()
-CreateImageFromDetails(mat_mod2, meta_path, 'image_Gamma_TMO').create_image()
+gamma_tmo = GammaTMO(pixel_matrix, gamma=2.2, metadata_file=meta_path, image_key=im_NY)
+mat_mod2 = gamma_tmo.apply_correction()
+CreateImageFromDetails(mat_mod2, image_metadata, 'image_Gamma_TMO').create_image()
 
 ### Appliquer fonction Gamma Inverse et enregistrer l'image
-mat_mod3 = GammaInvTMO(mat_mod2, metadata_file=meta_path).apply_inverse_correction()
-CreateImageFromDetails(mat_mod3, meta_path, 'image_Gamma_Inv_TMO').create_image()
+# Le gamma est celui de l'exécution précédente (run_id), et non le dernier enregistré dans le registre
+mat_mod3 = GammaInvTMO(mat_mod2, metadata_file=meta_path, run_id=gamma_tmo.run_id).apply_inverse_correction()
+CreateImageFromDetails(mat_mod3, image_metadata, 'image_Gamma_Inv_TMO').create_image()
 
 
 
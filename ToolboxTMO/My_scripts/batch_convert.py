@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Feb 17 10:12:44 2025
+
+@author: ablot
+
+Conversion par lots : ouverture -> TMO -> sauvegarde, pour un dossier ou un motif glob d'images.
+
+Exemple :
+    python batch_convert.py "D:/scenes/*.tif" --pipeline "gamma:gamma=2.2" --output-dir D:/sorties --workers 8
+    python batch_convert.py D:/scenes --pipeline "mantiuk:contrast_scaling=0.8,detail_amplification=1.2" --bands TCI
+"""
+########################### Import des modules ##################################
+import argparse
+import ast
+import glob
+import json
+import os
+import importlib.util
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# Définir les chemins des dossiers contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_script_dir)
+tools_dir = os.path.join(parent_dir, 'tools')
+tmo_dir = os.path.join(parent_dir, 'TMO')
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+
+############# ajouter les outils nécessaires ici
+tools_open = import_dynamic("open", os.path.join(tools_dir, 'open.py'))
+tools_save = import_dynamic("save", os.path.join(tools_dir, 'save.py'))
+
+############# ajouter les TMO nécessaires ici ##############################
+tmo_mantiuk = import_dynamic("Mantiuk", os.path.join(tmo_dir, 'Mantiuk.py'))
+tmo_gamma = import_dynamic("Gamma", os.path.join(tmo_dir, 'Gamma.py'))
+tmo_gamma_inv = import_dynamic("Gamma_Inv", os.path.join(tmo_dir, 'Gamma_Inverse.py'))
+tmo_drago = import_dynamic("Drago", os.path.join(tmo_dir, 'Drago.py'))
+
+OpenGDAL = tools_open.OpenGDAL
+CreateImageFromDetails = tools_save.CreateImageFromDetails
+
+# Étapes disponibles dans un pipeline : nom -> (classe du TMO, méthode à appeler)
+TMO_REGISTRY = {
+    "gamma": (tmo_gamma.GammaTMO, "apply_correction"),
+    "gamma_inverse": (tmo_gamma_inv.GammaInverseTMO, "apply_inverse_correction"),
+    "mantiuk": (tmo_mantiuk.MantiukTMO, "tone_map"),
+    "drago": (tmo_drago.DragoTMO, "tone_map"),
+}
+
+# Étapes inverses : nom -> étape directe dont elles reprennent l'exécution (run_id)
+INVERSE_STEPS = {"gamma_inverse": "gamma"}
+
+# Nom du journal de reprise, écrit dans le dossier de sortie
+JOURNAL_NAME = "batch_journal.jsonl"
+
+# Extensions d'images recherchées lorsqu'un dossier est fourni
+IMAGE_EXTENSIONS = (".tif", ".tiff", ".jp2", ".png")
+
+
+################################ Pipeline ##########################
+
+def _parse_value(value):
+    """
+    Convertit une valeur de paramètre texte en nombre, booléen, tuple... si possible.
+    """
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_pipeline(spec):
+    """
+    Analyse la description d'un pipeline de TMO.
+    Format : "tmo1:param=valeur,param=valeur+tmo2:param=valeur".
+    :param spec: Description textuelle du pipeline.
+    :return: Liste de tuples (nom du TMO, dictionnaire de paramètres).
+    """
+    steps = []
+    for step in spec.split("+"):
+        name, _, params_text = step.strip().partition(":")
+        name = name.strip().lower()
+        if name not in TMO_REGISTRY:
+            raise ValueError(f"TMO '{name}' inconnu. Choix possibles : {list(TMO_REGISTRY)}")
+        params = {}
+        # Les virgules entre parenthèses (tuples) ne séparent pas les paramètres
+        for item in filter(None, (p.strip() for p in re.split(r",(?![^()]*\))", params_text))):
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"Paramètre mal formé '{item}' (attendu : nom=valeur).")
+            params[key.strip()] = _parse_value(value.strip())
+        steps.append((name, params))
+    return steps
+
+
+def output_stem(image_path):
+    """
+    Nom de base des fichiers produits pour une image (sortie, détails, métadonnées).
+    """
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+def check_output_names(paths):
+    """
+    Vérifie que deux images ne produiront pas les mêmes fichiers dans le dossier de sortie
+    (par exemple a/scene.tif et b/scene.tif, ou scene.tif et scene.jp2).
+    :param paths: Chemins des images.
+    :raises ValueError: Si plusieurs images ont le même nom de base.
+    """
+    by_stem = {}
+    for path in paths:
+        by_stem.setdefault(output_stem(path), []).append(path)
+    collisions = {stem: names for stem, names in by_stem.items() if len(names) > 1}
+    if collisions:
+        details = "; ".join(f"{stem} : {', '.join(names)}" for stem, names in sorted(collisions.items()))
+        raise ValueError(f"Plusieurs images produiraient les mêmes fichiers de sortie ({details}). "
+                         "Traiter ces images dans des dossiers de sortie distincts.")
+
+
+def collect_inputs(inputs):
+    """
+    Liste les images à traiter à partir de dossiers et/ou de motifs glob.
+    :param inputs: Liste de chemins de dossiers, de fichiers ou de motifs glob.
+    :return: Liste triée et dédoublonnée de chemins absolus.
+    :raises ValueError: Si deux images ont le même nom de base (cf. check_output_names).
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in os.listdir(item):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.add(os.path.abspath(os.path.join(item, name)))
+        else:
+            paths.update(os.path.abspath(p) for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    paths = sorted(paths)
+    check_output_names(paths)
+    return paths
+
+
+def process_file(image_path, steps, output_dir, bands=None, normalize=False, suffix="_tmo", profile="default",
+                 cog=False):
+    """
+    Traite une image : ouverture, application des TMO du pipeline, sauvegarde.
+    Exécutée dans un processus de travail : toute erreur est capturée et retournée,
+    afin qu'un fichier défaillant n'interrompe pas le lot.
+    Chaque TMO reçoit image_key=image_path, et une étape inverse reprend le run_id de l'étape directe
+    qui la précède dans le pipeline (cf. INVERSE_STEPS).
+    :return: Dictionnaire décrivant le résultat (statut, sortie, durée, taille d'entrée, erreur).
+    """
+    start = time.perf_counter()
+    stem = output_stem(image_path)
+    record = {"path": image_path, "bytes": os.path.getsize(image_path)}
+    try:
+        details_path = os.path.join(output_dir, f"{stem}_details.txt")
+        metadata_path = os.path.join(output_dir, f"{stem}_metadata.txt")
+
+        reader = OpenGDAL(image_path, details_path)
+        pixel_matrices = reader.get_pixel_matrix(normalize=normalize, bands=bands)
+
+        run_ids = {}  # Dernière exécution de chaque étape, reprise par l'étape inverse correspondante
+        for name, params in steps:
+            tmo_class, method = TMO_REGISTRY[name]
+            params = dict(params)
+            params.setdefault("image_key", image_path)
+            if run_ids.get(INVERSE_STEPS.get(name)) is not None:
+                params.setdefault("run_id", run_ids[INVERSE_STEPS[name]])
+            tmo = tmo_class(pixel_matrices, metadata_file=metadata_path, **params)
+            pixel_matrices = getattr(tmo, method)()
+            run_ids[name] = getattr(tmo, "run_id", None)
+
+        writer = CreateImageFromDetails(pixel_matrices, reader, f"{stem}{suffix}", output_dir=output_dir,
+                                        profile=profile, cog=cog)
+        writer.create_image()
+
+        record.update(status="ok", output=writer.output_image_path)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+################################ Journal de reprise ##########################
+
+def load_completed(journal_path):
+    """
+    Lit le journal de reprise et retourne l'ensemble des images déjà traitées avec succès
+    (dont la sortie existe toujours).
+    """
+    completed = set()
+    if not os.path.exists(journal_path):
+        return completed
+    with open(journal_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ligne tronquée par un arrêt brutal
+            if record.get("status") == "ok" and os.path.exists(record.get("output", "")):
+                completed.add(record["path"])
+    return completed
+
+
+def append_journal(journal_path, record):
+    """
+    Ajoute un enregistrement au journal et force son écriture sur le disque.
+    """
+    with open(journal_path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+################################ Lot ##########################
+
+def run_batch(paths, steps, output_dir, workers=None, bands=None, normalize=False, suffix="_tmo", resume=True,
+              profile="default", cog=False):
+    """
+    Traite une liste d'images en parallèle sur un ProcessPoolExecutor.
+    :param paths: Chemins des images.
+    :param steps: Pipeline analysé par parse_pipeline.
+    :param output_dir: Dossier de sortie (images, détails, métadonnées et journal).
+    :param workers: Nombre de processus (par défaut le nombre de CPU).
+    :param bands: Sélection de bandes (cf. OpenGDAL.resolve_bands).
+    :param normalize: Normalisation des pixels à l'ouverture.
+    :param suffix: Suffixe ajouté au nom des images produites.
+    :param resume: Si True, ignore les images déjà traitées d'après le journal.
+    :param profile: Profil de création GeoTIFF des sorties (cf. save.CREATION_PROFILES).
+    :param cog: Si True, les sorties sont des Cloud-Optimized GeoTIFF avec aperçus internes.
+    :return: Dictionnaire de synthèse (nombres de fichiers, durée, débits).
+    :raises ValueError: Si deux images ont le même nom de base (cf. check_output_names).
+    """
+    check_output_names(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    journal_path = os.path.join(output_dir, JOURNAL_NAME)
+    completed = load_completed(journal_path) if resume else set()
+    todo = [path for path in paths if path not in completed]
+    print(f"{len(paths)} images trouvées, {len(paths) - len(todo)} déjà traitées, {len(todo)} à traiter.")
+
+    start = time.perf_counter()
+    succeeded, failed, processed_bytes = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_file, path, steps, output_dir, bands, normalize, suffix, profile, cog): path
+            for path in todo
+        }
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                # Processus de travail interrompu (mémoire, signal...) : seul ce fichier est en échec
+                record = {"path": futures[future], "status": "error", "error": f"{type(e).__name__}: {e}"}
+            append_journal(journal_path, record)
+
+            if record["status"] == "ok":
+                succeeded += 1
+                processed_bytes += record["bytes"]
+            else:
+                failed += 1
+                print(f"Échec pour {record['path']} : {record['error']}")
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "found": len(paths),
+        "skipped": len(paths) - len(todo),
+        "succeeded": succeeded,
+        "failed": failed,
+        "seconds": elapsed,
+        "scenes_per_minute": succeeded / elapsed * 60 if elapsed > 0 else 0.0,
+        "mb_per_second": processed_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"\nTerminé en {elapsed:.1f} s : {succeeded} réussies, {failed} en échec, "
+          f"{summary['skipped']} ignorées.")
+    print(f"Débit : {summary['scenes_per_minute']:.1f} scènes/min, {summary['mb_per_second']:.1f} Mo/s.")
+    return summary
+
+
+def main(argv=None):
+    """
+    Point d'entrée en ligne de commande.
+    """
+    parser = argparse.ArgumentParser(description="Conversion par lots ouverture -> TMO -> sauvegarde.")
+    parser.add_argument("inputs", nargs="+", help="Dossiers, fichiers ou motifs glob des images à traiter.")
+    parser.add_argument("--pipeline", required=True,
+                        help='Pipeline de TMO, ex. "gamma:gamma=2.2" ou "gamma:gamma=2.2+gamma_inverse".')
+    parser.add_argument("--output-dir", required=True, help="Dossier de sortie.")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : nombre de CPU).")
+    parser.add_argument("--bands", default=None,
+                        help='Composition ("TCI", "IRC") ou liste de bandes séparées par des virgules.')
+    parser.add_argument("--normalize", action="store_true", help="Normaliser les pixels entre 0 et 1 à l'ouverture.")
+    parser.add_argument("--suffix", default="_tmo", help="Suffixe des images produites.")
+    parser.add_argument("--profile", default="deflate", choices=list(tools_save.CREATION_PROFILES),
+                        help="Profil de création GeoTIFF des sorties (défaut : deflate).")
+    parser.add_argument("--cog", action="store_true", help="Produire des Cloud-Optimized GeoTIFF avec aperçus internes.")
+    parser.add_argument("--no-resume", action="store_true", help="Retraiter toutes les images, même déjà traitées.")
+    args = parser.parse_args(argv)
+
+    bands = tools_open.parse_bands(args.bands)
+
+    paths = collect_inputs(args.inputs)
+    steps = parse_pipeline(args.pipeline)
+    summary = run_batch(paths, steps, os.path.abspath(args.output_dir), workers=args.workers, bands=bands,
+                        normalize=args.normalize, suffix=args.suffix, resume=not args.no_resume,
+                        profile=args.profile, cog=args.cog)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
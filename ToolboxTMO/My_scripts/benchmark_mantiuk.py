@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Feb 26 09:41:18 2025
+
+@author: ablot
+
+Comparaison des deux modes du TMO de Mantiuk : par bande ("bands") et sur la luminance ("luminance").
+Mesure le temps de calcul de chaque mode, l'écart moyen entre les sorties et le décalage de teinte
+par rapport à l'image d'entrée.
+
+Exemple :
+    python benchmark_mantiuk.py                                  # scène synthétique 2048 x 2048
+    python benchmark_mantiuk.py D:/scenes/scene.tif --bands TCI --repeat 3
+"""
+########################### Import des modules ##################################
+import argparse
+import os
+import importlib.util
+import tempfile
+import time
+import numpy as np
+
+
+# Définir les chemins des dossiers contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_script_dir)
+tools_dir = os.path.join(parent_dir, 'tools')
+tmo_dir = os.path.join(parent_dir, 'TMO')
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+
+############# ajouter les TMO nécessaires ici ##############################
+tmo_mantiuk = import_dynamic("Mantiuk", os.path.join(tmo_dir, 'Mantiuk.py'))
+
+MantiukTMO = tmo_mantiuk.MantiukTMO
+
+
+################################ Mesures ##########################
+
+def synthetic_scene(size=2048, seed=0):
+    """
+    Scène RVB 16 bits synthétique : dégradé d'éclairement, zones colorées et bruit.
+    :return: Liste de trois matrices uint16.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    illumination = 200 + 20000 * x * y  # Forte dynamique entre les coins de la scène
+    tints = ((1.0, 0.6, 0.3), (0.4, 0.8, 0.5), (0.3, 0.5, 1.0))
+    bands = []
+    for b in range(3):
+        tint = np.where(x < 0.33, tints[0][b], np.where(x < 0.66, tints[1][b], tints[2][b]))
+        noise = rng.normal(1.0, 0.05, (size, size)).astype(np.float32)
+        bands.append(np.clip(illumination * tint * noise, 0, 65535).astype(np.uint16))
+    return bands
+
+
+def hue(bands):
+    """
+    Angle de teinte (radians) de chaque pixel d'une image RVB, dans le plan de chrominance.
+    """
+    r, g, b = (band.astype(np.float32) for band in bands[:3])
+    return np.arctan2(np.sqrt(3) * (g - b), 2 * r - g - b)
+
+
+def hue_shift(reference, bands):
+    """
+    Écart angulaire moyen (degrés) entre les teintes de deux images RVB.
+    """
+    difference = np.angle(np.exp(1j * (hue(bands) - hue(reference))))
+    return float(np.degrees(np.abs(difference)).mean())
+
+
+def run_mode(pixel_matrices, mode, repeat, metadata_file, **params):
+    """
+    Applique le TMO dans un mode donné et retourne (meilleur temps en secondes, sortie).
+    """
+    best, output = None, None
+    for _ in range(repeat):
+        tmo = MantiukTMO(pixel_matrices, metadata_file=metadata_file, mode=mode, **params)
+        start = time.perf_counter()
+        output = tmo.tone_map()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def benchmark(pixel_matrices, repeat=1, **params):
+    """
+    Compare les modes "bands" et "luminance" sur une même image.
+    :param pixel_matrices: Liste de matrices 2D (au moins trois bandes pour le décalage de teinte).
+    :param repeat: Nombre d'exécutions par mode (le meilleur temps est retenu).
+    :param params: Paramètres transmis à MantiukTMO (sigma, tile_size, saturation...).
+    :return: Dictionnaire des mesures.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        metadata_file = os.path.join(tmp, "metadata.txt")
+        bands_time, bands_output = run_mode(pixel_matrices, "bands", repeat, metadata_file, **params)
+        luminance_time, luminance_output = run_mode(pixel_matrices, "luminance", repeat, metadata_file, **params)
+
+    results = {
+        "bands_seconds": bands_time,
+        "luminance_seconds": luminance_time,
+        "speedup": bands_time / luminance_time if luminance_time > 0 else float("inf"),
+        "mean_abs_difference": float(np.mean([
+            np.abs(a.astype(np.int16) - b.astype(np.int16)).mean() for a, b in zip(bands_output, luminance_output)
+        ])),
+    }
+    if len(pixel_matrices) >= 3:
+        results["bands_hue_shift"] = hue_shift(pixel_matrices, bands_output)
+        results["luminance_hue_shift"] = hue_shift(pixel_matrices, luminance_output)
+    return results
+
+
+def main(argv=None):
+    """
+    Point d'entrée en ligne de commande.
+    """
+    parser = argparse.ArgumentParser(description="Comparaison des modes par bande et luminance du TMO de Mantiuk.")
+    parser.add_argument("image", nargs="?", default=None, help="Image à traiter (défaut : scène synthétique).")
+    parser.add_argument("--bands", default=None,
+                        help='Composition ("TCI", "IRC") ou liste de bandes séparées par des virgules.')
+    parser.add_argument("--size", type=int, default=2048, help="Côté de la scène synthétique.")
+    parser.add_argument("--sigma", type=float, default=30, help="Écart-type du filtre gaussien.")
+    parser.add_argument("--base-filter", default="exact", help="Filtre de base (cf. base_filters.BASE_FILTERS).")
+    parser.add_argument("--tile-size", type=int, default=None, help="Taille des tuiles (défaut : image entière).")
+    parser.add_argument("--saturation", type=float, default=1.0, help="Exposant des rapports de couleur.")
+    parser.add_argument("--repeat", type=int, default=1, help="Nombre d'exécutions par mode.")
+    args = parser.parse_args(argv)
+
+    if args.image:
+        tools_open = import_dynamic("open", os.path.join(tools_dir, 'open.py'))
+        bands = tools_open.parse_bands(args.bands)  # "TCI", "B4,B3,B2" ou "4,3,2"
+        with tempfile.TemporaryDirectory() as tmp:
+            reader = tools_open.OpenGDAL(args.image, os.path.join(tmp, "details.txt"))
+            pixel_matrices = reader.get_pixel_matrix(bands=bands)
+    else:
+        pixel_matrices = synthetic_scene(args.size)
+
+    results = benchmark(pixel_matrices, repeat=args.repeat, sigma=args.sigma, base_filter=args.base_filter,
+                        tile_size=args.tile_size, saturation=args.saturation)
+
+    print(f"\nMode par bande : {results['bands_seconds']:.2f} s")
+    print(f"Mode luminance : {results['luminance_seconds']:.2f} s (x{results['speedup']:.2f})")
+    print(f"Écart moyen entre les sorties : {results['mean_abs_difference']:.2f} niveaux")
+    if "bands_hue_shift" in results:
+        print(f"Décalage de teinte moyen : {results['bands_hue_shift']:.2f}° par bande, "
+              f"{results['luminance_hue_shift']:.2f}° en luminance")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
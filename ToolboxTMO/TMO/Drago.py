@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Feb 24 10:17:05 2025
+
+@author: ablot
+"""
+############################## Import des librairies nécessaires #####################
+import numpy as np
+
+import os
+import importlib.util
+
+# Définir les chemins des dossiers contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_script_dir)
+tools_dir = os.path.join(parent_dir, 'tools')
+
+# Vérification des chemins
+print(f"Chemin du script actuel : {current_script_dir}")
+print(f"Chemin vers tools : {tools_dir}")
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+############# ajouter les outils nécessaires ici
+# Importer les modules depuis 'tools'
+tools_meta = import_dynamic("modif_meta", os.path.join(tools_dir, 'modif_metadata.py'))
+tools_tiling = import_dynamic("tiling", os.path.join(tools_dir, 'tiling.py'))
+tools_lut = import_dynamic("lut", os.path.join(tools_dir, 'lut.py'))
+tools_parallel = import_dynamic("parallel", os.path.join(tools_dir, 'parallel.py'))
+tools_statistics = import_dynamic("statistics", os.path.join(tools_dir, 'statistics.py'))
+tools_runs = import_dynamic("run_store", os.path.join(tools_dir, 'run_store.py'))
+tools_scratch = import_dynamic("scratch", os.path.join(tools_dir, 'scratch.py'))
+
+# Importer les classes et fonctions nécessaires des modules
+MetadataLogger = tools_meta.MetadataLogger
+iter_windows = tools_tiling.iter_windows
+apply_lut = tools_lut.apply_lut
+compile_lut = tools_lut.compile_lut
+apply_table = tools_lut.apply_table
+supports_lut = tools_lut.supports_lut
+register_lut_operator = tools_lut.register_lut_operator
+run_tasks = tools_parallel.run_tasks
+BandStatistics = tools_statistics.BandStatistics
+open_run_store = tools_runs.open_run_store
+open_scratch = tools_scratch.open_scratch
+SCRATCH_STRIP_ROWS = tools_scratch.SCRATCH_STRIP_ROWS
+
+# Décalage évitant log(0) dans le calcul de la moyenne logarithmique
+LOG_DELTA = 1e-4
+
+# Table de la base logarithmique adaptative, indexée par l'exposant et les premiers bits de mantisse
+# du rapport L / Lmax en float32 : LOG_BASE_STEPS pas par octave, sur LOG_BASE_OCTAVES octaves
+# (rapports de 2^-63 à 2, soit 65536 entrées, indexées comme une table uint16)
+LOG_BASE_MANTISSA_BITS = 10
+LOG_BASE_STEPS = 1 << LOG_BASE_MANTISSA_BITS
+LOG_BASE_OCTAVES = 64
+
+# Exposant float32 (biaisé) de la première octave de la table
+LOG_BASE_FIRST_EXPONENT = 127 - (LOG_BASE_OCTAVES - 1)
+
+def drago_curve(luminance, log_average, l_max, bias=0.85, exposure=1.0):
+    """
+    Courbe de Drago et al. (2003) : compression logarithmique dont la base varie de 2 à 10
+    selon la luminance relative, contrôlée par le paramètre de biais.
+    :param luminance: Luminances (tableau flottant).
+    :param log_average: Moyenne logarithmique des luminances de l'image.
+    :param l_max: Luminance maximale de l'image.
+    :param bias: Biais (0.7 à 0.9 ; plus faible = plus contrasté).
+    :param exposure: Facteur d'exposition appliqué aux luminances ramenées à la moyenne logarithmique.
+    :return: Luminances d'affichage, entre 0 et 1.
+    """
+    scale = np.float32(exposure / log_average)
+    world = luminance * scale
+    world_max = np.float32(l_max * scale)
+    bias_power = np.float32(np.log(bias) / np.log(0.5))
+    divider = np.float32(np.log10(world_max + 1))
+    adaptive_base = np.log(2 + 8 * np.power(world / world_max, bias_power))
+    return np.log1p(world) / adaptive_base / divider
+
+
+@register_lut_operator("log_offset")
+def _log_offset_table(values, out_dtype, offset):
+    """
+    Logarithme log(offset + x) utilisé pour la moyenne logarithmique de DragoTMO.
+    """
+    return np.log(values.astype(np.float32) + np.float32(offset)).astype(out_dtype)
+
+
+@register_lut_operator("drago_log_base")
+def _log_base_table(values, out_dtype, bias):
+    """
+    Base logarithmique adaptative log(2 + 8 r^p) de Drago (p = log(bias) / log(0.5)), tabulée sur le rapport
+    r = L / Lmax : l'entrée i correspond au milieu du pas i % LOG_BASE_STEPS de l'octave i // LOG_BASE_STEPS
+    (cf. log_base_index). La table ne dépend que du biais : elle est partagée par toutes les images,
+    par le cache de compile_lut.
+    """
+    octave, step = np.divmod(values.astype(np.int64), LOG_BASE_STEPS)
+    ratio = (1 + (step + 0.5) / LOG_BASE_STEPS) * np.exp2(octave + LOG_BASE_FIRST_EXPONENT - 127)
+    bias_power = np.log(bias) / np.log(0.5)
+    return np.log(2 + 8 * np.power(ratio, bias_power)).astype(out_dtype)
+
+
+def log_base_index(ratio):
+    """
+    Index des rapports r = L / Lmax dans la table "drago_log_base" : exposant et LOG_BASE_MANTISSA_BITS
+    premiers bits de mantisse, lus dans la représentation binaire des float32 (écart relatif sur r d'au plus
+    1 / (2 LOG_BASE_STEPS)). Les rapports inférieurs à la première octave, et 0, sont ramenés à l'entrée 0.
+    :param ratio: Tableau float32 contigu des rapports.
+    :return: Tableau d'index int32.
+    """
+    index = ratio.view(np.int32) >> (23 - LOG_BASE_MANTISSA_BITS)
+    index -= LOG_BASE_FIRST_EXPONENT << LOG_BASE_MANTISSA_BITS
+    return np.clip(index, 0, LOG_BASE_OCTAVES * LOG_BASE_STEPS - 1, out=index)
+
+
+###################################  Classe ##############################
+
+class DragoTMO:
+    def __init__(self, pixel_matrices, bias=0.85, exposure=1.0, metadata_file="metadata.txt", tile_size=None,
+                 n_workers=1, metadata_logger=None, run_store=None, image_key=None, scratch=None):
+        """
+        Initialise le Tone Mapping Operator (TMO) logarithmique adaptatif de Drago.
+        :param pixel_matrices: Une matrice (2D) ou une liste de matrices (pour plusieurs bandes).
+                               Peut valoir None pour un traitement en flux (cf. tone_map_blocks).
+        :param bias: Paramètre de biais de la base logarithmique adaptative (0.7 à 0.9, 0.85 par défaut).
+        :param exposure: Facteur d'exposition (1 par défaut).
+        :param metadata_file: Le chemin vers le fichier où les métadonnées seront enregistrées.
+        :param tile_size: Si renseigné, statistiques et courbe calculées par tuiles (entier ou tuple
+                          (largeur, hauteur)). Les moyennes partielles sont fusionnées (formule de Chan) :
+                          la moyenne logarithmique peut différer du calcul global au dernier bit près,
+                          soit au plus un niveau sur la sortie.
+        :param n_workers: Nombre de threads utilisés pour traiter les bandes (ou les tuiles) en parallèle.
+        :param metadata_logger: Journal de métadonnées à utiliser ; par défaut un MetadataLogger sur metadata_file.
+        :param run_store: Registre des paramètres d'exécution (RunParameterStore ou chemin SQLite) ;
+                          par défaut la base "<metadata_file>_runs.sqlite", créée à la première exécution ;
+                          False pour ne pas enregistrer les exécutions.
+        :param image_key: Clé de l'image traitée (par exemple son chemin), enregistrée avec les paramètres.
+        :param scratch: Espace de travail sur disque (ScratchSpace, chemin d'un dossier ou True) : les matrices
+                        de sortie sont alors des numpy.memmap, et le traitement est fait par bandes de lignes
+                        si aucune taille de tuile n'est donnée.
+        """
+        pixel_matrices = [] if pixel_matrices is None else pixel_matrices
+        self.single_input = not isinstance(pixel_matrices, list)  # Vrai si l'entrée est une matrice unique
+        self.pixel_matrices = pixel_matrices if isinstance(pixel_matrices, list) else [pixel_matrices]
+        self.bias = bias
+        self.exposure = exposure
+        self.tile_size = tile_size
+        self.n_workers = n_workers
+        self.metadata_logger = metadata_logger if metadata_logger else MetadataLogger(metadata_file)
+        self.run_store = open_run_store(run_store, metadata_file)
+        self.image_key = image_key
+        self.scratch = open_scratch(scratch)
+        self.run_id = None  # Identifiant de la dernière exécution, renseigné par tone_map
+        self.band_statistics = []  # (moyenne logarithmique, maximum) de chaque bande traitée
+
+        # Enregistrer l'initialisation de la classe dans les métadonnées
+        self.metadata_logger.log_class_usage(
+            class_name=self.__class__.__name__,
+            pixel_matrices_shape=[matrix.shape for matrix in self.pixel_matrices],
+            bias=self.bias,
+            exposure=self.exposure
+        )
+
+    @staticmethod
+    def _log_luminance(matrix):
+        """
+        Log-luminance log(LOG_DELTA + L), lue dans une table pour une entrée entière.
+        """
+        if supports_lut(matrix.dtype):
+            return apply_lut(matrix, "log_offset", np.float32, offset=LOG_DELTA)
+        return np.log(matrix.astype(np.float32, copy=False) + np.float32(LOG_DELTA))
+
+    @staticmethod
+    def _new_statistics():
+        """
+        Accumulateur des statistiques de log-luminance, sans histogramme : seuls la moyenne
+        et le maximum sont utilisés.
+        """
+        return BandStatistics(histogram=False)
+
+    @staticmethod
+    def _global_parameters(statistics, band):
+        """
+        Moyenne logarithmique et maximum d'une bande à partir des statistiques de ses log-luminances.
+        """
+        log_average = float(np.exp(statistics.mean[band]))
+        l_max = max(float(np.exp(statistics.maximum[band])) - LOG_DELTA, LOG_DELTA)
+        return log_average, l_max
+
+    def _display(self, luminance, log_average, l_max):
+        """
+        Courbe de Drago convertie en 8 bits. La base adaptative est lue dans la table du biais
+        (cf. _log_base_table) ; la mise à l'échelle propre à l'image (moyenne logarithmique, maximum,
+        exposition) est calculée hors de la table. Écart d'au plus un niveau avec drago_curve.
+        :param luminance: Luminances float32.
+        """
+        scale = np.float32(self.exposure / log_average)
+        divider = np.float32(np.log10(l_max * scale + 1))
+        table = compile_lut("drago_log_base", np.uint16, np.float32, bias=self.bias)
+        adaptive_base = table[log_base_index(luminance * np.float32(1 / l_max))]
+
+        display = np.log1p(luminance * scale)
+        display /= adaptive_base
+        display /= divider
+        display *= 255
+        return display.clip(0, 255).astype(np.uint8)
+
+    def _curve_table(self, dtype, log_average, l_max):
+        """
+        Pour une entrée entière, courbe évaluée une fois sur toutes les valeurs possibles du type
+        (table propre à l'image, non conservée dans le cache des LUT) ; None pour une entrée flottante.
+        """
+        if not supports_lut(dtype):
+            return None
+        return self._display(np.arange(np.iinfo(dtype).max + 1, dtype=np.float32), log_average, l_max)
+
+    def _map(self, matrix, log_average, l_max, table=None):
+        """
+        Applique la courbe de Drago à une matrice (ou tuile) et convertit en 8 bits.
+        :param table: Table de la courbe pour une entrée entière (cf. _curve_table).
+        """
+        if table is not None:
+            return apply_table(matrix, table)
+        return self._display(matrix.astype(np.float32, copy=False), log_average, l_max)
+
+    def _tile_size_for(self, matrix):
+        """
+        Taille de tuile à utiliser : celle de l'instance, des bandes de lignes avec un espace de travail
+        sur disque, sinon None (traitement global).
+        """
+        if self.tile_size:
+            return self.tile_size
+        if self.scratch:
+            return (matrix.shape[1], SCRATCH_STRIP_ROWS)
+        return None
+
+    def _tone_map_matrix(self, matrix):
+        """
+        Applique le TMO à une bande complète : une passe de statistiques (moyenne logarithmique et maximum),
+        puis application de la courbe, globalement ou par tuiles.
+        :param matrix: Matrice 2D.
+        :return: Matrice uint8 tonemappée.
+        """
+        tile_size = self._tile_size_for(matrix)
+        statistics = self._new_statistics()
+        if not tile_size:
+            log_average, l_max = self._global_parameters(statistics.update(self._log_luminance(matrix)), 0)
+            self.band_statistics.append((log_average, l_max))
+            return self._map(matrix, log_average, l_max, self._curve_table(matrix.dtype, log_average, l_max))
+
+        height, width = matrix.shape
+        windows = list(iter_windows(width, height, tile_size))
+
+        # Passe 1 : statistiques par tuile, fusionnées
+        partials = run_tasks(lambda window: self._new_statistics().update(self._log_luminance(matrix[window.slices()])),
+                             [(window,) for window in windows], self.n_workers)
+        for partial in partials:
+            statistics.merge(partial)
+        log_average, l_max = self._global_parameters(statistics, 0)
+        self.band_statistics.append((log_average, l_max))
+        table = self._curve_table(matrix.dtype, log_average, l_max)
+
+        # Passe 2 : application de la courbe, tuile par tuile
+        tone_mapped = self.scratch.empty((height, width), np.uint8) if self.scratch \
+            else np.empty((height, width), dtype=np.uint8)
+
+        def map_tile(window):
+            tone_mapped[window.slices()] = self._map(matrix[window.slices()], log_average, l_max, table)
+
+        run_tasks(map_tile, [(window,) for window in windows], self.n_workers)
+        return tone_mapped
+
+    def _run_parameters(self):
+        """
+        Paramètres de l'exécution enregistrés dans le registre des exécutions.
+        """
+        return {
+            "bias": self.bias,
+            "exposure": self.exposure,
+            "tile_size": self.tile_size,
+            "log_average": [log_average for log_average, _ in self.band_statistics],
+            "l_max": [l_max for _, l_max in self.band_statistics],
+        }
+
+    def tone_map(self):
+        """
+        Applique le Tone Mapping Operator (TMO) de Drago à chaque matrice de pixels.
+        :return: Une matrice (2D) ou une liste de matrices tonemappées (uint8).
+        """
+        self.band_statistics = []
+        # Bandes traitées l'une après l'autre (leurs tuiles en parallèle) : statistiques dans l'ordre des bandes
+        processed_matrices = [self._tone_map_matrix(matrix) for matrix in self.pixel_matrices]
+
+        # Enregistrer l'appel de la méthode dans les métadonnées
+        self.metadata_logger.log_function_call(
+            func_name="tone_map",
+            input_shapes=[matrix.shape for matrix in self.pixel_matrices],
+            bias=self.bias,
+            exposure=self.exposure,
+            tile_size=self.tile_size,
+            output_shapes=[matrix.shape for matrix in processed_matrices]
+        )
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(self.__class__.__name__, self._run_parameters(),
+                                                    image_key=self.image_key)
+
+        # Retourner une matrice unique si l'entrée était une matrice unique, sinon une liste
+        return processed_matrices[0] if self.single_input else processed_matrices
+
+    def tone_map_blocks(self, reader, tile_size=None, normalize=False):
+        """
+        Applique le TMO en flux sur une image ouverte avec OpenGDAL, sans la charger entièrement.
+        Une première passe sur les blocs calcule les statistiques de chaque bande, une seconde
+        produit les tuiles tonemappées (à un niveau près du traitement global, cf. tile_size).
+        :param reader: Objet OpenGDAL de l'image à traiter.
+        :param tile_size: Taille des tuiles (par défaut celle de l'instance, sinon celle de OpenGDAL).
+        :param normalize: Normalisation des valeurs lues entre 0 et 1 ; par défaut les valeurs natives,
+                          ce qui permet de lire les log-luminances dans une table pour une image entière.
+        :return: Générateur de tuples (window, stack) avec stack uint8 de forme (bandes, hauteur, largeur).
+        """
+        tile_size = tile_size or self.tile_size
+
+        # Passe 1 : statistiques de log-luminance par bande
+        statistics = self._new_statistics()
+        for _, stack in reader.iter_blocks(tile_size, normalize=normalize):
+            statistics.update([self._log_luminance(band) for band in stack])
+        self.band_statistics = [self._global_parameters(statistics, b) for b in range(len(statistics.count))]
+
+        # Passe 2 : application de la courbe (tables des bandes calculées au premier bloc)
+        tables = None
+        for window, stack in reader.iter_blocks(tile_size, normalize=normalize):
+            if tables is None:
+                tables = [self._curve_table(stack.dtype, *parameters) for parameters in self.band_statistics]
+            yield window, np.stack([self._map(band, *self.band_statistics[b], tables[b])
+                                    for b, band in enumerate(stack)])
+
+        self.metadata_logger.log_function_call(
+            func_name="tone_map_blocks",
+            image_path=reader.image_path,
+            bias=self.bias,
+            exposure=self.exposure,
+            tile_size=tile_size
+        )
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(self.__class__.__name__,
+                                                    dict(self._run_parameters(), tile_size=tile_size),
+                                                    image_key=self.image_key or reader.image_path)
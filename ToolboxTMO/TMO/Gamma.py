@@ -10,6 +10,7 @@ import numpy as np
 from PIL import Image
 import os
 import importlib.util
+from functools import partial
 
 # Définir les chemins des dossiers contenant les modules
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,9 +33,59 @@ def import_dynamic(module_name, module_path):
 
 # Importer les modules depuis 'tools'
 tools_meta = import_dynamic("modif_meta", os.path.join(tools_dir, 'modif_metadata.py'))
+tools_lut = import_dynamic("lut", os.path.join(tools_dir, 'lut.py'))
+tools_parallel = import_dynamic("parallel", os.path.join(tools_dir, 'parallel.py'))
+tools_runs = import_dynamic("run_store", os.path.join(tools_dir, 'run_store.py'))
+tools_scratch = import_dynamic("scratch", os.path.join(tools_dir, 'scratch.py'))
+tools_cache = import_dynamic("result_cache", os.path.join(tools_dir, 'result_cache.py'))
+tools_statistics = import_dynamic("statistics", os.path.join(tools_dir, 'statistics.py'))
 
 # Importer les classes et fonctions nécessaires des modules
 MetadataLogger = tools_meta.MetadataLogger
+apply_lut = tools_lut.apply_lut
+compile_lut = tools_lut.compile_lut
+supports_lut = tools_lut.supports_lut
+map_matrices = tools_parallel.map_matrices
+open_run_store = tools_runs.open_run_store
+open_scratch = tools_scratch.open_scratch
+open_result_cache = tools_cache.open_result_cache
+cached_result = tools_cache.cached_result
+SCRATCH_STRIP_ROWS = tools_scratch.SCRATCH_STRIP_ROWS
+compute_statistics = tools_statistics.compute_statistics
+
+# Type de quantification d'une entrée flottante (0-1) avant un balayage de valeurs gamma
+SWEEP_QUANTIZATION_DTYPE = np.uint16
+
+
+def _histogram_metrics(histogram, percentiles=(2, 50, 98)):
+    """
+    Statistiques d'une bande 8 bits déduites de son histogramme (une classe par niveau).
+    :param histogram: Effectifs des 256 niveaux de sortie.
+    :param percentiles: Percentiles à calculer (entre 0 et 100).
+    :return: Dictionnaire (count, min, max, mean, std, entropy, clipped_low, clipped_high, percentiles).
+    """
+    count = histogram.sum()
+    if count == 0:
+        return {"count": 0}
+    levels = np.arange(len(histogram))
+    probabilities = histogram / count
+    mean = (levels * probabilities).sum()
+    nonzero = np.flatnonzero(histogram)
+    occupied = probabilities[nonzero]
+    cumulative = np.cumsum(histogram)
+    metrics = {
+        "count": int(count),
+        "min": int(nonzero[0]),
+        "max": int(nonzero[-1]),
+        "mean": float(mean),
+        "std": float(np.sqrt((np.square(levels - mean) * probabilities).sum())),
+        "entropy": float(-(occupied * np.log2(occupied)).sum()),  # En bits
+        "clipped_low": float(probabilities[0]),  # Proportion de pixels à 0
+        "clipped_high": float(probabilities[-1]),  # Proportion de pixels à 255
+    }
+    for q in percentiles:
+        metrics[f"p{q:g}"] = int(np.searchsorted(cumulative, q / 100.0 * count))
+    return metrics
 
 
 ###################################  Classe ##############################
@@ -42,18 +93,39 @@ MetadataLogger = tools_meta.MetadataLogger
 import numpy as np
 
 class GammaTMO:
-    def __init__(self, pixel_matrix, gamma=2.2, metadata_file="metadata.txt"):
+    def __init__(self, pixel_matrix, gamma=2.2, metadata_file="metadata.txt", n_workers=1, strip_rows=None,
+                 metadata_logger=None, run_store=None, image_key=None, scratch=None, cache=None):
         """
         Initialise le Tone Mapping Operator Gamma.
         :param pixel_matrix: Matrice 2D ou liste de matrices (plusieurs bandes).
         :param gamma: Valeur gamma à appliquer.
         :param metadata_file: Chemin du fichier de métadonnées.
+        :param n_workers: Nombre de threads utilisés pour traiter les bandes en parallèle.
+        :param strip_rows: Si renseigné, chaque bande est aussi découpée en bandes de lignes
+                           traitées en parallèle (résultat identique au traitement séquentiel).
+        :param metadata_logger: Journal de métadonnées à utiliser (par exemple un BufferedMetadataLogger
+                                partagé) ; par défaut un MetadataLogger sur metadata_file.
+        :param run_store: Registre des paramètres d'exécution (RunParameterStore ou chemin SQLite) ;
+                          par défaut la base "<metadata_file>_runs.sqlite", créée à la première exécution ;
+                          False pour ne pas enregistrer les exécutions.
+        :param image_key: Clé de l'image traitée (par exemple son chemin), enregistrée avec les paramètres.
+        :param scratch: Espace de travail sur disque (ScratchSpace, chemin d'un dossier ou True) : les matrices
+                        de sortie sont alors des numpy.memmap, calculées par bandes de lignes.
+        :param cache: Cache des résultats sur disque (ResultCache, chemin d'un dossier ou True) : une sortie
+                      déjà calculée pour les mêmes pixels et paramètres est relue au lieu d'être recalculée.
         """
         self.single_input = not isinstance(pixel_matrix, list)  # Si une seule matrice
         self.pixel_matrix = pixel_matrix if isinstance(pixel_matrix, list) else [pixel_matrix]
         self.gamma = gamma
+        self.n_workers = n_workers
+        self.strip_rows = strip_rows
         self.metadata_file = metadata_file
-        self.metadata_logger = MetadataLogger(metadata_file)
+        self.metadata_logger = metadata_logger if metadata_logger else MetadataLogger(metadata_file)
+        self.run_store = open_run_store(run_store, metadata_file)
+        self.image_key = image_key
+        self.scratch = open_scratch(scratch)
+        self.cache = open_result_cache(cache)
+        self.run_id = None  # Identifiant de la dernière exécution, renseigné par apply_correction
 
         # Enregistrement de l'initialisation dans les métadonnées
         self.metadata_logger.log_class_usage(
@@ -62,53 +134,155 @@ class GammaTMO:
             gamma=self.gamma
         )
 
-    def apply_correction(self):
+    def _correct_matrix(self, matrix):
         """
-        Applique la correction gamma sur la matrice ou les matrices et convertit une image 16 bits en 8 bits.
-        :return: Matrice ou liste de matrices avec correction gamma appliquée et convertie en 8 bits.
+        Applique la correction gamma à une matrice (ou à une bande de lignes d'une matrice).
+        :param matrix: Matrice uint8, uint16 ou flottante (0-1).
+        :return: Matrice corrigée en 8 bits.
         """
-        processed_matrices = []
+        # Vérification du type de données de la matrice
+        dtype = matrix.dtype
 
-        for matrix in self.pixel_matrix:
-            # Vérification du type de données de la matrice
-            dtype = matrix.dtype
-
-            # Conversion en float32 pour éviter les erreurs numériques
-            matrix = matrix.astype(np.float32)
-
-            # Normalisation en fonction du type de données (en particulier pour uint16)
-            if dtype == np.uint8:
-                # Si l'image est en 8 bits (0-255), normalisation entre 0 et 1
-                matrix = matrix / 255.0
-            elif dtype == np.uint16:
-                # Si l'image est en 16 bits (0-65535), normalisation entre 0 et 1
-                matrix = matrix / 65535.0
-            elif np.issubdtype(dtype, np.floating):
-                # Si l'image est déjà flottante (0-1), aucune normalisation nécessaire
-                pass
-            else:
-                # Pour d'autres types de données (si nécessaire)
-                raise ValueError(f"Type de données {dtype} non pris en charge pour la normalisation")
+        # Entrée entière (8 ou 16 bits) : correction par table de correspondance, sans passage en flottant
+        if supports_lut(dtype):
+            return apply_lut(matrix, "gamma", np.uint8, gamma=self.gamma)
+
+        # Conversion en float32 pour éviter les erreurs numériques
+        matrix = matrix.astype(np.float32)
+
+        # Normalisation en fonction du type de données (en particulier pour uint16)
+        if dtype == np.uint8:
+            # Si l'image est en 8 bits (0-255), normalisation entre 0 et 1
+            matrix = matrix / 255.0
+        elif dtype == np.uint16:
+            # Si l'image est en 16 bits (0-65535), normalisation entre 0 et 1
+            matrix = matrix / 65535.0
+        elif np.issubdtype(dtype, np.floating):
+            # Si l'image est déjà flottante (0-1), aucune normalisation nécessaire
+            pass
+        else:
+            # Pour d'autres types de données (si nécessaire)
+            raise ValueError(f"Type de données {dtype} non pris en charge pour la normalisation")
 
-            # Application de la correction gamma
-            corrected_matrix = np.power(matrix, 1 / self.gamma)
+        # Application de la correction gamma
+        corrected_matrix = np.power(matrix, 1 / self.gamma)
 
-            # Conversion en 8 bits (0-255) après la correction gamma
-            corrected_matrix = (corrected_matrix * 255).clip(0, 255).astype(np.uint8)
+        # Conversion en 8 bits (0-255) après la correction gamma
+        corrected_matrix = (corrected_matrix * 255).clip(0, 255).astype(np.uint8)
 
-            # Si l'image était en 16 bits, elle est maintenant convertie en 8 bits
-            processed_matrices.append(corrected_matrix)
+        # Si l'image était en 16 bits, elle est maintenant convertie en 8 bits
+        return corrected_matrix
+
+    def _correct_matrices(self):
+        """
+        Applique la correction gamma à toutes les bandes.
+        :return: Liste de matrices 8 bits.
+        """
+        if self.scratch:
+            # Sorties sur disque, calculées par bandes de lignes (temporaires de taille bornée)
+            return map_matrices(self._correct_matrix, self.pixel_matrix, np.uint8, self.n_workers,
+                                self.strip_rows or SCRATCH_STRIP_ROWS, self.scratch.empty)
+        return map_matrices(self._correct_matrix, self.pixel_matrix, np.uint8, self.n_workers, self.strip_rows)
+
+    def apply_correction(self):
+        """
+        Applique la correction gamma sur la matrice ou les matrices et convertit une image 16 bits en 8 bits.
+        :return: Matrice ou liste de matrices avec correction gamma appliquée et convertie en 8 bits.
+        """
+        processed_matrices, from_cache = cached_result(self.cache, self.__class__.__name__, {"gamma": self.gamma},
+                                                       self.pixel_matrix, self._correct_matrices)
 
         # Enregistrement de l'appel de la fonction dans les métadonnées
         self.metadata_logger.log_function_call(
             func_name="apply_correction",
             input_shapes=[matrix.shape for matrix in self.pixel_matrix],
             gamma=self.gamma,
-            output_shapes=[matrix.shape for matrix in processed_matrices]
+            output_shapes=[matrix.shape for matrix in processed_matrices],
+            from_cache=from_cache
         )
+        # Enregistrement indexé des paramètres, relu par GammaInverseTMO
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(self.__class__.__name__, {"gamma": self.gamma},
+                                                    image_key=self.image_key)
 
         # Retourne une matrice unique si l'entrée était une seule matrice, sinon une liste
         return processed_matrices[0] if self.single_input else processed_matrices
+
+    def _strip_settings(self):
+        """
+        Découpage en bandes de lignes et allocation des sorties : (strip_rows, allocate) pour map_matrices.
+        """
+        if self.scratch:
+            return self.strip_rows or SCRATCH_STRIP_ROWS, self.scratch.empty
+        return self.strip_rows, None
+
+    @staticmethod
+    def _quantize_matrix(matrix):
+        """
+        Quantifie une matrice flottante (0-1) sur 16 bits, pour l'appliquer ensuite par LUT.
+        """
+        max_value = np.iinfo(SWEEP_QUANTIZATION_DTYPE).max
+        return np.rint(np.clip(matrix, 0, 1) * max_value).astype(SWEEP_QUANTIZATION_DTYPE)
+
+    def _sweep_inputs(self):
+        """
+        Entrée commune à toutes les valeurs gamma d'un balayage : les matrices entières telles quelles,
+        les matrices flottantes quantifiées une seule fois sur 16 bits.
+        """
+        inputs = []
+        for matrix in self.pixel_matrix:
+            if supports_lut(matrix.dtype):
+                inputs.append(matrix)
+            elif np.issubdtype(matrix.dtype, np.floating):
+                inputs.append(map_matrices(self._quantize_matrix, [matrix], SWEEP_QUANTIZATION_DTYPE,
+                                           self.n_workers, *self._strip_settings())[0])
+            else:
+                raise ValueError(f"Type de données {matrix.dtype} non pris en charge pour la normalisation")
+        return inputs
+
+    def sweep(self, gammas, outputs=True, metrics=True, percentiles=(2, 50, 98)):
+        """
+        Évalue plusieurs valeurs gamma sur la même entrée, préparée une seule fois.
+        Chaque valeur se réduit à une table de correspondance : les sorties sont obtenues par indexation,
+        et les métriques par projection de l'histogramme d'entrée (calculé en une seule passe) dans la
+        table, sans relire les pixels. Pour une entrée 8 ou 16 bits, les sorties sont identiques à celles
+        de apply_correction ; une entrée flottante est quantifiée une fois sur 16 bits (écart de un ou deux
+        niveaux au plus, dans les tons les plus sombres).
+        Le balayage est journalisé une seule fois et n'est pas enregistré dans le registre des exécutions.
+        :param gammas: Liste des valeurs gamma à évaluer.
+        :param outputs: Si True, calcule les matrices corrigées de chaque valeur gamma.
+        :param metrics: Si True, calcule les statistiques 8 bits de chaque bande pour chaque valeur gamma.
+        :param percentiles: Percentiles inclus dans les métriques.
+        :return: Liste de dictionnaires, un par valeur gamma : {"gamma", "output" (matrice ou liste de matrices,
+                 si outputs), "metrics" (liste de dictionnaires par bande, si metrics)}.
+        """
+        inputs = self._sweep_inputs()
+        histograms = compute_statistics(inputs).histogram if metrics else None
+
+        results = []
+        for gamma in gammas:
+            result = {"gamma": gamma}
+            if outputs:
+                corrected = map_matrices(partial(apply_lut, operator="gamma", out_dtype=np.uint8, gamma=gamma),
+                                         inputs, np.uint8, self.n_workers, *self._strip_settings())
+                result["output"] = corrected[0] if self.single_input else corrected
+            if metrics:
+                result["metrics"] = []
+                for matrix, histogram in zip(inputs, histograms):
+                    table = compile_lut("gamma", matrix.dtype, np.uint8, gamma=gamma)
+                    levels = np.bincount(table, weights=histogram, minlength=256)
+                    result["metrics"].append(_histogram_metrics(levels, percentiles))
+            results.append(result)
+
+        # Un seul enregistrement dans les métadonnées pour tout le balayage
+        self.metadata_logger.log_function_call(
+            func_name="sweep",
+            input_shapes=[matrix.shape for matrix in self.pixel_matrix],
+            gammas=list(gammas),
+            outputs=outputs,
+            metrics=metrics
+        )
+        return results
 ################################### Utilisation ##############################
 # if __name__ == "__main__":
 #     # Exemple d'utilisation
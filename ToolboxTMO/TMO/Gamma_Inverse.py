@@ -7,6 +7,7 @@ Created on Mon Jan 27 17:28:33 2025
 
 import numpy as np
 from os.path import exists
+import json
 import os
 import importlib.util
 
@@ -30,29 +31,105 @@ def import_dynamic(module_name, module_path):
 
 # Importer les modules depuis 'tools'
 tools_meta = import_dynamic("modif_meta", os.path.join(tools_dir, 'modif_metadata.py'))
+tools_lut = import_dynamic("lut", os.path.join(tools_dir, 'lut.py'))
+tools_parallel = import_dynamic("parallel", os.path.join(tools_dir, 'parallel.py'))
+tools_runs = import_dynamic("run_store", os.path.join(tools_dir, 'run_store.py'))
+tools_scratch = import_dynamic("scratch", os.path.join(tools_dir, 'scratch.py'))
+tools_cache = import_dynamic("result_cache", os.path.join(tools_dir, 'result_cache.py'))
 
 # Importer les classes et fonctions nécessaires des modules
 MetadataLogger = tools_meta.MetadataLogger
+apply_lut = tools_lut.apply_lut
+supports_lut = tools_lut.supports_lut
+apply_by_strips = tools_parallel.apply_by_strips
+run_tasks = tools_parallel.run_tasks
+open_run_store = tools_runs.open_run_store
+default_store_path = tools_runs.default_store_path
+open_scratch = tools_scratch.open_scratch
+open_result_cache = tools_cache.open_result_cache
+cached_result = tools_cache.cached_result
+SCRATCH_STRIP_ROWS = tools_scratch.SCRATCH_STRIP_ROWS
+
+# Enregistrements JSON Lines (type, nom) portant le gamma d'une exécution GammaTMO
+GAMMA_RECORDS = (("class", "GammaTMO"), ("function", "apply_correction"))
 
 
 class GammaInverseTMO:
-    def __init__(self, pixel_matrix, metadata_file="metadata.txt"):
+    def __init__(self, pixel_matrix, metadata_file="metadata.txt", n_workers=1, strip_rows=None,
+                 metadata_logger=None, run_id=None, image_key=None, run_store=None, scratch=None, cache=None):
         """
         Initialise le Tone Mapping Operator Gamma inverse.
         :param pixel_matrix: Matrice 2D ou liste de matrices (plusieurs bandes).
         :param metadata_file: Chemin du fichier de métadonnées.
+        :param n_workers: Nombre de threads utilisés pour traiter les bandes en parallèle.
+        :param strip_rows: Si renseigné, chaque bande est aussi découpée en bandes de lignes
+                           traitées en parallèle (résultat identique au traitement séquentiel).
+        :param metadata_logger: Journal de métadonnées à utiliser (par exemple un BufferedMetadataLogger
+                                partagé) ; par défaut un MetadataLogger sur metadata_file.
+        :param run_id: Identifiant de l'exécution GammaTMO à inverser (GammaTMO.run_id).
+        :param image_key: Clé de l'image : sans run_id, la dernière exécution GammaTMO sur cette image est utilisée.
+        :param run_store: Registre des paramètres d'exécution (RunParameterStore ou chemin SQLite) ;
+                          par défaut la base "<metadata_file>_runs.sqlite" si elle existe ; False pour
+                          lire le gamma uniquement dans le fichier des métadonnées.
+        :param scratch: Espace de travail sur disque (ScratchSpace, chemin d'un dossier ou True) : les matrices
+                        de sortie sont alors des numpy.memmap, calculées par bandes de lignes.
+        :param cache: Cache des résultats sur disque (ResultCache, chemin d'un dossier ou True) : une sortie
+                      déjà calculée pour les mêmes pixels et paramètres est relue au lieu d'être recalculée.
         """
         self.single_input = not isinstance(pixel_matrix, list)  # Si une seule matrice
         self.pixel_matrix = pixel_matrix if isinstance(pixel_matrix, list) else [pixel_matrix]
+        self.n_workers = n_workers
+        self.strip_rows = strip_rows
         self.metadata_file = metadata_file
-        self.gamma = self._get_gamma_from_metadata(metadata_file)
+        self.metadata_logger = metadata_logger if metadata_logger else MetadataLogger(metadata_file)
+        if hasattr(self.metadata_logger, "flush"):
+            # Les enregistrements en attente peuvent contenir le gamma recherché
+            self.metadata_logger.flush()
+        self.scratch = open_scratch(scratch)
+        self.cache = open_result_cache(cache)
+        self.run_id = run_id
+        self.image_key = image_key
+        self.run_store = run_store
+        self.gamma = self._get_gamma_from_run_store()
+        if self.gamma is None:
+            # Pas de registre ou exécution absente : lecture du fichier des métadonnées
+            self.gamma = self._get_gamma_from_metadata(metadata_file)
         
         # Log initial dans les métadonnées
         self._log_tmo_usage()
 
+    def _get_gamma_from_run_store(self):
+        """
+        Recherche la valeur du gamma dans le registre des paramètres d'exécution : l'exécution run_id
+        si elle est fournie, sinon la plus récente exécution GammaTMO (pour image_key le cas échéant).
+        :return: La valeur du gamma, ou None si le registre n'existe pas ou ne contient pas d'exécution.
+        """
+        if self.run_store is None and not exists(default_store_path(self.metadata_file)):
+            if self.run_id is not None:
+                raise FileNotFoundError(f"Registre des exécutions introuvable pour '{self.metadata_file}'.")
+            return None
+        store = open_run_store(self.run_store, self.metadata_file)
+        if store is None:
+            if self.run_id is not None:
+                raise ValueError("Un run_id ne peut pas être recherché sans registre des exécutions (run_store=False).")
+            return None
+
+        if self.run_id is not None:
+            record = store.get_run(self.run_id)
+            if record is None:
+                raise ValueError(f"Exécution '{self.run_id}' introuvable dans le registre '{store.store_path}'.")
+        else:
+            record = store.latest_run("GammaTMO", image_key=self.image_key)
+            if record is None:
+                return None
+        return float(record["params"]["gamma"])
+
     def _get_gamma_from_metadata(self, metadata_file):
         """
         Extrait la valeur du gamma à partir du fichier des métadonnées.
+        Le fichier est lu jusqu'au bout pour retenir la valeur la plus récente, comme avec le registre
+        des exécutions : dernier enregistrement GammaTMO au format JSON Lines, sinon dernière ligne "gamma:"
+        du format texte.
         :param metadata_file: Chemin du fichier des métadonnées.
         :return: La valeur du gamma utilisée dans la correction TMO.
         """
@@ -60,50 +137,92 @@ class GammaInverseTMO:
             raise FileNotFoundError(f"Le fichier des métadonnées '{metadata_file}' est introuvable.")
         
         # Lecture du fichier des métadonnées et extraction de la valeur gamma
+        latest_gamma, text_gamma = None, None
         with open(metadata_file, 'r', encoding='utf-8') as file:
             for line in file:
-                if "gamma" in line:
-                    # Cherche une ligne contenant 'gamma' et extrait la valeur
+                if line.startswith("{"):
+                    # Enregistrement JSON Lines (BufferedMetadataLogger) d'une exécution GammaTMO
+                    record = json.loads(line)
+                    if (record.get("kind"), record.get("name")) in GAMMA_RECORDS:
+                        gamma_value = record.get("params", {}).get("gamma")
+                        if gamma_value is not None:
+                            latest_gamma = float(gamma_value)
+                    continue
+                if line.strip().startswith("gamma:"):
+                    # Cherche une ligne 'gamma: valeur' et extrait la valeur
                     gamma_value = line.split(":")[1].strip()
-                    return float(gamma_value)
+                    text_gamma = float(gamma_value)
         
+        if latest_gamma is not None:
+            return latest_gamma
+        if text_gamma is not None:
+            return text_gamma
         raise ValueError(f"Aucune valeur gamma trouvée dans le fichier des métadonnées '{metadata_file}'.")
 
     def _log_tmo_usage(self):
         """
         Enregistre les informations concernant l'utilisation du TMO inverse dans le fichier des métadonnées.
         """
-        # Création d'une instance de MetadataLogger
-        metadata_logger = MetadataLogger(self.metadata_file)
-        
         # Log des informations sur l'utilisation de la classe GammaInverseTMO
-        metadata_logger.log_class_usage(
+        self.metadata_logger.log_class_usage(
             class_name="GammaInverseTMO",
             gamma=self.gamma
         )
     
+    def _inverse_matrix(self, matrix, scale):
+        """
+        Applique la correction inverse de gamma à une matrice (ou à une bande de lignes d'une matrice).
+        :param matrix: Matrice à corriger.
+        :param scale: 255 si la matrice complète n'est pas normalisée (maximum > 1), 1 sinon.
+        :return: Matrice corrigée en 16 bits.
+        """
+        # Entrée entière (8 ou 16 bits) : correction par table de correspondance, sans passage en flottant
+        if supports_lut(matrix.dtype):
+            return apply_lut(matrix, "gamma_inverse", np.uint16, gamma=self.gamma, scale=scale)
+
+        # Conversion en float32 pour éviter les erreurs numériques
+        matrix = matrix.astype(np.float32)
+
+        # Normalisation (0-1) si ce n'est pas déjà le cas
+        matrix = matrix / 255.0 if scale != 1 else matrix
+
+        # Application de la correction inverse gamma
+        inverse_corrected_matrix = np.power(matrix, self.gamma)
+
+        # Re-normalisation (0-65535) et conversion en uint16 pour l'image en 16 bits
+        return (inverse_corrected_matrix * 65535).clip(0, 65535).astype(np.uint16)
+
+    def _process_matrix(self, matrix):
+        """
+        Traite une bande complète : le facteur de normalisation dépend du maximum de toute la bande,
+        il est donc calculé avant un éventuel découpage en bandes de lignes.
+        """
+        scale = 255.0 if np.float32(matrix.max()) > 1 else 1.0
+        if self.scratch:
+            return apply_by_strips(lambda rows: self._inverse_matrix(rows, scale), matrix, np.uint16,
+                                   self.n_workers, self.strip_rows or SCRATCH_STRIP_ROWS, self.scratch.empty)
+        return apply_by_strips(lambda rows: self._inverse_matrix(rows, scale), matrix, np.uint16,
+                               self.n_workers, self.strip_rows)
+
+    def _process_matrices(self):
+        """
+        Applique la correction inverse à toutes les bandes.
+        :return: Liste de matrices 16 bits.
+        """
+        if self.strip_rows or self.scratch:
+            # Bandes traitées l'une après l'autre, leurs bandes de lignes en parallèle
+            return [self._process_matrix(matrix) for matrix in self.pixel_matrix]
+        return run_tasks(self._process_matrix, [(matrix,) for matrix in self.pixel_matrix], self.n_workers)
+
     def apply_inverse_correction(self):
         """
         Applique la correction inverse de gamma sur la matrice ou les matrices.
         :return: Liste de matrices avec la correction inverse appliquée.
         """
-        processed_matrices = []
-    
-        for matrix in self.pixel_matrix:
-            # Conversion en float32 pour éviter les erreurs numériques
-            matrix = matrix.astype(np.float32)
-    
-            # Normalisation (0-1) si ce n'est pas déjà le cas
-            matrix = matrix / 255.0 if matrix.max() > 1 else matrix
-    
-            # Application de la correction inverse gamma
-            inverse_corrected_matrix = np.power(matrix, self.gamma)
-    
-            # Re-normalisation (0-65535) et conversion en uint16 pour l'image en 16 bits
-            inverse_corrected_matrix = (inverse_corrected_matrix * 65535).clip(0, 65535).astype(np.uint16)
-    
-            processed_matrices.append(inverse_corrected_matrix)
-    
+        # Le gamma est celui retrouvé dans le registre ou les métadonnées : il fait partie de la clé du cache
+        processed_matrices, _ = cached_result(self.cache, self.__class__.__name__, {"gamma": self.gamma},
+                                              self.pixel_matrix, self._process_matrices)
+
         # Si l'entrée était une matrice 3D, séparez les canaux en matrices 2D
         if len(self.pixel_matrix) == 1 and len(self.pixel_matrix[0].shape) == 3:
             height, width, channels = self.pixel_matrix[0].shape
@@ -6,10 +6,11 @@ Created on Sun Jan 26 09:36:37 2025
 """
 ############################## Import des librairies nécessaires #####################
 import numpy as np
-from scipy.ndimage import gaussian_filter
 
 import os
 import importlib.util
+import threading
+from collections import OrderedDict
 
 # Définir les chemins des dossiers contenant les modules
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,73 +33,652 @@ def import_dynamic(module_name, module_path):
 ############# ajouter les outils nécessaires ici
 # Importer les modules depuis 'tools'
 tools_meta = import_dynamic("modif_meta", os.path.join(tools_dir, 'modif_metadata.py'))
+tools_tiling = import_dynamic("tiling", os.path.join(tools_dir, 'tiling.py'))
+tools_filters = import_dynamic("base_filters", os.path.join(tools_dir, 'base_filters.py'))
+tools_lut = import_dynamic("lut", os.path.join(tools_dir, 'lut.py'))
+tools_parallel = import_dynamic("parallel", os.path.join(tools_dir, 'parallel.py'))
+tools_runs = import_dynamic("run_store", os.path.join(tools_dir, 'run_store.py'))
+tools_scratch = import_dynamic("scratch", os.path.join(tools_dir, 'scratch.py'))
+tools_luminance = import_dynamic("luminance", os.path.join(tools_dir, 'luminance.py'))
+tools_cache = import_dynamic("result_cache", os.path.join(tools_dir, 'result_cache.py'))
 
 # Importer les classes et fonctions nécessaires des modules
 MetadataLogger = tools_meta.MetadataLogger
+iter_windows = tools_tiling.iter_windows
+get_base_filter = tools_filters.get_base_filter
+apply_lut = tools_lut.apply_lut
+supports_lut = tools_lut.supports_lut
+run_tasks = tools_parallel.run_tasks
+row_strips = tools_parallel.row_strips
+open_run_store = tools_runs.open_run_store
+open_scratch = tools_scratch.open_scratch
+SCRATCH_STRIP_ROWS = tools_scratch.SCRATCH_STRIP_ROWS
+band_luminance = tools_luminance.band_luminance
+resolve_weights = tools_luminance.resolve_weights
+array_fingerprint = tools_cache.array_fingerprint
+open_result_cache = tools_cache.open_result_cache
+cached_result = tools_cache.cached_result
+
+# Troncature du noyau gaussien (identique à la valeur par défaut de scipy)
+GAUSSIAN_TRUNCATE = 4.0
+
+# Modes de traitement : chaque bande séparément, ou luminance seule puis rapports de couleur
+TONE_MAPPING_MODES = ("bands", "luminance")
+
+# Luminance minimale utilisée au dénominateur des rapports de couleur
+LUMINANCE_EPSILON = 1e-6
+
+# Taille maximale (octets) des décompositions base/détails conservées en mémoire par le cache partagé
+DECOMPOSITION_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+
+############################## Cache des décompositions #####################
+# La décomposition base/détails (logarithme + filtrage gaussien) ne dépend ni de contrast_scaling
+# ni de detail_amplification : elle est calculée une fois par image et conservée, et le rendu avec
+# d'autres paramètres se réduit à une recombinaison pixel à pixel (cf. MantiukTMO.render).
+
+def decomposition_nbytes(entry):
+    """
+    Mémoire occupée par une décomposition : couches base/détails et luminance. Les couches allouées
+    dans un espace de travail (numpy.memmap) sont sur disque et ne sont pas comptées.
+    """
+    matrices = entry["base"] + entry["details"] + ([] if entry["luminance"] is None else [entry["luminance"]])
+    return sum(matrix.nbytes for matrix in matrices if not isinstance(matrix, np.memmap))
+
+
+class DecompositionCache:
+    def __init__(self, max_bytes=DECOMPOSITION_CACHE_MAX_BYTES):
+        """
+        Cache LRU des décompositions base/détails, partagé entre les instances de MantiukTMO.
+        :param max_bytes: Mémoire maximale occupée par les décompositions conservées (cf. decomposition_nbytes) ;
+                          les moins récemment utilisées sont supprimées au-delà, et une décomposition
+                          plus grande que cette limite n'est pas conservée.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Retourne la décomposition associée à une clé (None si elle n'est pas en cache).
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, entry):
+        """
+        Ajoute une décomposition au cache, en supprimant les plus anciennes au-delà de max_bytes.
+        :return: True si la décomposition a été conservée.
+        """
+        size = decomposition_nbytes(entry)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = (entry, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+            return True
+
+    def clear(self):
+        """
+        Vide le cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Cache utilisé par défaut par toutes les instances
+shared_decomposition_cache = DecompositionCache()
 
 
 ###################################  Classe ##############################
 
 class MantiukTMO:
-    def __init__(self, pixel_matrices, contrast_scaling=0.8, detail_amplification=1.2, metadata_file="metadata.txt"):
+    def __init__(self, pixel_matrices, contrast_scaling=0.8, detail_amplification=1.2, metadata_file="metadata.txt",
+                 sigma=30, tile_size=None, base_filter="exact", n_workers=1, strip_rows=None,
+                 metadata_logger=None, run_store=None, image_key=None, scratch=None, mode="bands",
+                 luminance_weights="rec709", saturation=1.0, decomposition_cache=None, cache=None):
         """
         Initialise le Tone Mapping Operator (TMO) de Mantiuk.
         :param pixel_matrices: Une matrice (2D) ou une liste de matrices (pour plusieurs bandes).
+                               Peut valoir None pour un traitement en flux (cf. tone_map_blocks).
         :param contrast_scaling: Facteur de réduction du contraste global (0-1, typiquement 0.8).
         :param detail_amplification: Facteur d'amplification des détails locaux (>1 pour amplifier).
         :param metadata_file: Le chemin vers le fichier où les métadonnées seront enregistrées.
+        :param sigma: Écart-type du filtre gaussien de la couche de base.
+        :param tile_size: Si renseigné, traitement par tuiles (entier ou tuple (largeur, hauteur))
+                          avec un halo de 4 sigma ; le résultat est identique au traitement global.
+        :param base_filter: Moteur de filtrage de la couche de base : "exact" (gaussien scipy),
+                            "pyramid" (sous-échantillonnage -> flou -> sur-échantillonnage) ou
+                            "iir" (gaussien récursif, coût indépendant de sigma).
+                            En mode tuilé, seul "exact" garantit un résultat identique au global.
+        :param n_workers: Nombre de threads utilisés pour traiter les bandes (ou les tuiles) en parallèle.
+        :param strip_rows: Si renseigné, chaque bande est découpée en bandes de strip_rows lignes (avec halo)
+                           traitées en parallèle ; le résultat est identique au traitement séquentiel.
+        :param metadata_logger: Journal de métadonnées à utiliser (par exemple un BufferedMetadataLogger
+                                partagé) ; par défaut un MetadataLogger sur metadata_file.
+        :param run_store: Registre des paramètres d'exécution (RunParameterStore ou chemin SQLite) ;
+                          par défaut la base "<metadata_file>_runs.sqlite", créée à la première exécution ;
+                          False pour ne pas enregistrer les exécutions.
+        :param image_key: Clé de l'image traitée (par exemple son chemin), enregistrée avec les paramètres.
+        :param scratch: Espace de travail sur disque (ScratchSpace, chemin d'un dossier ou True) : les matrices
+                        de sortie sont alors des numpy.memmap, et le traitement est fait par bandes de lignes
+                        si aucune taille de tuile n'est donnée.
+        :param mode: "bands" (par défaut) : chaque bande est tonemappée séparément ;
+                     "luminance" : la décomposition base/détails est faite une seule fois sur la luminance,
+                     puis chaque bande est reconstruite par (bande / luminance) ^ saturation x luminance tonemappée.
+                     Un seul filtrage par image au lieu d'un par bande, et les teintes sont conservées.
+        :param luminance_weights: Pondération des bandes pour la luminance ("rec709", "rec601", "mean"
+                                  ou un poids par bande), en mode "luminance".
+        :param saturation: Exposant appliqué aux rapports de couleur en mode "luminance" (1 : saturation
+                           conservée, <1 : désaturation).
+        :param decomposition_cache: Cache des décompositions utilisé par decompose() et render()
+                                    (par défaut le cache partagé du module, limité à DECOMPOSITION_CACHE_MAX_BYTES).
+        :param cache: Cache des résultats sur disque (ResultCache, chemin d'un dossier ou True) : une sortie
+                      déjà calculée pour les mêmes pixels et paramètres est relue au lieu d'être recalculée.
         """
+        if mode not in TONE_MAPPING_MODES:
+            raise ValueError(f"Mode '{mode}' inconnu. Choix possibles : {list(TONE_MAPPING_MODES)}")
         
-        
+        pixel_matrices = [] if pixel_matrices is None else pixel_matrices
         self.single_input = not isinstance(pixel_matrices, list)  # Vrai si l'entrée est une matrice unique
         self.pixel_matrices = pixel_matrices if isinstance(pixel_matrices, list) else [pixel_matrices]
         self.contrast_scaling = contrast_scaling
         self.detail_amplification = detail_amplification
-        self.metadata_logger = MetadataLogger(metadata_file)
+        self.sigma = sigma
+        self.tile_size = tile_size
+        self.n_workers = n_workers
+        self.strip_rows = strip_rows
+        self.base_filter = base_filter
+        self._filter_function = get_base_filter(base_filter)
         # Si un metadata_logger n'est pas passé, on en crée un avec le fichier spécifié
-        # self.metadata_logger = metadata_logger if metadata_logger else MetadataLogger(metadata_file)
+        self.metadata_logger = metadata_logger if metadata_logger else MetadataLogger(metadata_file)
+        self.run_store = open_run_store(run_store, metadata_file)
+        self.image_key = image_key
+        self.scratch = open_scratch(scratch)
+        self.cache = open_result_cache(cache)
+        self.run_id = None  # Identifiant de la dernière exécution, renseigné par tone_map
+        self.mode = mode
+        self.luminance_weights = luminance_weights
+        self.saturation = saturation
+        self.decomposition_cache = decomposition_cache if decomposition_cache is not None \
+            else shared_decomposition_cache
+        self._decomposition_key = None  # Clé de l'entrée dans le cache, calculée au premier decompose()
 
         # Enregistrer l'initialisation de la classe dans les métadonnées
         self.metadata_logger.log_class_usage(
             class_name=self.__class__.__name__,
             pixel_matrices_shape=[matrix.shape for matrix in self.pixel_matrices],
             contrast_scaling=self.contrast_scaling,
-            detail_amplification=self.detail_amplification
+            detail_amplification=self.detail_amplification,
+            sigma=self.sigma,
+            base_filter=self.base_filter,
+            mode=self.mode
         )
 
-    def tone_map(self):
+    def _run_parameters(self):
         """
-        Applique le Tone Mapping Operator (TMO) de Mantiuk à chaque matrice de pixels.
-        :return: Une matrice (2D) ou une liste de matrices tonemappées, du même type que l'entrée.
+        Paramètres de l'exécution enregistrés dans le registre des exécutions.
+        """
+        return {
+            "contrast_scaling": self.contrast_scaling,
+            "detail_amplification": self.detail_amplification,
+            "sigma": self.sigma,
+            "base_filter": self.base_filter,
+            "tile_size": self.tile_size,
+            "mode": self.mode,
+            "luminance_weights": self.luminance_weights,
+            "saturation": self.saturation,
+        }
+
+    @property
+    def halo(self):
+        """
+        Largeur du halo (en pixels) nécessaire autour d'une tuile : rayon du noyau gaussien,
+        soit 4 sigma, pour que le filtrage de la zone utile soit exact.
         """
-        processed_matrices = []
+        return int(GAUSSIAN_TRUNCATE * self.sigma + 0.5)
 
-        for matrix in self.pixel_matrices:
+    def _tone_map_linear(self, matrix):
+        """
+        Applique la décomposition base/détails et la recomposition, sans la normalisation finale.
+        :param matrix: Matrice 2D (ou tuile avec son halo).
+        :return: Matrice float32 tonemappée dans l'espace linéaire.
+        """
+        base, details = self._decompose_linear(matrix)
+        return self._recompose(base, details, self.contrast_scaling, self.detail_amplification)
+
+    def _decompose_linear(self, matrix):
+        """
+        Décompose une matrice en couche de base et détails dans l'espace logarithmique.
+        :param matrix: Matrice 2D (ou tuile avec son halo).
+        :return: Tuple (base, détails) de matrices float32.
+        """
+        # 1. Convertir en luminance logarithmique pour modéliser la perception humaine
+        if supports_lut(matrix.dtype):
+            # Entrée entière : log(1 + pixel) lu dans une table, sans copie float32 intermédiaire
+            log_luminance = apply_lut(matrix, "log1p", np.float32)
+        else:
             # Conversion explicite en float32 pour compatibilité
             matrix = matrix.astype(np.float32)
-            
-            # 1. Convertir en luminance logarithmique pour modéliser la perception humaine
             log_luminance = np.log1p(matrix)  # log(1 + pixel) pour éviter les problèmes avec 0
 
-            # 2. Décomposition multi-échelle (filtrage gaussien pour tendances globales)
-            base = gaussian_filter(log_luminance, sigma=30)  # Tendances globales (grandes structures)
-            details = log_luminance - base  # Détails locaux
+        # 2. Décomposition multi-échelle (filtrage gaussien pour tendances globales)
+        base = self._filter_function(log_luminance, self.sigma, truncate=GAUSSIAN_TRUNCATE)  # Tendances globales
+        details = log_luminance - base  # Détails locaux
+        return base, details
+
+    @staticmethod
+    def _recompose(base, details, contrast_scaling, detail_amplification):
+        """
+        Recompose l'image tonale à partir de la décomposition base/détails.
+        :return: Matrice float32 tonemappée dans l'espace linéaire.
+        """
+        # 3. Compression du contraste global
+        compressed_base = base * contrast_scaling
+
+        # 4. Amplification des détails locaux
+        amplified_details = details * detail_amplification
+
+        # 5. Reconstruction de l'image tonale
+        tone_mapped_log = compressed_base + amplified_details
+        return np.expm1(tone_mapped_log)  # Exponentielle pour revenir à l'espace linéaire
+
+    @staticmethod
+    def _normalize(tone_mapped, min_val, max_val):
+        """
+        Normalise une matrice tonemappée entre 0 et 255 à partir des extrema globaux.
+        """
+        tone_mapped = (tone_mapped - min_val) / (max_val - min_val) * 255
+        return tone_mapped.astype(np.uint8)
+
+    def _tone_map_tiled(self, matrix, tile_size):
+        """
+        Applique le TMO par tuiles sur une matrice 2D, en deux passes :
+        1. calcul des extrema globaux de l'image tonemappée, tuile par tuile ;
+        2. recalcul de chaque tuile et normalisation avec ces extrema.
+        Les tuiles sont lues avec un halo de 4 sigma, ce qui rend le résultat identique
+        au traitement de l'image entière.
+        Les tuiles de chaque passe sont traitées en parallèle sur n_workers threads.
+        :param matrix: Matrice 2D.
+        :param tile_size: Taille des tuiles (entier ou tuple (largeur, hauteur)).
+        :return: Matrice uint8 tonemappée.
+        """
+        height, width = matrix.shape
+        windows = list(iter_windows(width, height, tile_size, overlap=self.halo))
+
+        def tile_extrema(window):
+            tile = self._tone_map_linear(matrix[window.read_slices()])[window.core_slices()]
+            return tile.min(), tile.max()
+
+        # Passe 1 : extrema globaux
+        extrema = run_tasks(tile_extrema, [(window,) for window in windows], self.n_workers)
+        min_val = min(tile_min for tile_min, _ in extrema)
+        max_val = max(tile_max for _, tile_max in extrema)
+
+        # Passe 2 : normalisation et assemblage
+        tone_mapped = self._allocate_output((height, width))
+
+        def normalize_tile(window):
+            tile = self._tone_map_linear(matrix[window.read_slices()])[window.core_slices()]
+            tone_mapped[window.slices()] = self._normalize(tile, min_val, max_val)
+
+        run_tasks(normalize_tile, [(window,) for window in windows], self.n_workers)
+        return tone_mapped
+
+    def _allocate_output(self, shape, dtype=np.uint8):
+        """
+        Alloue une matrice de sortie (uint8 par défaut), sur disque si un espace de travail est configuré.
+        """
+        return self.scratch.empty(shape, dtype) if self.scratch else np.empty(shape, dtype=dtype)
+
+    def _uses_luminance(self, band_count):
+        """
+        Indique si le mode luminance s'applique (il n'a de sens qu'à partir de deux bandes).
+        """
+        return self.mode == "luminance" and band_count > 1
+
+    def _tone_map_colour_region(self, bands, core=None):
+        """
+        Mode luminance : tonemappe la luminance d'une zone puis reconstruit chaque bande par son rapport
+        de couleur, sans la normalisation finale.
+        :param bands: Liste des bandes de la zone (avec leur halo en mode tuilé).
+        :param core: Slices de la zone utile dans la zone lue (None pour toute la zone).
+        :return: Liste de matrices float32 (une par bande) dans l'espace linéaire.
+        """
+        luminance = band_luminance(bands, self.luminance_weights)
+        tone_mapped = self._tone_map_linear(luminance)  # Un seul filtrage gaussien pour toutes les bandes
+        if core is not None:
+            luminance, tone_mapped = luminance[core], tone_mapped[core]
+            bands = [band[core] for band in bands]
+        return self._apply_colour_ratios(bands, luminance, tone_mapped, self.saturation)
+
+    @staticmethod
+    def _apply_colour_ratios(bands, luminance, tone_mapped, saturation):
+        """
+        Reconstruit chaque bande par (bande / luminance) ^ saturation x luminance tonemappée.
+        :return: Liste de matrices float32 dans l'espace linéaire.
+        """
+        inverse_luminance = 1 / np.maximum(luminance, np.float32(LUMINANCE_EPSILON))
+        coloured = []
+        for band in bands:
+            ratio = band * inverse_luminance
+            if saturation != 1:
+                ratio = np.power(ratio, np.float32(saturation))
+            coloured.append(ratio * tone_mapped)
+        return coloured
+
+    def _tone_map_luminance(self, bands):
+        """
+        Applique le TMO en mode luminance à un ensemble de bandes, globalement ou par tuiles (halo de 4 sigma).
+        Les bandes sont normalisées avec des extrema communs pour conserver les rapports de couleur.
+        :param bands: Liste de matrices 2D de même forme.
+        :return: Liste de matrices uint8.
+        """
+        tile_size = self._tile_size_for(bands[0])
+        if not tile_size:
+            coloured = self._tone_map_colour_region(bands)
+            min_val = min(np.min(matrix) for matrix in coloured)
+            max_val = max(np.max(matrix) for matrix in coloured)
+            return [self._normalize(matrix, min_val, max_val) for matrix in coloured]
+
+        height, width = bands[0].shape
+        windows = list(iter_windows(width, height, tile_size, overlap=self.halo))
+
+        def tile_extrema(window):
+            coloured = self._tone_map_colour_region([band[window.read_slices()] for band in bands],
+                                                    window.core_slices())
+            return min(tile.min() for tile in coloured), max(tile.max() for tile in coloured)
+
+        # Passe 1 : extrema communs à toutes les bandes
+        extrema = run_tasks(tile_extrema, [(window,) for window in windows], self.n_workers)
+        min_val = min(tile_min for tile_min, _ in extrema)
+        max_val = max(tile_max for _, tile_max in extrema)
 
-            # 3. Compression du contraste global
-            compressed_base = base * self.contrast_scaling
+        # Passe 2 : normalisation et assemblage
+        outputs = [self._allocate_output((height, width)) for _ in bands]
 
-            # 4. Amplification des détails locaux
-            amplified_details = details * self.detail_amplification
+        def normalize_tile(window):
+            coloured = self._tone_map_colour_region([band[window.read_slices()] for band in bands],
+                                                    window.core_slices())
+            for out, tile in zip(outputs, coloured):
+                out[window.slices()] = self._normalize(tile, min_val, max_val)
+
+        run_tasks(normalize_tile, [(window,) for window in windows], self.n_workers)
+        return outputs
+
+    def _tile_size_for(self, matrix):
+        """
+        Taille de tuile à utiliser pour une matrice : celle de l'instance, ou des bandes de
+        strip_rows lignes sur toute la largeur (SCRATCH_STRIP_ROWS avec un espace de travail sur disque) ;
+        None pour un traitement global.
+        """
+        if self.tile_size:
+            return self.tile_size
+        if self.strip_rows or self.scratch:
+            return (matrix.shape[1], self.strip_rows or SCRATCH_STRIP_ROWS)
+        return None
+
+    def _tone_map_matrix(self, matrix):
+        """
+        Applique le TMO à une bande complète (globalement ou par tuiles).
+        :param matrix: Matrice 2D.
+        :return: Matrice uint8 tonemappée.
+        """
+        tile_size = self._tile_size_for(matrix)
+        if tile_size:
+            return self._tone_map_tiled(matrix, tile_size)
+
+        tone_mapped = self._tone_map_linear(matrix)
+
+        # 6. Normalisation entre 0 et 255
+        return self._normalize(tone_mapped, np.min(tone_mapped), np.max(tone_mapped))
+
+    def tone_map_blocks(self, reader, tile_size=None, normalize=True):
+        """
+        Applique le TMO en flux sur une image ouverte avec OpenGDAL, sans la charger entièrement.
+        Une première passe sur les blocs calcule les extrema globaux de chaque bande,
+        une seconde produit les tuiles normalisées (identiques au traitement global).
+        :param reader: Objet OpenGDAL de l'image à traiter.
+        :param tile_size: Taille des tuiles (par défaut celle de l'instance, sinon celle de OpenGDAL).
+        :param normalize: Normalisation des valeurs lues entre 0 et 1 (cf. OpenGDAL.get_pixel_matrix).
+        :return: Générateur de tuples (window, stack) avec stack uint8 de forme (bandes, hauteur, largeur).
+        """
+        tile_size = tile_size or self.tile_size
 
-            # 5. Reconstruction de l'image tonale
-            tone_mapped_log = compressed_base + amplified_details
-            tone_mapped = np.expm1(tone_mapped_log)  # Exponentielle pour revenir à l'espace linéaire
+        luminance_mode = self._uses_luminance(reader.dataset.RasterCount)
 
-            # 6. Normalisation entre 0 et 255
-            tone_mapped = (tone_mapped - np.min(tone_mapped)) / (np.max(tone_mapped) - np.min(tone_mapped)) * 255
-            tone_mapped = tone_mapped.astype(np.uint8)
+        def tone_map_tile(window, stack):
+            if luminance_mode:
+                return self._tone_map_colour_region(list(stack), window.core_slices())
+            return [self._tone_map_linear(band)[window.core_slices()] for band in stack]
+
+        # Passe 1 : extrema globaux par bande (communs à toutes les bandes en mode luminance)
+        min_vals, max_vals = None, None
+        for window, stack in reader.iter_blocks(tile_size, overlap=self.halo, normalize=normalize):
+            tiles = tone_map_tile(window, stack)
+            tile_min = np.array([tile.min() for tile in tiles])
+            tile_max = np.array([tile.max() for tile in tiles])
+            min_vals = tile_min if min_vals is None else np.minimum(min_vals, tile_min)
+            max_vals = tile_max if max_vals is None else np.maximum(max_vals, tile_max)
+        if luminance_mode:
+            min_vals = np.full_like(min_vals, min_vals.min())
+            max_vals = np.full_like(max_vals, max_vals.max())
+
+        # Passe 2 : normalisation
+        for window, stack in reader.iter_blocks(tile_size, overlap=self.halo, normalize=normalize):
+            yield window, np.stack([
+                self._normalize(tile, min_vals[b], max_vals[b])
+                for b, tile in enumerate(tone_map_tile(window, stack))
+            ])
+
+        self.metadata_logger.log_function_call(
+            func_name="tone_map_blocks",
+            image_path=reader.image_path,
+            contrast_scaling=self.contrast_scaling,
+            detail_amplification=self.detail_amplification,
+            sigma=self.sigma,
+            base_filter=self.base_filter,
+            tile_size=tile_size,
+            mode=self.mode,
+            saturation=self.saturation
+        )
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(self.__class__.__name__,
+                                                    dict(self._run_parameters(), tile_size=tile_size),
+                                                    image_key=self.image_key or reader.image_path)
+
+    def _decompose_matrix(self, matrix):
+        """
+        Décomposition base/détails d'une matrice entière, calculée par tuiles (halo de 4 sigma) si un
+        découpage est configuré ; les couches sont alors allouées dans l'espace de travail s'il existe.
+        :return: Tuple (base, détails) de matrices float32.
+        """
+        tile_size = self._tile_size_for(matrix)
+        if not tile_size:
+            return self._decompose_linear(matrix)
+
+        height, width = matrix.shape
+        base = self._allocate_output((height, width), np.float32)
+        details = self._allocate_output((height, width), np.float32)
+
+        def decompose_tile(window):
+            tile_base, tile_details = self._decompose_linear(matrix[window.read_slices()])
+            base[window.slices()] = tile_base[window.core_slices()]
+            details[window.slices()] = tile_details[window.core_slices()]
+
+        run_tasks(decompose_tile, [(window,) for window in iter_windows(width, height, tile_size, overlap=self.halo)],
+                  self.n_workers)
+        return base, details
+
+    def _tiling(self):
+        """
+        Découpage effectif de l'entrée (cf. _tile_size_for) sous forme de tuple, None pour un traitement global.
+        Il fait partie des clés de cache : avec les filtres "pyramid" et "iir", le résultat en dépend.
+        """
+        tile_size = self._tile_size_for(self.pixel_matrices[0]) if self.pixel_matrices else None
+        return None if not tile_size else tuple(np.atleast_1d(tile_size).tolist())
 
-            processed_matrices.append(tone_mapped)
+    def _cache_key(self):
+        """
+        Clé de la décomposition de l'entrée : empreinte des bandes, paramètres du filtrage, découpage
+        (les filtres "pyramid" et "iir" donnent par tuiles un résultat différent du traitement global) et,
+        en mode luminance, pondération des bandes.
+        """
+        fingerprints = tuple(array_fingerprint(matrix) for matrix in self.pixel_matrices)
+        tiling = self._tiling()
+        if self._uses_luminance(len(self.pixel_matrices)):
+            weights = tuple(resolve_weights(self.luminance_weights, len(self.pixel_matrices)).tolist())
+            return "luminance", fingerprints, self.sigma, self.base_filter, tiling, weights
+        return "bands", fingerprints, self.sigma, self.base_filter, tiling
+
+    def decompose(self):
+        """
+        Calcule (ou retrouve dans le cache) la décomposition base/détails de l'entrée.
+        Elle ne dépend que des pixels, de sigma, du filtre de base, du découpage et, en mode luminance, de la pondération :
+        render() peut ensuite être appelé avec d'autres contrast_scaling / detail_amplification sans refiltrer.
+        L'empreinte des pixels est calculée au premier appel : les matrices ne doivent plus être modifiées ensuite.
+        :return: Dictionnaire {"base": [...], "details": [...], "luminance": matrice ou None}
+                 (une couche par bande, ou une seule pour la luminance).
+        """
+        if self._decomposition_key is None:
+            self._decomposition_key = self._cache_key()
+        entry = self.decomposition_cache.get(self._decomposition_key)
+        if entry is None:
+            luminance = band_luminance(self.pixel_matrices, self.luminance_weights) \
+                if self._uses_luminance(len(self.pixel_matrices)) else None
+            sources = self.pixel_matrices if luminance is None else [luminance]
+            layers = run_tasks(self._decompose_matrix, [(matrix,) for matrix in sources],
+                               1 if self._tile_size_for(sources[0]) else self.n_workers)
+            entry = {"base": [base for base, _ in layers], "details": [details for _, details in layers],
+                     "luminance": luminance}
+            self.decomposition_cache.put(self._decomposition_key, entry)
+        return entry
+
+    def render(self, contrast_scaling=None, detail_amplification=None, saturation=None):
+        """
+        Rend l'image à partir de la décomposition en cache (cf. decompose) : seule la recombinaison
+        pixel à pixel et la normalisation sont recalculées. Le résultat est identique à celui de tone_map()
+        avec les mêmes paramètres. Si un découpage est configuré (tile_size, strip_rows ou scratch),
+        la recombinaison est faite par bandes de lignes et les sorties sont allouées dans l'espace de travail.
+        :param contrast_scaling: Facteur de réduction du contraste global (par défaut celui de l'instance).
+        :param detail_amplification: Facteur d'amplification des détails (par défaut celui de l'instance).
+        :param saturation: Exposant des rapports de couleur en mode luminance (par défaut celui de l'instance).
+        :return: Une matrice (2D) ou une liste de matrices uint8, du même type que l'entrée.
+        """
+        contrast_scaling = self.contrast_scaling if contrast_scaling is None else contrast_scaling
+        detail_amplification = self.detail_amplification if detail_amplification is None else detail_amplification
+        saturation = self.saturation if saturation is None else saturation
+
+        decomposition = self.decompose()
+        layers = list(zip(decomposition["base"], decomposition["details"]))
+        luminance = decomposition["luminance"]
+
+        def recompose_rows(rows):
+            tone_mapped = [self._recompose(base[rows], details[rows], contrast_scaling, detail_amplification)
+                           for base, details in layers]
+            if luminance is None:
+                return tone_mapped
+            return self._apply_colour_ratios([matrix[rows] for matrix in self.pixel_matrices], luminance[rows],
+                                             tone_mapped[0], saturation)
+
+        def common_extrema(min_vals, max_vals):
+            # Extrema communs à toutes les bandes en mode luminance, pour conserver les rapports de couleur
+            if luminance is None:
+                return min_vals, max_vals
+            return [min(min_vals)] * len(min_vals), [max(max_vals)] * len(max_vals)
+
+        tile_size = self._tile_size_for(layers[0][0])
+        if not tile_size:
+            coloured = recompose_rows(slice(None))
+            min_vals, max_vals = common_extrema([np.min(matrix) for matrix in coloured],
+                                                [np.max(matrix) for matrix in coloured])
+            processed_matrices = [self._normalize(matrix, min_val, max_val)
+                                  for matrix, min_val, max_val in zip(coloured, min_vals, max_vals)]
+        else:
+            # Recombinaison par bandes de lignes (de la hauteur des tuiles), en deux passes comme tone_map :
+            # aucune matrice float32 de la taille de l'image n'est allouée
+            height, width = layers[0][0].shape
+            strips = [(rows,) for rows in row_strips(height, int(np.atleast_1d(tile_size)[-1]))]
+
+            def strip_extrema(rows):
+                coloured = recompose_rows(rows)
+                return [matrix.min() for matrix in coloured], [matrix.max() for matrix in coloured]
+
+            # Passe 1 : extrema globaux
+            extrema = run_tasks(strip_extrema, strips, self.n_workers)
+            min_vals, max_vals = common_extrema([min(values) for values in zip(*[mins for mins, _ in extrema])],
+                                                [max(values) for values in zip(*[maxs for _, maxs in extrema])])
+
+            # Passe 2 : normalisation et assemblage
+            processed_matrices = [self._allocate_output((height, width)) for _ in min_vals]
+
+            def normalize_strip(rows):
+                for out, matrix, min_val, max_val in zip(processed_matrices, recompose_rows(rows), min_vals, max_vals):
+                    out[rows] = self._normalize(matrix, min_val, max_val)
+
+            run_tasks(normalize_strip, strips, self.n_workers)
+
+        # Enregistrer l'appel de la méthode dans les métadonnées
+        self.metadata_logger.log_function_call(
+            func_name="render",
+            input_shapes=[matrix.shape for matrix in self.pixel_matrices],
+            contrast_scaling=contrast_scaling,
+            detail_amplification=detail_amplification,
+            sigma=self.sigma,
+            base_filter=self.base_filter,
+            mode=self.mode,
+            saturation=saturation
+        )
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(
+                self.__class__.__name__,
+                dict(self._run_parameters(), contrast_scaling=contrast_scaling,
+                     detail_amplification=detail_amplification, saturation=saturation),
+                image_key=self.image_key)
+
+        return processed_matrices[0] if self.single_input else processed_matrices
+
+    def _tone_map_matrices(self):
+        """
+        Applique le TMO à toutes les bandes, selon le mode et le découpage configurés.
+        :return: Liste de matrices uint8.
+        """
+        if self._uses_luminance(len(self.pixel_matrices)):
+            # Un seul filtrage sur la luminance, puis reconstruction des bandes
+            return self._tone_map_luminance(self.pixel_matrices)
+        if self.tile_size or self.strip_rows or self.scratch:
+            # Bandes traitées l'une après l'autre, leurs tuiles en parallèle
+            return [self._tone_map_matrix(matrix) for matrix in self.pixel_matrices]
+        return run_tasks(self._tone_map_matrix, [(matrix,) for matrix in self.pixel_matrices], self.n_workers)
+
+    def tone_map(self):
+        """
+        Applique le Tone Mapping Operator (TMO) de Mantiuk à chaque matrice de pixels.
+        :return: Une matrice (2D) ou une liste de matrices tonemappées, du même type que l'entrée.
+        """
+        # Le découpage effectif (tile_size, strip_rows ou scratch) fait partie de la clé du cache
+        processed_matrices, from_cache = cached_result(self.cache, self.__class__.__name__,
+                                                       dict(self._run_parameters(), tiling=self._tiling()),
+                                                       self.pixel_matrices, self._tone_map_matrices)
 
         # Enregistrer l'appel de la méthode dans les métadonnées
         self.metadata_logger.log_function_call(
@@ -106,8 +686,17 @@ class MantiukTMO:
             input_shapes=[matrix.shape for matrix in self.pixel_matrices],
             contrast_scaling=self.contrast_scaling,
             detail_amplification=self.detail_amplification,
-            output_shapes=[matrix.shape for matrix in processed_matrices]
+            sigma=self.sigma,
+            base_filter=self.base_filter,
+            tile_size=self.tile_size,
+            mode=self.mode,
+            saturation=self.saturation,
+            output_shapes=[matrix.shape for matrix in processed_matrices],
+            from_cache=from_cache
         )
+        if self.run_store is not None:
+            self.run_id = self.run_store.record_run(self.__class__.__name__, self._run_parameters(),
+                                                    image_key=self.image_key)
 
         # Retourner une matrice unique si l'entrée était une matrice unique, sinon une liste
         return processed_matrices[0] if self.single_input else processed_matrices
\ No newline at end of file
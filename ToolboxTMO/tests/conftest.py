@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+
+Configuration commune des tests : chargement des modules de la boîte à outils par leur chemin,
+comme le font les scripts de My_scripts (les dossiers tools et TMO ne sont pas des paquets installés).
+"""
+
+import os
+import importlib.util
+import pytest
+
+toolbox_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_modules = {}
+
+
+def import_dynamic(module_name, module_path):
+    """
+    Charge un module depuis son chemin (une seule fois par session de tests).
+    """
+    if module_path not in _modules:
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[module_path] = module
+    return _modules[module_path]
+
+
+@pytest.fixture(scope="session")
+def toolbox():
+    """
+    Fonction de chargement : toolbox("tools", "lut") ou toolbox("TMO", "Gamma").
+    """
+    def load(folder, name):
+        return import_dynamic(name, os.path.join(toolbox_dir, folder, f"{name}.py"))
+    return load
+
+
+@pytest.fixture
+def metadata_file(tmp_path):
+    """
+    Fichier de métadonnées temporaire (les TMO y journalisent leurs appels).
+    """
+    return str(tmp_path / "metadata.txt")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Mar 13 09:48:21 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+# PSNR minimal (dB) des approximations par rapport au gaussien exact, sur une scène log-lumineuse
+MIN_PSNR_DB = 45
+
+
+@pytest.fixture
+def filters(toolbox):
+    return toolbox("tools", "base_filters")
+
+
+@pytest.fixture(scope="module")
+def scene():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:200, 0:180]
+    return np.log1p(200 + 20000 * (x / 180) * (y / 200) * rng.normal(1.0, 0.05, x.shape)).astype(np.float32)
+
+
+@pytest.mark.parametrize("engine", ["exact", "pyramid", "iir"])
+@pytest.mark.parametrize("shape", [(200, 180), (3, 5), (1, 40), (40, 1)])
+def test_shape_and_dtype_preserved(filters, scene, engine, shape):
+    image = scene[:shape[0], :shape[1]]
+    filtered = filters.get_base_filter(engine)(image, 20)  # Image plus petite que le facteur pyramidal
+    assert filtered.shape == image.shape and filtered.dtype == np.float32
+    assert np.isfinite(filtered).all()
+
+
+@pytest.mark.parametrize("sigma", [3, 8, 20])
+def test_engines_close_to_exact(filters, scene, sigma):
+    report = filters.accuracy_report(scene, sigma=sigma)
+    assert report["exact"]["psnr_db"] == float("inf")
+    for engine in ("pyramid", "iir"):
+        assert report[engine]["psnr_db"] >= MIN_PSNR_DB
+        assert report[engine]["rmse"] >= 0 and report[engine]["time_s"] >= 0
+
+
+def test_pyramid_small_sigma_is_exact(filters, scene):
+    # sigma <= min_sigma : aucun sous-échantillonnage, le filtre exact est utilisé
+    assert np.array_equal(filters.gaussian_pyramid(scene, 2.0), filters.gaussian_exact(scene, 2.0))
+    assert np.array_equal(filters.gaussian_pyramid(scene, 3.0, min_sigma=4.0), filters.gaussian_exact(scene, 3.0))
+
+
+def test_upsample_single_sample(filters):
+    small = np.arange(4, dtype=np.float32).reshape(1, 4)
+    rows = filters._upsample_linear(small, 4, 7, axis=0)
+    assert rows.shape == (7, 4) and np.array_equal(rows, np.repeat(small, 7, axis=0))
+
+
+def test_unknown_engine(filters):
+    with pytest.raises(ValueError, match="inconnu"):
+        filters.get_base_filter("box")
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import pytest
+
+pytest.importorskip("osgeo")  # batch_convert charge open.py et save.py
+
+
+@pytest.fixture
+def batch(toolbox):
+    return toolbox("My_scripts", "batch_convert")
+
+
+def test_same_stem_in_two_folders_is_rejected(batch, tmp_path):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "scene.tif").write_bytes(b"")
+    with pytest.raises(ValueError, match="scene"):
+        batch.collect_inputs([str(tmp_path / "a"), str(tmp_path / "b")])
+
+
+def test_distinct_stems_are_accepted(batch, tmp_path):
+    for name in ("scene_1.tif", "scene_2.tif"):
+        (tmp_path / name).write_bytes(b"")
+    assert len(batch.collect_inputs([str(tmp_path)])) == 2
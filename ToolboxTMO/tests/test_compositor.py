@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import numpy as np
+
+
+def test_compose_matches_float_path(toolbox):
+    compositor = toolbox("tools", "compositor")
+    stack = np.random.default_rng(1).integers(0, 12000, (3, 40, 30), dtype=np.uint16)
+    tci = compositor.ReflectanceCompositor(reflectance_range=(0.0, 0.8)).compose(stack)
+
+    reflectance = stack.astype(np.float32) / 10000.0
+    stretched = np.clip((reflectance - 0.0) / 0.8, 0, 1)
+    expected = (np.power(stretched, 1 / 2.2) * 255 + 0.5).clip(0, 255).astype(np.uint8)
+    assert tci.shape == (40, 30, 3)
+    assert np.array_equal(tci, np.moveaxis(expected, 0, -1))
+
+
+def test_compose_does_not_fill_lut_cache(toolbox):
+    compositor = toolbox("tools", "compositor")
+    lut = compositor.tools_lut  # Module chargé par le compositeur
+    lut.clear_lut_cache()
+    stack = np.random.default_rng(2).integers(0, 12000, (3, 20, 20), dtype=np.uint16)
+    compositor.ReflectanceCompositor(clip_percentiles=(2, 98)).compose(stack)
+    assert len(lut._LUT_CACHE) == 0
+
+
+def test_apply_table_into_interleaved_output(toolbox, monkeypatch):
+    lut = toolbox("tools", "lut")
+    monkeypatch.setattr(lut, "LUT_CHUNK_SIZE", 64)  # Plusieurs blocs de lignes
+    matrix = np.random.default_rng(3).integers(0, 256, (50, 30), dtype=np.uint8)
+    table = (255 - np.arange(256)).astype(np.uint8)
+    out = np.zeros((50, 30, 3), dtype=np.uint8)
+    lut.apply_table(matrix, table, out=out[:, :, 1])
+    assert np.array_equal(out[:, :, 1], 255 - matrix)
+    assert not out[:, :, 0].any() and not out[:, :, 2].any()
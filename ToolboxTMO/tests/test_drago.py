@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def drago(toolbox, metadata_file):
+    module = toolbox("TMO", "Drago")
+
+    def make(pixel_matrices, **params):
+        return module.DragoTMO(pixel_matrices, metadata_file=metadata_file, run_store=False, **params)
+    make.module = module
+    return make
+
+
+def _scenes():
+    rng = np.random.default_rng(0)
+    uniform = rng.integers(0, 65536, (96, 80), dtype=np.uint16)
+    dark = uniform.copy()
+    dark[:48] = 0  # Moitié de l'image à 0 : moyenne logarithmique très faible
+    return {
+        "uint16": uniform,
+        "uint16_dark": dark,
+        "uint8": rng.integers(0, 256, (96, 80), dtype=np.uint8),
+        "float_hdr": rng.lognormal(0, 4, (96, 80)).astype(np.float32),  # Dynamique ~ 1e8
+    }
+
+
+@pytest.mark.parametrize("bias", [0.7, 0.85, 0.95])
+@pytest.mark.parametrize("name", list(_scenes()))
+def test_table_matches_float_curve(drago, name, bias):
+    matrix = _scenes()[name]
+    tmo = drago(matrix, bias=bias)
+    output = tmo.tone_map()
+    log_average, l_max = tmo.band_statistics[0]
+    expected = drago.module.drago_curve(matrix.astype(np.float32), log_average, l_max, bias)
+    expected = (expected * 255).clip(0, 255).astype(np.uint8)
+    assert np.abs(output.astype(int) - expected).max() <= 1
+
+
+@pytest.mark.parametrize("name", list(_scenes()))
+def test_tiled_within_one_level_of_global(drago, name):
+    matrix = _scenes()[name]
+    expected = drago(matrix).tone_map()
+    tiled = drago(matrix, tile_size=(24, 20), n_workers=2).tone_map()
+    assert np.abs(tiled.astype(int) - expected).max() <= 1
+
+
+def test_one_table_per_bias(drago):
+    lut = drago.module.tools_lut  # Module chargé par Drago
+    lut.clear_lut_cache()
+    for name, matrix in _scenes().items():
+        drago(matrix, bias=0.85).tone_map()
+    operators = [key[0] for key in lut._LUT_CACHE._entries]
+    assert operators.count("drago_log_base") == 1  # Une table par biais, quelle que soit l'image
+
+
+def test_no_histogram_on_the_hot_path(drago, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("histogramme calculé")
+
+    monkeypatch.setattr(drago.module.tools_statistics.BandStatistics, "_update_histogram", fail)
+    for params in ({}, {"tile_size": 32}):
+        drago(_scenes()["float_hdr"], **params).tone_map()
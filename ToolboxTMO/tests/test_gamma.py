@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Mar 11 14:05:52 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+GAMMAS = (1.0, 1.8, 2.2, 3.0)
+
+
+@pytest.fixture
+def gamma_module(toolbox):
+    return toolbox("TMO", "Gamma")
+
+
+def make_bands(dtype, shape=(64, 48), seed=0):
+    rng = np.random.default_rng(seed)
+    if np.issubdtype(dtype, np.floating):
+        return [rng.random(shape).astype(dtype) for _ in range(2)]
+    return [rng.integers(0, np.iinfo(dtype).max, shape, endpoint=True).astype(dtype) for _ in range(2)]
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+@pytest.mark.parametrize("params", [{}, {"strip_rows": 10, "n_workers": 2}])
+def test_sweep_matches_apply_correction(gamma_module, metadata_file, dtype, params):
+    bands = make_bands(dtype)
+    results = gamma_module.GammaTMO(bands, metadata_file=metadata_file, run_store=False, **params).sweep(GAMMAS)
+    for result in results:
+        expected = gamma_module.GammaTMO(bands, gamma=result["gamma"], metadata_file=metadata_file,
+                                         run_store=False).apply_correction()
+        for a, b, band_metrics in zip(expected, result["output"], result["metrics"]):
+            assert np.array_equal(a, b)
+            # Métriques projetées depuis l'histogramme d'entrée = métriques de la sortie réelle
+            assert band_metrics == gamma_module._histogram_metrics(np.bincount(a.ravel(), minlength=256))
+
+
+def test_sweep_float_within_quantization(gamma_module, metadata_file):
+    bands = make_bands(np.float32)
+    results = gamma_module.GammaTMO(bands, metadata_file=metadata_file, run_store=False).sweep(GAMMAS, metrics=False)
+    for result in results:
+        expected = gamma_module.GammaTMO(bands, gamma=result["gamma"], metadata_file=metadata_file,
+                                         run_store=False).apply_correction()
+        for a, b in zip(expected, result["output"]):
+            assert np.abs(a.astype(np.int16) - b).max() <= 2
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Mar 14 10:05:48 2025
+
+@author: ablot
+"""
+
+import pytest
+
+
+@pytest.fixture
+def options(toolbox):
+    return toolbox("tools", "gdal_options")
+
+
+def as_dict(option_list):
+    return dict(option.split("=", 1) for option in option_list)
+
+
+def test_profiles(options):
+    assert options.creation_options() == []
+    deflate = as_dict(options.creation_options("deflate"))
+    assert deflate["COMPRESS"] == "DEFLATE" and deflate["PREDICTOR"] == "2" and deflate["TILED"] == "YES"
+    with pytest.raises(ValueError, match="inconnu"):
+        options.creation_options("jpeg2000")
+
+
+def test_block_size_and_overrides(options):
+    assert as_dict(options.creation_options(block_size=256)) == {"TILED": "YES", "BLOCKXSIZE": "256",
+                                                                 "BLOCKYSIZE": "256"}
+    tiled = as_dict(options.creation_options("zstd", block_size=(512, 128), options={"zstd_level": 9}))
+    assert (tiled["BLOCKXSIZE"], tiled["BLOCKYSIZE"], tiled["ZSTD_LEVEL"]) == ("512", "128", "9")
+    overridden = as_dict(options.creation_options("lzw", options=["COMPRESS=DEFLATE", "NUM_THREADS=2"]))
+    assert overridden["COMPRESS"] == "DEFLATE" and overridden["NUM_THREADS"] == "2"
+    assert options.CREATION_PROFILES["lzw"]["COMPRESS"] == "LZW"  # Profil inchangé
+
+
+@pytest.mark.parametrize("size, min_size, expected", [
+    ((1024, 768), 256, [2, 4]),
+    ((256, 100), 256, []),
+    ((257, 1), 256, [2]),
+    ((10000, 300), 512, [2, 4, 8, 16, 32]),
+])
+def test_overview_levels(options, size, min_size, expected):
+    assert options.overview_levels(*size, min_size=min_size) == expected
+
+
+def test_cog_options(options):
+    cog = as_dict(options.cog_options(options.creation_options("deflate", block_size=256)
+                                      + ["COPY_SRC_OVERVIEWS=YES"]))
+    assert cog["BLOCKSIZE"] == "256" and cog["PREDICTOR"] == "YES" and cog["COMPRESS"] == "DEFLATE"
+    assert not {"TILED", "BLOCKXSIZE", "BLOCKYSIZE", "COPY_SRC_OVERVIEWS"} & set(cog)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import os
+import numpy as np
+import pytest
+
+from conftest import import_dynamic, toolbox_dir
+
+
+def test_band_luminance_weights(toolbox):
+    luminance = toolbox("tools", "luminance")
+    bands = [np.full((2, 3), value, dtype=np.uint16) for value in (100, 200, 300)]
+    expected = 0.2126 * 100 + 0.7152 * 200 + 0.0722 * 300
+    assert np.allclose(luminance.band_luminance(bands), expected)
+    assert np.allclose(luminance.band_luminance(np.stack(bands), "mean"), 200)
+    with pytest.raises(ValueError):
+        luminance.resolve_weights("rec709", 4)
+
+
+def test_luminance_calculator_shares_the_weights(toolbox):
+    pytest.importorskip("imageio")  # tools/Luminance.py lit les images avec imageio
+    calculator = import_dynamic("Luminance", os.path.join(os.path.dirname(toolbox_dir), "tools", "Luminance.py"))
+    assert os.path.samefile(calculator.tools_luminance.__file__, os.path.join(toolbox_dir, "tools", "luminance.py"))
+    assert calculator.resolve_weights is calculator.tools_luminance.resolve_weights
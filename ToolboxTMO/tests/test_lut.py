@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def lut(toolbox):
+    module = toolbox("tools", "lut")
+    module.clear_lut_cache()
+    yield module
+    module.clear_lut_cache()
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_gamma_table_matches_float_path(lut, dtype):
+    # Même calcul que GammaTMO sans LUT, pour toutes les valeurs possibles du type
+    values = np.arange(np.iinfo(dtype).max + 1, dtype=dtype)
+    expected = (np.power(values.astype(np.float32) / float(np.iinfo(dtype).max), 1 / 2.2) * 255).clip(0, 255)
+    assert np.array_equal(lut.apply_lut(values, "gamma", np.uint8, gamma=2.2), expected.astype(np.uint8))
+
+
+def test_apply_lut_into_strided_output(lut):
+    matrix = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    out = np.zeros((3, 4, 2), dtype=np.float32)
+    lut.apply_lut(matrix, "log1p", np.float32, out=out[:, :, 1])
+    assert np.allclose(out[:, :, 1], np.log1p(matrix.astype(np.float32)))
+    assert not out[:, :, 0].any()
+
+
+def test_cache_is_bounded_in_bytes(lut):
+    cache = lut.LutCache(max_bytes=3 * 65536)
+    for gamma in (1.0, 1.5, 2.0, 2.5, 3.0):
+        cache.put(gamma, lut.compile_lut("gamma", np.uint16, np.uint8, cache=False, gamma=gamma))
+    assert len(cache) == 3 and cache.nbytes == 3 * 65536
+    assert cache.get(1.0) is None and cache.get(3.0) is not None
+
+
+def test_uncached_tables_are_not_kept(lut):
+    lut.compile_lut("gamma", np.uint16, np.uint8, cache=False, gamma=1.7)
+    assert len(lut._LUT_CACHE) == 0
+    lut.compile_lut("gamma", np.uint16, np.uint8, gamma=1.7)
+    assert len(lut._LUT_CACHE) == 1
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import os
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def bands():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:96, 0:80]
+    illumination = 200 + 20000 * (x / 80) * (y / 96)
+    return [np.clip(illumination * tint * rng.normal(1.0, 0.05, x.shape), 0, 65535).astype(np.uint16)
+            for tint in (1.0, 0.6, 0.3)]
+
+
+@pytest.fixture
+def mantiuk(toolbox, metadata_file):
+    module = toolbox("TMO", "Mantiuk")
+
+    def make(pixel_matrices, **params):
+        params.setdefault("sigma", 3)
+        return module.MantiukTMO(pixel_matrices, metadata_file=metadata_file, **params)
+    return make
+
+
+@pytest.mark.parametrize("mode", ["bands", "luminance"])
+@pytest.mark.parametrize("tiling", [{"tile_size": 32}, {"tile_size": (50, 20)}, {"strip_rows": 16}])
+def test_tiled_matches_global(mantiuk, bands, mode, tiling):
+    expected = mantiuk(bands, mode=mode).tone_map()
+    tiled = mantiuk(bands, mode=mode, n_workers=2, **tiling).tone_map()
+    for a, b in zip(expected, tiled):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("mode", ["bands", "luminance"])
+@pytest.mark.parametrize("tiling", [{}, {"tile_size": 32}, {"strip_rows": 16}, {"scratch": True}])
+def test_render_matches_tone_map(toolbox, mantiuk, bands, mode, tiling, tmp_path):
+    module = toolbox("TMO", "Mantiuk")
+    if "scratch" in tiling:
+        tiling = {"scratch": str(tmp_path / "scratch")}
+    params = dict(mode=mode, saturation=0.8, n_workers=2, **tiling)
+    tmo = mantiuk(bands, decomposition_cache=module.DecompositionCache(), **params)
+    tmo.render()  # Décomposition calculée puis réutilisée avec d'autres paramètres
+    rendered = tmo.render(contrast_scaling=0.6, detail_amplification=1.5)
+    expected = mantiuk(bands, contrast_scaling=0.6, detail_amplification=1.5, **params).tone_map()
+    for a, b in zip(expected, rendered):
+        assert np.array_equal(a, b)
+
+
+def test_decomposition_key_depends_on_tiling(toolbox, mantiuk, bands):
+    module = toolbox("TMO", "Mantiuk")
+    cache = module.DecompositionCache()
+    for tiling in ({}, {"tile_size": 32}):
+        rendered = mantiuk(bands, base_filter="pyramid", decomposition_cache=cache, **tiling).render()
+        expected = mantiuk(bands, base_filter="pyramid", **tiling).tone_map()
+        for a, b in zip(expected, rendered):
+            assert np.array_equal(a, b)
+    assert len(cache) == 2
+
+
+def test_decomposition_cache_bounded_by_bytes(toolbox, mantiuk, bands):
+    module = toolbox("TMO", "Mantiuk")
+    entry_bytes = 3 * 2 * bands[0].size * 4  # Base et détails float32 pour trois bandes
+    cache = module.DecompositionCache(max_bytes=int(1.5 * entry_bytes))
+    for sigma in (2, 3):
+        mantiuk(bands, sigma=sigma, decomposition_cache=cache).decompose()
+    assert len(cache) == 1 and cache.nbytes == entry_bytes
+
+    small = module.DecompositionCache(max_bytes=entry_bytes - 1)
+    mantiuk(bands, decomposition_cache=small).decompose()
+    assert len(small) == 0 and small.nbytes == 0
+
+
+def test_result_cache_key_depends_on_tiling(mantiuk, bands, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    for tiling in ({}, {"strip_rows": 16}):
+        expected = mantiuk(bands, base_filter="iir", **tiling).tone_map()
+        for _ in range(2):  # Calcul puis relecture du cache
+            cached = mantiuk(bands, base_filter="iir", cache=cache_dir, **tiling).tone_map()
+            for a, b in zip(expected, cached):
+                assert np.array_equal(a, b)
+    assert len([name for name in os.listdir(cache_dir) if name.endswith(".npz")]) == 2
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import gc
+import threading
+import numpy as np
+
+
+def _writer_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "BufferedMetadataLogger"]
+
+
+def test_released_logger_stops_and_writes(toolbox, metadata_file):
+    metadata = toolbox("tools", "modif_metadata")
+    before = len(_writer_threads())
+    for b in range(5):
+        logger = metadata.BufferedMetadataLogger(metadata_file)
+        logger.log_function_call("step", index=b)
+        del logger
+    gc.collect()
+    assert len(_writer_threads()) == before
+    with open(metadata_file, encoding="utf-8") as file:
+        assert sum(1 for line in file if line.strip()) == 5
+
+
+def test_shared_logger_is_reused(toolbox, metadata_file):
+    metadata = toolbox("tools", "modif_metadata")
+    logger = metadata.BufferedMetadataLogger.shared(metadata_file)
+    assert metadata.BufferedMetadataLogger.shared(metadata_file) is logger
+    logger.close()
+    assert metadata.BufferedMetadataLogger.shared(metadata_file) is not logger
+
+
+def test_inverse_uses_latest_gamma_from_json_lines(toolbox, metadata_file):
+    metadata = toolbox("tools", "modif_metadata")
+    gamma_module = toolbox("TMO", "Gamma")
+    inverse_module = toolbox("TMO", "Gamma_Inverse")
+    logger = metadata.BufferedMetadataLogger(metadata_file)
+    matrix = np.full((4, 4), 1000, dtype=np.uint16)
+    for gamma in (1.8, 2.4):
+        gamma_module.GammaTMO(matrix, metadata_file=metadata_file, metadata_logger=logger,
+                              gamma=gamma).apply_correction()
+    inverse = inverse_module.GammaInverseTMO(matrix.astype(np.uint8), metadata_file=metadata_file,
+                                             metadata_logger=logger)
+    assert inverse.gamma == 2.4  # Registre des exécutions
+    logger.flush()
+    assert inverse._get_gamma_from_metadata(metadata_file) == 2.4  # Repli sur le journal JSON Lines
+
+
+def test_inverse_uses_latest_gamma_from_text(toolbox, metadata_file):
+    gamma_module = toolbox("TMO", "Gamma")
+    inverse_module = toolbox("TMO", "Gamma_Inverse")
+    matrix = np.full((4, 4), 1000, dtype=np.uint16)
+    for gamma in (1.8, 2.4):
+        gamma_module.GammaTMO(matrix, metadata_file=metadata_file, gamma=gamma, run_store=False).apply_correction()
+    inverse = inverse_module.GammaInverseTMO(matrix.astype(np.uint8), metadata_file=metadata_file, run_store=False)
+    assert inverse.gamma == 2.4
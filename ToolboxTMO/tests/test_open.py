@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Mar 12 10:27:14 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+
+@pytest.fixture
+def open_module(toolbox):
+    return toolbox("tools", "open")
+
+
+@pytest.fixture
+def image(tmp_path):
+    data = np.random.default_rng(0).integers(0, 65535, (2, 30, 40), endpoint=True).astype(np.uint16)
+    path = str(tmp_path / "image.tif")
+    dataset = gdal.GetDriverByName("GTiff").Create(path, 40, 30, 2, gdal.GDT_UInt16)
+    for b in range(2):
+        dataset.GetRasterBand(b + 1).WriteArray(data[b])
+    dataset.FlushCache()
+    dataset = None
+    return path, data
+
+
+def test_reads_are_not_memoised_by_default(open_module, image):
+    path, data = image
+    pool = open_module.DatasetPool()
+    reader = open_module.OpenGDAL(path, pool=pool)
+    assert np.array_equal(reader.read_stack(), data)
+    assert pool.get_read((reader.source_key, (1, 2))) is None
+
+
+def test_memoised_reads_are_writable_copies(open_module, image):
+    path, data = image
+    pool = open_module.DatasetPool(max_read_bytes=data.nbytes)
+    first = open_module.OpenGDAL(path, pool=pool).read_stack()
+    first[...] = 0  # Modification sur place par l'appelant
+    second = open_module.OpenGDAL(path, pool=pool).read_stack()
+    assert second.flags.writeable and np.array_equal(second, data)
+    normalized = open_module.OpenGDAL(path, pool=pool).read_stack(normalize=True)
+    assert normalized.dtype == np.float32
+    assert np.allclose(normalized, data / np.float32(65535))
+
+
+def test_normalized_read_without_memoisation(open_module, image):
+    path, data = image
+    pool = open_module.DatasetPool()
+    reader = open_module.OpenGDAL(path, pool=pool)
+    normalized = reader.read_stack(normalize=True)  # Lecture directe en float32
+    assert normalized.dtype == np.float32 and np.allclose(normalized, data / np.float32(65535))
+    assert pool.get_read((reader.source_key, (1, 2))) is None
+
+
+def test_reopened_image_is_served_from_pool(open_module, image):
+    path, data = image
+    pool = open_module.DatasetPool(max_read_bytes=data.nbytes)
+    first = open_module.OpenGDAL(path, pool=pool).get_pixel_matrix(normalize=True)
+    first[0] += 30  # Modification sur place, sans effet sur la lecture mémorisée
+    reader = open_module.OpenGDAL(path, pool=pool)
+    assert pool.get_read((reader.source_key, (1, 2))) is not None
+    second = reader.get_pixel_matrix(normalize=True)
+    assert np.allclose(np.stack(second), data / np.float32(65535))
+
+
+def test_readers_share_dataset_and_lock(open_module, image):
+    path, _ = image
+    pool = open_module.DatasetPool()
+    first, second = open_module.OpenGDAL(path, pool=pool), open_module.OpenGDAL(path, pool=pool)
+    assert first.dataset is second.dataset and first._dataset_lock is second._dataset_lock
+
+
+@pytest.mark.parametrize("text, expected", [
+    (None, None), ("", None), ("tci", "tci"), (" IRC ", "IRC"),
+    ("4,3,2", [4, 3, 2]), ("4", [4]), ("B4, B03,8", ["B4", "B03", 8]),
+])
+def test_parse_bands(open_module, text, expected):
+    assert open_module.parse_bands(text) == expected
+
+
+def test_parsed_indices_resolve(open_module, image):
+    path, data = image
+    reader = open_module.OpenGDAL(path, pool=open_module.DatasetPool())
+    assert reader.resolve_bands(open_module.parse_bands("2,1")) == [2, 1]
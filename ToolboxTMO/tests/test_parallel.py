@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Mar 13 11:02:37 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+# Réglage parallèle comparé au traitement séquentiel (bandes de lignes qui ne divisent pas la hauteur)
+PARALLEL = {"n_workers": 4, "strip_rows": 7}
+
+
+def make_bands(dtype, shape=(45, 38), seed=0):
+    rng = np.random.default_rng(seed)
+    if dtype == "float255":
+        return [(rng.random(shape) * 255).astype(np.float32) for _ in range(3)]
+    if np.issubdtype(dtype, np.floating):
+        return [rng.random(shape).astype(dtype) for _ in range(3)]
+    return [rng.integers(0, np.iinfo(dtype).max, shape, endpoint=True).astype(dtype) for _ in range(3)]
+
+
+def assert_identical(expected, actual):
+    assert len(expected) == len(actual)
+    for a, b in zip(expected, actual):
+        assert a.dtype == b.dtype and np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_gamma_parallel_matches_serial(toolbox, metadata_file, dtype):
+    module = toolbox("TMO", "Gamma")
+    bands = make_bands(dtype)
+    expected = module.GammaTMO(bands, metadata_file=metadata_file, run_store=False).apply_correction()
+    actual = module.GammaTMO(bands, metadata_file=metadata_file, run_store=False, **PARALLEL).apply_correction()
+    assert_identical(expected, actual)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32, "float255"])
+def test_gamma_inverse_parallel_matches_serial(toolbox, metadata_file, dtype):
+    module = toolbox("TMO", "Gamma_Inverse")
+    with open(metadata_file, "w", encoding="utf-8") as file:
+        file.write("gamma: 2.2\n")
+    bands = make_bands(dtype)
+    expected = module.GammaInverseTMO(bands, metadata_file=metadata_file, run_store=False).apply_inverse_correction()
+    actual = module.GammaInverseTMO(bands, metadata_file=metadata_file, run_store=False,
+                                    **PARALLEL).apply_inverse_correction()
+    assert_identical(expected, actual)
+
+
+@pytest.mark.parametrize("mode", ["bands", "luminance"])
+@pytest.mark.parametrize("base_filter", ["exact", "pyramid", "iir"])
+def test_mantiuk_parallel_matches_serial(toolbox, metadata_file, mode, base_filter):
+    module = toolbox("TMO", "Mantiuk")
+    bands = make_bands(np.uint16)
+
+    def tone_map(**params):
+        return module.MantiukTMO(bands, metadata_file=metadata_file, run_store=False, sigma=3, mode=mode,
+                                 base_filter=base_filter, **params).tone_map()
+
+    # Même découpage, threads ou non ; les filtres approchés dépendent du découpage, pas des threads
+    assert_identical(tone_map(strip_rows=PARALLEL["strip_rows"]), tone_map(**PARALLEL))
+    if base_filter == "exact":
+        assert_identical(tone_map(), tone_map(**PARALLEL))
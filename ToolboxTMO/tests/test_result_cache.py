@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 17 09:22:48 2025
+
+@author: ablot
+"""
+
+import os
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def result_cache(toolbox):
+    return toolbox("tools", "result_cache")
+
+
+@pytest.fixture
+def cache(result_cache, tmp_path):
+    return result_cache.ResultCache(str(tmp_path / "cache"))
+
+
+def matrices(seed=0, shape=(20, 16)):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 65535, shape, dtype=np.uint16) for _ in range(2)]
+
+
+def files(cache):
+    return sorted(os.listdir(cache.directory))
+
+
+def test_hits_and_misses(result_cache, cache):
+    inputs, calls = matrices(), []
+
+    def compute():
+        calls.append(1)
+        return [matrix // 2 for matrix in inputs]
+
+    first, from_cache = result_cache.cached_result(cache, "GammaTMO", {"gamma": 2.2}, inputs, compute)
+    assert not from_cache and (cache.hits, cache.misses) == (0, 1)
+    second, from_cache = result_cache.cached_result(cache, "GammaTMO", {"gamma": 2.2}, inputs, compute)
+    assert from_cache and (cache.hits, cache.misses) == (1, 1) and len(calls) == 1
+    for a, b in zip(first, second):
+        assert a.dtype == b.dtype and np.array_equal(a, b)
+    assert result_cache.cached_result(None, "GammaTMO", {"gamma": 2.2}, inputs, compute)[1] is False
+
+
+def test_key_sensitivity(cache):
+    inputs = matrices()
+    key = cache.make_key("GammaTMO", {"gamma": 2.2}, inputs)
+    assert cache.make_key("GammaTMO", {"gamma": 2.2}, [matrix.copy() for matrix in inputs]) == key
+    changed = [inputs[0].copy(), inputs[1]]
+    changed[0][3, 4] ^= 1  # Un seul pixel modifié
+    others = [
+        cache.make_key("GammaTMO", {"gamma": 2.4}, inputs),
+        cache.make_key("GammaInverseTMO", {"gamma": 2.2}, inputs),
+        cache.make_key("GammaTMO", {"gamma": 2.2}, changed),
+        cache.make_key("GammaTMO", {"gamma": 2.2}, [matrix.astype(np.int32) for matrix in inputs]),
+        cache.make_key("GammaTMO", {"gamma": 2.2}, inputs[:1]),
+    ]
+    assert len({key, *others}) == len(others) + 1
+
+
+def test_lru_eviction(result_cache, tmp_path):
+    entry_files = []
+    probe = result_cache.ResultCache(str(tmp_path / "probe"))
+    probe.put("probe", matrices())
+    entry_bytes = probe.size_bytes()
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=int(2.5 * entry_bytes))
+    for seed, key in enumerate(("a", "b")):
+        cache.put(key, matrices(seed + 1))
+        entry_files.append(cache._path(key))
+        os.utime(entry_files[-1], ns=(seed * 10 ** 9, seed * 10 ** 9))  # "a" plus ancien que "b"
+    assert cache.get("a") is not None  # "a" redevient la plus récemment utilisée
+    cache.put("c", matrices(3))
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size_bytes() <= cache.max_bytes
+
+
+def test_interrupted_put_leaves_no_entry(result_cache, cache, monkeypatch):
+    def interrupted(path, **arrays):
+        with open(path, "wb") as file:
+            file.write(b"PK\x03\x04partiel")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(result_cache.np, "savez_compressed", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        cache.put("key", matrices())
+    assert files(cache) == []
+    assert cache.get("key") is None
+
+
+@pytest.mark.parametrize("damage", ["garbage", "truncated", "corrupted"])
+def test_damaged_entry_is_a_miss(cache, damage):
+    cache.put("key", matrices())
+    path = cache._path("key")
+    with open(path, "rb") as file:
+        content = bytearray(file.read())
+    if damage == "garbage":
+        content = b"pas une archive"
+    elif damage == "truncated":
+        content = content[:len(content) // 2]
+    else:
+        middle = len(content) // 3
+        content[middle:middle + 64] = bytes(64)  # Données compressées invalides
+    with open(path, "wb") as file:
+        file.write(content)
+    assert cache.get("key") is None and cache.misses == 1
+    assert not os.path.exists(path)
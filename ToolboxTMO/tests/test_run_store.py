@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import os
+import sqlite3
+import numpy as np
+import pytest
+
+
+def test_store_is_created_on_first_record(toolbox, tmp_path):
+    run_store = toolbox("tools", "run_store")
+    store = run_store.RunParameterStore(str(tmp_path / "runs.sqlite"))
+    assert not os.path.exists(store.store_path)
+    assert store.latest_run("GammaTMO") is None and store.get_run("absent") is None
+    assert not os.path.exists(store.store_path)
+
+    run_id = store.record_run("GammaTMO", {"gamma": 2.2}, image_key="scene")
+    assert store.get_run(run_id)["params"] == {"gamma": 2.2}
+    assert store.latest_run("GammaTMO", image_key="scene")["run_id"] == run_id
+
+
+def test_connections_are_closed(toolbox, tmp_path, monkeypatch):
+    run_store = toolbox("tools", "run_store")
+    opened, sqlite_connect = [], sqlite3.connect
+
+    def connect(*args, **kwargs):
+        opened.append(sqlite_connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(run_store.sqlite3, "connect", connect)
+    store = run_store.RunParameterStore(str(tmp_path / "runs.sqlite"))
+    store.record_run("GammaTMO", {"gamma": 2.2})
+    store.latest_run("GammaTMO")
+    assert len(opened) == 2
+    for connection in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")  # Connexion fermée
+
+
+def test_run_store_can_be_disabled(toolbox, tmp_path):
+    gamma_module = toolbox("TMO", "Gamma")
+    metadata_file = str(tmp_path / "metadata.txt")
+    tmo = gamma_module.GammaTMO(np.zeros((4, 4), np.uint16), metadata_file=metadata_file, run_store=False)
+    tmo.apply_correction()
+    assert tmo.run_id is None
+    assert not os.path.exists(str(tmp_path / "metadata_runs.sqlite"))
+
+
+@pytest.mark.parametrize("image_key", [None, "scene"])
+def test_latest_run_uses_an_index(toolbox, tmp_path, image_key):
+    run_store = toolbox("tools", "run_store")
+    store = run_store.RunParameterStore(str(tmp_path / "runs.sqlite"))
+    for gamma, key in ((1.8, "scene"), (2.2, "other"), (2.4, "scene")):
+        store.record_run("GammaTMO", {"gamma": gamma}, image_key=key)
+    assert store.latest_run("GammaTMO", image_key=image_key)["params"]["gamma"] == 2.4
+    query = "SELECT run_id FROM runs WHERE operator = ?" + (" AND image_key = ?" if image_key else "") \
+            + " ORDER BY created DESC, rowid DESC LIMIT 1"
+    args = ("GammaTMO", image_key) if image_key else ("GammaTMO",)
+    with sqlite3.connect(store.store_path) as connection:
+        plan = " ".join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + query, args))
+    assert "USING INDEX" in plan and "TEMP B-TREE" not in plan
+
+
+def test_inverse_uses_forward_run_id(toolbox, metadata_file):
+    gamma_module = toolbox("TMO", "Gamma")
+    inverse_module = toolbox("TMO", "Gamma_Inverse")
+    matrix = np.full((4, 4), 1000, dtype=np.uint16)
+    first = gamma_module.GammaTMO(matrix, metadata_file=metadata_file, gamma=1.8)
+    first.apply_correction()
+    gamma_module.GammaTMO(matrix, metadata_file=metadata_file, gamma=2.4).apply_correction()  # Autre image
+    inverse = inverse_module.GammaInverseTMO(matrix.astype(np.uint8), metadata_file=metadata_file,
+                                             run_id=first.run_id)
+    assert inverse.gamma == 1.8
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Mar 14 10:41:26 2025
+
+@author: ablot
+"""
+
+import os
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+GEOTRANSFORM = (600000.0, 10.0, 0.0, 5000000.0, 0.0, -10.0)
+
+
+def write_tif(path, data):
+    dataset = gdal.GetDriverByName("GTiff").Create(path, data.shape[2], data.shape[1], data.shape[0],
+                                                   gdal.GDT_UInt16 if data.dtype == np.uint16 else gdal.GDT_Byte)
+    dataset.SetGeoTransform(GEOTRANSFORM)
+    for b, band in enumerate(data):
+        dataset.GetRasterBand(b + 1).WriteArray(band)
+    dataset.FlushCache()
+    dataset = None
+    return path
+
+
+def read_tif(path):
+    dataset = gdal.Open(path)
+    data = dataset.ReadAsArray()
+    return dataset, data[np.newaxis] if data.ndim == 2 else data
+
+
+@pytest.fixture
+def save(toolbox):
+    return toolbox("tools", "save")
+
+
+@pytest.fixture
+def image(tmp_path, toolbox):
+    data = np.random.default_rng(0).integers(0, 65535, (2, 30, 40), endpoint=True).astype(np.uint16)
+    path = write_tif(str(tmp_path / "image.tif"), data)
+    reader = toolbox("tools", "open").OpenGDAL(path, pool=False)
+    return reader, data
+
+
+@pytest.mark.parametrize("source", ["reader", "details", "dataset", "file"])
+def test_details_sources(save, image, tmp_path, source):
+    reader, data = image
+    details_file = str(tmp_path / "details.txt")
+    reader.save_metadata(details_file)
+    details = {"reader": reader, "details": reader.details, "dataset": reader.dataset, "file": details_file}[source]
+    writer = save.CreateImageFromDetails(list(data), details, f"out_{source}", output_dir=str(tmp_path))
+    writer.create_image()
+    dataset, written = read_tif(writer.output_image_path)
+    assert np.array_equal(written, data)
+    assert dataset.GetGeoTransform() == pytest.approx(GEOTRANSFORM)
+
+
+def test_details_file_parsed_once(save, image, tmp_path):
+    reader, data = image
+    details_file = str(tmp_path / "details.txt")
+    reader.save_metadata(details_file)
+    save._parse_details_file.cache_clear()
+    for name in ("a", "b"):
+        save.CreateImageFromDetails(list(data), details_file, name, output_dir=str(tmp_path))
+    info = save._parse_details_file.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+
+    stat = os.stat(details_file)
+    os.utime(details_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))  # Fichier réécrit
+    save.CreateImageFromDetails(list(data), details_file, "c", output_dir=str(tmp_path))
+    assert save._parse_details_file.cache_info().misses == 2
+
+
+def test_profile_and_block_size(save, image, tmp_path):
+    reader, data = image
+    writer = save.CreateImageFromDetails(list(data), reader, "deflate", output_dir=str(tmp_path),
+                                         profile="deflate", block_size=16)
+    writer.create_image()
+    dataset, written = read_tif(writer.output_image_path)
+    assert np.array_equal(written, data)
+    assert dataset.GetMetadata("IMAGE_STRUCTURE").get("COMPRESSION") == "DEFLATE"
+    assert list(dataset.GetRasterBand(1).GetBlockSize()) == [16, 16]
+    assert writer.write_report["raw_bytes"] == data.nbytes
+
+
+def test_write_blocks(save, image, tmp_path):
+    reader, data = image
+    writer = save.CreateImageFromDetails(None, reader, "blocks", output_dir=str(tmp_path), profile="tiled",
+                                         block_size=16)
+    writer.write_blocks(reader.iter_blocks(tile_size=16, normalize=False))
+    _, written = read_tif(writer.output_image_path)
+    assert np.array_equal(written, data)
+
+
+def test_cog_output(save, tmp_path, toolbox):
+    data = np.random.default_rng(1).integers(0, 255, (1, 600, 520), endpoint=True).astype(np.uint8)
+    reader = toolbox("tools", "open").OpenGDAL(write_tif(str(tmp_path / "large.tif"), data), pool=False)
+    writer = save.CreateImageFromDetails(list(data), reader, "cog", output_dir=str(tmp_path), profile="deflate",
+                                         cog=True, overview_min_size=128)
+    writer.create_image()
+    dataset, written = read_tif(writer.output_image_path)
+    assert np.array_equal(written, data)
+    assert dataset.GetRasterBand(1).GetOverviewCount() == len(save.overview_levels(520, 600, 128))
+    assert not os.path.exists(writer._cog_scratch_path())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import gc
+import os
+import numpy as np
+
+
+def test_arrays_outlive_their_scratch_space(toolbox, tmp_path):
+    scratch = toolbox("tools", "scratch")
+    space = scratch.open_scratch(str(tmp_path))
+    matrix = space.empty((64, 64), np.float32)
+    view = matrix[10:20]
+    directory, path = space.directory, matrix.filename
+    del space, matrix
+    gc.collect()
+
+    # Espace libéré : le fichier de la vue encore utilisée est conservé
+    assert os.path.exists(path)
+    view[...] = 1.5
+    assert float(view.sum()) == 1.5 * view.size
+
+    del view
+    gc.collect()
+    assert not os.path.exists(path) and not os.path.exists(directory)
+
+
+def test_released_array_removes_its_file(toolbox, tmp_path):
+    scratch = toolbox("tools", "scratch")
+    with scratch.ScratchSpace(str(tmp_path)) as space:
+        matrix = space.empty((32, 32), np.uint8)
+        path = matrix.filename
+        del matrix
+        gc.collect()
+        assert not os.path.exists(path)
+        assert os.path.isdir(space.directory)
+        space.empty((32, 32), np.uint8)
+    assert not os.path.exists(space.directory)
+
+
+def test_tmo_output_survives_owned_scratch(toolbox, metadata_file, tmp_path):
+    gamma_module = toolbox("TMO", "Gamma")
+    matrix = np.random.default_rng(0).integers(0, 65535, (40, 30), dtype=np.uint16)
+    output = gamma_module.GammaTMO(matrix, metadata_file=metadata_file, run_store=False,
+                                   scratch=str(tmp_path)).apply_correction()
+    gc.collect()
+    assert os.path.exists(output.filename)
+    expected = gamma_module.GammaTMO(matrix, metadata_file=metadata_file, run_store=False).apply_correction()
+    assert np.array_equal(output, expected)
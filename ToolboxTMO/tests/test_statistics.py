@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Mar 10 09:12:40 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def statistics(toolbox):
+    return toolbox("tools", "statistics")
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int16])
+def test_streamed_statistics_match_global(statistics, monkeypatch, dtype):
+    monkeypatch.setattr(statistics, "STATISTICS_STRIP_ROWS", 7)  # Plusieurs bandes de lignes
+    info = np.iinfo(dtype)
+    bands = [np.random.default_rng(b).integers(info.min, info.max, (50, 40), dtype=dtype, endpoint=True)
+             for b in range(2)]
+    result = statistics.compute_statistics(bands)
+    for b, band in enumerate(bands):
+        values = band.astype(np.float64)
+        assert result.count[b] == band.size
+        assert (result.minimum[b], result.maximum[b]) == (values.min(), values.max())
+        assert result.mean[b] == pytest.approx(values.mean(), rel=1e-12)
+        assert result.variance[b] == pytest.approx(values.var(), rel=1e-12)
+        # Histogramme à une classe par valeur : percentiles exacts
+        assert np.array_equal(result.percentile([2, 50, 98])[b],
+                              np.percentile(values, [2, 50, 98], method="inverted_cdf"))
+
+
+def test_merged_accumulators_match_single_pass(statistics):
+    stack = np.random.default_rng(4).integers(0, 4096, (3, 60, 30), dtype=np.uint16)
+    single = statistics.BandStatistics().update(stack)
+    merged = statistics.BandStatistics().update(stack[:, :25]).merge(statistics.BandStatistics().update(stack[:, 25:]))
+    assert np.array_equal(single.histogram, merged.histogram)
+    assert np.allclose(single.mean, merged.mean, rtol=1e-12) and np.allclose(single.variance, merged.variance)
+
+
+def test_signed_integers(statistics):
+    result = statistics.BandStatistics().update(np.array([[-5, 3]], np.int16))
+    assert result.summary(percentiles=(0, 100))[0]["p0"] == -5
+    assert result.percentile(100)[0] == 3
+
+
+def test_float_range_is_derived_from_data(statistics):
+    band = np.random.default_rng(5).uniform(100.0, 5000.0, (40, 40)).astype(np.float32)
+    result = statistics.compute_statistics(band)
+    assert result.value_range == (float(band.min()), float(band.max()))
+    assert result.percentile(50)[0] == pytest.approx(np.median(band), rel=0.01)
+
+
+def test_float_without_range_is_rejected(statistics):
+    with pytest.raises(ValueError, match="value_range"):
+        statistics.BandStatistics().update(np.zeros((2, 2), np.float32))
+
+
+def test_float_statistics_skip_non_finite(statistics, monkeypatch):
+    monkeypatch.setattr(statistics, "STATISTICS_STRIP_ROWS", 7)
+    band = np.random.default_rng(3).normal(100.0, 20.0, (50, 40)).astype(np.float32)
+    band[3, 5], band[20, 7], band[41, 0] = np.nan, np.inf, -np.inf
+    result = statistics.compute_statistics(band)
+    finite = band[np.isfinite(band)].astype(np.float64)
+    assert result.count[0] == finite.size
+    assert (result.minimum[0], result.maximum[0]) == (finite.min(), finite.max())
+    assert result.mean[0] == pytest.approx(finite.mean(), rel=1e-9)
+    assert result.variance[0] == pytest.approx(finite.var(), rel=1e-6)
+    assert result.bin_edges[0] == finite.min() and result.bin_edges[-1] == finite.max()
+    bin_width = result.bin_edges[1] - result.bin_edges[0]
+    assert np.abs(result.percentile([2, 50, 98])[0] - np.percentile(finite, [2, 50, 98])).max() <= 2 * bin_width
+
+
+def test_moments_without_histogram(statistics):
+    bands = [np.random.default_rng(b).normal(0.0, 3.0, (30, 20)) for b in range(2)]
+    full = statistics.BandStatistics(value_range=(-20.0, 20.0))
+    moments = statistics.BandStatistics(histogram=False)  # Aucune borne requise pour des flottants
+    partial = statistics.BandStatistics(histogram=False)
+    for rows in (slice(0, 12), slice(12, 30)):
+        full.update([band[rows] for band in bands])
+        (moments if rows.start == 0 else partial).update([band[rows] for band in bands])
+    moments.merge(partial)
+    assert moments.histogram is None
+    assert np.array_equal(moments.count, full.count)
+    assert np.array_equal(moments.minimum, full.minimum) and np.array_equal(moments.maximum, full.maximum)
+    assert np.allclose(moments.mean, full.mean) and np.allclose(moments.variance, full.variance)
+    assert "p50" not in moments.summary()[0]
+    with pytest.raises(ValueError, match="histogramme"):
+        moments.percentile(50)
+    with pytest.raises(ValueError):
+        full.merge(moments)
@@ -8,15 +8,59 @@ Created on Sun Jan 26 10:03:46 2025
 import matplotlib.pyplot as plt
 import numpy as np
 
+# Taille maximale (pixels) du plus grand côté d'une image affichée en mode aperçu
+PREVIEW_SIZE = 1024
+
+
+class _PreviewSource:
+    """
+    Source d'une image affichée en mode aperçu : matrice en mémoire (sous-échantillonnée par pas,
+    sans copie) ou image ouverte avec OpenGDAL (lecture réduite, via les aperçus GDAL s'ils existent).
+    """
+    def __init__(self, image, bands=None):
+        if hasattr(image, "dataset"):
+            # Objet OpenGDAL : 3 bandes en RVB si disponibles, sinon la première bande
+            self.reader = image
+            count = image.dataset.RasterCount
+            self.bands = image.resolve_bands(bands) if bands is not None else ([1, 2, 3] if count >= 3 else [1])
+            self.width, self.height = image.dataset.RasterXSize, image.dataset.RasterYSize
+        else:
+            # Liste de 3 matrices 2D : canaux RVB, empilés seulement après sous-échantillonnage
+            self.reader = None
+            self.matrices = (image if len(image) == 3 else image[:1]) if isinstance(image, list) else [image]
+            self.height, self.width = self.matrices[0].shape[:2]
+
+    def read(self, x0, x1, y0, y1, max_size):
+        """
+        Lit la zone [x0, x1[ x [y0, y1[ (coordonnées pleine résolution), réduite à max_size pixels au plus.
+        :return: Image (hauteur, largeur) ou (hauteur, largeur, canaux) à afficher.
+        """
+        if self.reader is not None:
+            stack = self.reader.read_decimated(max_size, x0, y0, x1 - x0, y1 - y0, bands=self.bands)
+            return stack[0] if len(stack) == 1 else stack.transpose(1, 2, 0)
+        step = max(1, -(-max(x1 - x0, y1 - y0) // max_size))
+        views = [matrix[y0:y1:step, x0:x1:step] for matrix in self.matrices]
+        return views[0] if len(views) == 1 else np.stack(views, axis=-1)
+
+
 class ImageDisplay:
-    def __init__(self, images, titles=None):
+    def __init__(self, images, titles=None, preview=False, preview_size=PREVIEW_SIZE, bands=None):
         """
         Initialise la classe d'affichage d'images.
         :param images: Liste d'images ou de matrices (2D pour niveaux de gris, 3D pour RGB).
+                       En mode aperçu, une image peut aussi être un objet OpenGDAL.
         :param titles: Liste des titres pour chaque image (optionnel).
+        :param preview: Si True, les images sont affichées réduites à preview_size pixels, avec des axes
+                        partagés ; un zoom recharge la zone visible, en pleine résolution dès qu'elle
+                        tient dans preview_size pixels.
+        :param preview_size: Taille maximale (pixels) du plus grand côté d'une image affichée en mode aperçu.
+        :param bands: Bandes affichées pour les objets OpenGDAL (cf. OpenGDAL.resolve_bands).
         """
         self.images = images if isinstance(images, list) else [images]
         self.titles = titles if titles else [f"Image {i+1}" for i in range(len(self.images))]
+        self.preview = preview
+        self.preview_size = preview_size
+        self.bands = bands
         
         if len(self.images) != len(self.titles):
             raise ValueError("Le nombre d'images et de titres doit être identique.")
@@ -26,6 +70,9 @@ class ImageDisplay:
         Affiche les images côte à côte.
         :param cmap: Colormap pour les images en niveaux de gris (par défaut : 'gray').
         """
+        if self.preview:
+            return self._show_preview(cmap)
+
         num_images = len(self.images)
         plt.figure(figsize=(10 * num_images, 5))
 
@@ -49,19 +96,68 @@ class ImageDisplay:
 
         plt.show()
 
+    def _show_preview(self, cmap):
+        """
+        Affiche les images en mode aperçu, avec axes partagés pour la comparaison côte à côte.
+        À chaque zoom ou déplacement, la zone visible de chaque image est relue à la résolution de l'écran.
+        """
+        sources = [_PreviewSource(img, self.bands) for img in self.images]
+
+        num_images = len(sources)
+        same_size = len({(source.width, source.height) for source in sources}) == 1
+        fig, axes = plt.subplots(1, num_images, figsize=(min(10 * num_images, 20), 5),
+                                 sharex=same_size, sharey=same_size, squeeze=False)
+
+        views = []
+        for ax, source, title in zip(axes[0], sources, self.titles):
+            data = source.read(0, source.width, 0, source.height, self.preview_size)
+            artist = ax.imshow(self._prepare_for_display(data), cmap=cmap,
+                               extent=(-0.5, source.width - 0.5, source.height - 0.5, -0.5))
+            ax.set_autoscale_on(False)
+            ax.set_title(title)
+            ax.axis("off")
+            views.append((ax, source, artist))
+
+        def refresh(_):
+            # Relit la zone visible de chaque image (une seule fois par changement de limites)
+            for ax, source, artist in views:
+                (left, right), (bottom, top) = ax.get_xlim(), ax.get_ylim()
+                x0 = max(0, int(np.floor(min(left, right) + 0.5)))
+                x1 = min(source.width, int(np.ceil(max(left, right) + 0.5)))
+                y0 = max(0, int(np.floor(min(top, bottom) + 0.5)))
+                y1 = min(source.height, int(np.ceil(max(top, bottom) + 0.5)))
+                if x1 <= x0 or y1 <= y0 or getattr(artist, "_preview_region", None) == (x0, x1, y0, y1):
+                    continue
+                artist.set_data(self._prepare_for_display(source.read(x0, x1, y0, y1, self.preview_size)))
+                artist.set_extent((x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5))
+                artist._preview_region = (x0, x1, y0, y1)
+            fig.canvas.draw_idle()
+
+        # Les deux limites sont mises à jour lors d'un zoom : ylim_changed est émis en dernier
+        for ax, _, _ in views:
+            ax.callbacks.connect("ylim_changed", refresh)
+        plt.show()
+        return fig
+
+    @staticmethod
+    def _prepare_for_display(img):
+        """
+        Prépare une image pour imshow sans conversion en float64 : les images en niveaux de gris
+        sont étirées par imshow (vmin/vmax), les images RVB 8 bits sont affichées telles quelles.
+        Seules les images RVB 16 bits sont converties (en float32 entre 0 et 1).
+        """
+        if img.ndim == 3 and img.dtype == np.uint16:
+            return img.astype(np.float32) / 65535
+        return img
+
     def _show_single_image(self, img, cmap):
         """
         Affiche une seule image en tenant compte de son type (niveau de gris ou RGB).
         :param img: L'image à afficher (matrice numpy).
         :param cmap: Colormap pour les images en niveaux de gris.
         """
-        # Vérifier la profondeur de l'image (8 bits ou 16 bits)
-        if img.dtype == np.uint16:
-            # Si l'image est en 16 bits, normaliser les valeurs entre 0 et 1
-            img = img.astype(float) / 65535  # Normalisation pour affichage
-        elif img.dtype == np.uint8:
-            # Si l'image est en 8 bits, aucun besoin de normalisation
-            img = img.astype(float) / 255  # Optionnel : normaliser pour afficher en flottant entre 0 et 1
+        # Les images 8 et 16 bits sont passées sans copie en flottant (cf. _prepare_for_display)
+        img = self._prepare_for_display(img)
 
         if len(img.shape) == 2:  # Image en niveaux de gris
             plt.imshow(img, cmap=cmap)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Feb 11 10:05:37 2025
+
+@author: ablot
+"""
+
+import time
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from scipy.signal import lfilter, lfilter_zi
+
+
+############################## Filtres de couche de base #####################
+
+def gaussian_exact(image, sigma, truncate=4.0):
+    """
+    Filtre gaussien exact (scipy.ndimage), coût proportionnel à sigma.
+    :param image: Matrice 2D float32.
+    :param sigma: Écart-type du filtre (pixels).
+    :param truncate: Troncature du noyau, en nombre de sigma.
+    :return: Matrice filtrée, même forme que l'entrée.
+    """
+    return gaussian_filter(image, sigma=sigma, truncate=truncate)
+
+
+def _block_mean(image, factor):
+    """
+    Sous-échantillonne une matrice par moyenne sur des blocs factor x factor.
+    Les bords sont complétés par réplication pour obtenir un multiple de factor.
+    """
+    height, width = image.shape
+    pad_y, pad_x = (-height) % factor, (-width) % factor
+    if pad_y or pad_x:
+        image = np.pad(image, ((0, pad_y), (0, pad_x)), mode="edge")
+    small_h, small_w = image.shape[0] // factor, image.shape[1] // factor
+    return image.reshape(small_h, factor, small_w, factor).mean(axis=(1, 3), dtype=np.float32)
+
+
+def _upsample_linear(small, factor, size, axis):
+    """
+    Sur-échantillonne une matrice le long d'un axe par interpolation linéaire,
+    les échantillons basse résolution étant situés au centre des blocs.
+    """
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / factor - 0.5
+    coords = np.clip(coords, 0, small.shape[axis] - 1)
+    index = np.minimum(coords.astype(np.intp), small.shape[axis] - 2) if small.shape[axis] > 1 \
+        else np.zeros(size, dtype=np.intp)
+    weight = (coords - index).astype(np.float32)
+    lower = np.take(small, index, axis=axis)
+    upper = np.take(small, np.minimum(index + 1, small.shape[axis] - 1), axis=axis)
+    shape = [1, 1]
+    shape[axis] = size
+    weight = weight.reshape(shape)
+    return lower + (upper - lower) * weight
+
+
+def gaussian_pyramid(image, sigma, min_sigma=2.0, truncate=4.0):
+    """
+    Approximation pyramidale : sous-échantillonnage -> flou gaussien -> sur-échantillonnage.
+    Le facteur de réduction est la plus grande puissance de 2 laissant un sigma d'au moins
+    min_sigma à basse résolution, ce qui divise le coût par environ facteur^3.
+    :param image: Matrice 2D float32.
+    :param sigma: Écart-type du filtre (pixels pleine résolution).
+    :param min_sigma: Sigma minimal conservé à basse résolution.
+    :param truncate: Troncature du noyau, en nombre de sigma.
+    :return: Matrice filtrée, même forme que l'entrée.
+    """
+    level = int(np.floor(np.log2(sigma / min_sigma))) if sigma > min_sigma else 0
+    factor = 2 ** max(level, 0)
+    if factor == 1:
+        return gaussian_exact(image, sigma, truncate)
+
+    height, width = image.shape
+    small = _block_mean(image, factor)
+
+    # La moyenne par blocs apporte déjà une variance (factor^2 - 1) / 12
+    small_sigma = np.sqrt(max(sigma ** 2 - (factor ** 2 - 1) / 12.0, 0.0)) / factor
+    small = gaussian_filter(small, sigma=small_sigma, truncate=truncate)
+
+    rows = _upsample_linear(small, factor, height, axis=0)
+    return _upsample_linear(rows, factor, width, axis=1).astype(image.dtype, copy=False)
+
+
+def _young_van_vliet_coefficients(sigma):
+    """
+    Coefficients du filtre gaussien récursif d'ordre 3 de Young et van Vliet (1995).
+    :return: Tuple (b, a) utilisable avec scipy.signal.lfilter.
+    """
+    if sigma >= 2.5:
+        q = 0.98711 * sigma - 0.96330
+    else:
+        q = 3.97156 - 4.14554 * np.sqrt(1.0 - 0.26891 * sigma)
+
+    b0 = 1.57825 + 2.44413 * q + 1.4281 * q ** 2 + 0.422205 * q ** 3
+    b1 = 2.44413 * q + 2.85619 * q ** 2 + 1.26661 * q ** 3
+    b2 = -(1.4281 * q ** 2 + 1.26661 * q ** 3)
+    b3 = 0.422205 * q ** 3
+    gain = 1.0 - (b1 + b2 + b3) / b0
+    return np.array([gain]), np.array([1.0, -b1 / b0, -b2 / b0, -b3 / b0])
+
+
+def _recursive_pass(image, b, a, axis):
+    """
+    Passe causale puis anti-causale du filtre récursif le long d'un axe.
+    Les conditions initiales correspondent à un prolongement constant des bords.
+    """
+    zi = lfilter_zi(b, a)
+    zi_shape = [1, 1]
+    zi_shape[axis] = len(zi)
+    zi = zi.reshape(zi_shape)
+
+    edge = np.take(image, [0], axis=axis)
+    forward, _ = lfilter(b, a, image, axis=axis, zi=zi * edge)
+
+    forward = np.flip(forward, axis=axis)
+    edge = np.take(forward, [0], axis=axis)
+    backward, _ = lfilter(b, a, forward, axis=axis, zi=zi * edge)
+    return np.flip(backward, axis=axis)
+
+
+def gaussian_iir(image, sigma, truncate=4.0):
+    """
+    Filtre gaussien récursif (IIR) de Young et van Vliet : coût par pixel indépendant de sigma.
+    Les bords sont prolongés par symétrie sur truncate * sigma pixels, comme le mode
+    "reflect" de scipy ; seul ce prolongement dépend de sigma.
+    :param image: Matrice 2D float32.
+    :param sigma: Écart-type du filtre (pixels), idéalement >= 0.5.
+    :param truncate: Largeur du prolongement des bords, en nombre de sigma.
+    :return: Matrice filtrée, même forme et même type que l'entrée.
+    """
+    b, a = _young_van_vliet_coefficients(sigma)
+    margin = int(truncate * sigma + 0.5)
+    padded = np.pad(image, margin, mode="symmetric")
+
+    filtered = _recursive_pass(padded, b, a, axis=0)
+    filtered = _recursive_pass(filtered, b, a, axis=1)
+    filtered = filtered[margin:margin + image.shape[0], margin:margin + image.shape[1]]
+    return filtered.astype(image.dtype)
+
+
+# Moteurs disponibles pour la couche de base
+BASE_FILTERS = {
+    "exact": gaussian_exact,
+    "pyramid": gaussian_pyramid,
+    "iir": gaussian_iir,
+}
+
+
+def get_base_filter(name):
+    """
+    Retourne la fonction de filtrage correspondant au nom du moteur.
+    :param name: "exact", "pyramid" ou "iir".
+    :return: Fonction (image, sigma) -> image filtrée.
+    """
+    if name not in BASE_FILTERS:
+        raise ValueError(f"Moteur de filtrage '{name}' inconnu. Choix possibles : {list(BASE_FILTERS)}")
+    return BASE_FILTERS[name]
+
+
+def accuracy_report(image, sigma=30, engines=None):
+    """
+    Compare chaque moteur de filtrage au filtre gaussien exact.
+    :param image: Matrice 2D de test (convertie en float32).
+    :param sigma: Écart-type du filtre.
+    :param engines: Liste des moteurs à évaluer (par défaut tous).
+    :return: Dictionnaire {moteur: {"time_s", "speedup", "max_abs_error", "rmse", "psnr_db"}}.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    engines = engines or list(BASE_FILTERS)
+
+    start = time.perf_counter()
+    reference = gaussian_exact(image, sigma)
+    reference_time = time.perf_counter() - start
+    dynamic = float(reference.max() - reference.min()) or 1.0
+
+    report = {}
+    for name in engines:
+        start = time.perf_counter()
+        filtered = get_base_filter(name)(image, sigma)
+        elapsed = time.perf_counter() - start
+
+        error = filtered.astype(np.float64) - reference
+        rmse = float(np.sqrt(np.mean(error ** 2)))
+        report[name] = {
+            "time_s": elapsed,
+            "speedup": reference_time / elapsed if elapsed > 0 else float("inf"),
+            "max_abs_error": float(np.abs(error).max()),
+            "rmse": rmse,
+            "psnr_db": float("inf") if rmse == 0 else 20 * np.log10(dynamic / rmse),
+        }
+    return report
+
+
+def print_accuracy_report(report):
+    """
+    Affiche le rapport de précision sous forme de tableau.
+    :param report: Dictionnaire retourné par accuracy_report.
+    """
+    print(f"{'Moteur':<10}{'Temps (s)':>12}{'Accélération':>14}{'Erreur max':>14}{'RMSE':>12}{'PSNR (dB)':>12}")
+    for name, values in report.items():
+        print(f"{name:<10}{values['time_s']:>12.4f}{values['speedup']:>14.1f}"
+              f"{values['max_abs_error']:>14.2e}{values['rmse']:>12.2e}{values['psnr_db']:>12.1f}")
+
+
+# Exemple d'utilisation
+if __name__ == "__main__":
+    test_image = np.log1p(np.random.default_rng(0).random((1024, 1024), dtype=np.float32) * 10)
+    print_accuracy_report(accuracy_report(test_image, sigma=30))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Feb 13 16:27:52 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import os
+import importlib.util
+
+# Définir le chemin du dossier contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+tools_lut = import_dynamic("lut", os.path.join(current_script_dir, 'lut.py'))
+
+apply_table = tools_lut.apply_table
+compile_lut = tools_lut.compile_lut
+supports_lut = tools_lut.supports_lut
+
+
+def histogram_percentile(histogram, percentile):
+    """
+    Retourne la valeur entière correspondant à un percentile d'un histogramme à une classe par valeur.
+    :param histogram: Histogramme (effectif de chaque valeur entière).
+    :param percentile: Percentile entre 0 et 100.
+    :return: Plus petite valeur dont la fréquence cumulée atteint le percentile.
+    """
+    cumulative = np.cumsum(histogram)
+    if cumulative[-1] == 0:
+        return 0
+    return int(np.searchsorted(cumulative, percentile / 100.0 * cumulative[-1]))
+
+
+class ReflectanceCompositor:
+    def __init__(self, reflectance_scale=10000.0, clip_percentiles=(2, 98), gamma=2.2,
+                 reflectance_range=None, nodata=None):
+        """
+        Compositeur réflectance -> image 24 bits (TCI, IRC) en une seule passe fusionnée par tuile :
+        mise à l'échelle de la réflectance, étirement par percentiles, gamma et conversion 8 bits
+        sont pré-calculés dans une table par bande, puis appliqués par indexation dans l'image RVB
+        entrelacée de sortie (par blocs de lignes, cf. lut.apply_table : aucune matrice intermédiaire
+        de la taille de la bande).
+        :param reflectance_scale: Facteur de conversion des comptes numériques en réflectance
+                                  (10000 pour Sentinel-2).
+        :param clip_percentiles: Percentiles (bas, haut) d'étirement par bande, ou None pour
+                                 utiliser reflectance_range.
+        :param gamma: Gamma appliqué après étirement.
+        :param reflectance_range: Bornes (bas, haut) de réflectance fixes, communes à toutes les bandes
+                                  ou une paire par bande. Prioritaire sur clip_percentiles.
+        :param nodata: Valeur d'absence de donnée, exclue des statistiques et envoyée sur 0.
+        """
+        if clip_percentiles is None and reflectance_range is None:
+            reflectance_range = (0.0, 1.0)
+        self.reflectance_scale = float(reflectance_scale)
+        self.clip_percentiles = clip_percentiles
+        self.gamma = float(gamma)
+        self.reflectance_range = reflectance_range
+        self.nodata = nodata
+
+    def _check_dtype(self, stack):
+        """
+        Vérifie que les réflectances sont entières (uint8 ou uint16), condition pour utiliser les tables.
+        """
+        if not supports_lut(stack.dtype):
+            raise ValueError(f"Type de données {stack.dtype} non pris en charge : réflectances uint8 ou uint16 attendues.")
+
+    def _histograms(self, stacks):
+        """
+        Accumule l'histogramme exact (une classe par valeur) de chaque bande sur une suite de tuiles.
+        :param stacks: Itérable de tableaux (bandes, hauteur, largeur) entiers.
+        :return: Tableau (bandes, 2^bits) des effectifs.
+        """
+        histograms = None
+        for stack in stacks:
+            self._check_dtype(stack)
+            size = np.iinfo(stack.dtype).max + 1
+            if histograms is None:
+                histograms = np.zeros((len(stack), size), dtype=np.int64)
+            for b, band in enumerate(stack):
+                histograms[b] += np.bincount(band.ravel(), minlength=size)
+        if self.nodata is not None:
+            histograms[:, int(self.nodata)] = 0
+        return histograms
+
+    def clip_ranges(self, stacks=None, band_count=None):
+        """
+        Calcule les bornes d'étirement (en réflectance) de chaque bande.
+        :param stacks: Itérable de tuiles (bandes, hauteur, largeur), nécessaire en mode percentiles.
+        :param band_count: Nombre de bandes, utilisé avec des bornes fixes.
+        :return: Liste de tuples (bas, haut) par bande.
+        """
+        if self.reflectance_range is not None:
+            ranges = np.asarray(self.reflectance_range, dtype=float)
+            if ranges.ndim == 1:
+                ranges = np.tile(ranges, (band_count or 1, 1))
+            return [tuple(map(float, pair)) for pair in ranges]
+
+        low_q, high_q = self.clip_percentiles
+        ranges = []
+        for histogram in self._histograms(stacks):
+            low = histogram_percentile(histogram, low_q) / self.reflectance_scale
+            high = histogram_percentile(histogram, high_q) / self.reflectance_scale
+            ranges.append((low, high))
+        return ranges
+
+    def _tables(self, ranges, dtype):
+        """
+        Compile la table de chaque bande pour des bornes d'étirement données. Les bornes dépendent
+        de l'image : les tables ne sont pas conservées dans le cache des LUT.
+        :return: Liste de tables uint8.
+        """
+        return [compile_lut("reflectance_8bit", dtype, np.uint8, cache=False,
+                            scale=self.reflectance_scale, low=low, high=high,
+                            gamma=self.gamma, nodata=self.nodata)
+                for low, high in ranges]
+
+    def _compose_tile(self, stack, tables, out=None):
+        """
+        Applique la table de chaque bande et écrit le résultat entrelacé (hauteur, largeur, bandes).
+        """
+        self._check_dtype(stack)
+        bands, height, width = stack.shape
+        if out is None:
+            out = np.empty((height, width, bands), dtype=np.uint8)
+        for b, table in enumerate(tables):
+            apply_table(stack[b], table, out=out[:, :, b])
+        return out
+
+    def compose(self, stack, out=None):
+        """
+        Compose une image 24 bits à partir d'un tableau de réflectances en mémoire.
+        :param stack: Tableau (bandes, hauteur, largeur) ou liste de matrices 2D uint16, dans l'ordre
+                      des canaux du produit (par exemple lu avec bands="TCI").
+        :param out: Tableau (hauteur, largeur, bandes) uint8 préalloué (optionnel).
+        :return: Image entrelacée (hauteur, largeur, bandes) en uint8.
+        """
+        stack = np.asarray(stack) if not isinstance(stack, list) else np.stack(stack)
+        self._check_dtype(stack)
+        ranges = self.clip_ranges([stack], band_count=len(stack))
+        return self._compose_tile(stack, self._tables(ranges, stack.dtype), out=out)
+
+    def compose_blocks(self, reader, bands="TCI", tile_size=None):
+        """
+        Compose une image 24 bits en flux à partir d'une image ouverte avec OpenGDAL.
+        En mode percentiles, une première passe accumule les histogrammes des bandes.
+        :param reader: Objet OpenGDAL.
+        :param bands: Bandes à composer (cf. OpenGDAL.resolve_bands), par défaut "TCI".
+        :param tile_size: Taille des tuiles (cf. OpenGDAL.iter_blocks).
+        :return: Générateur de tuples (window, tuile RVB (hauteur, largeur, bandes) uint8).
+        """
+        band_list = reader.resolve_bands(bands)
+        if self.reflectance_range is None:
+            stacks = (stack for _, stack in reader.iter_blocks(tile_size, normalize=False, bands=band_list))
+            ranges = self.clip_ranges(stacks)
+        else:
+            ranges = self.clip_ranges(band_count=len(band_list))
+
+        tables = None  # Compilées une fois, au type de la première tuile
+        for window, stack in reader.iter_blocks(tile_size, normalize=False, bands=band_list):
+            if tables is None:
+                self._check_dtype(stack)
+                tables = self._tables(ranges, stack.dtype)
+            yield window, self._compose_tile(stack, tables)
+
+    def compose_image(self, reader, bands="TCI", tile_size=None):
+        """
+        Compose l'image 24 bits complète, tuile par tuile, dans un seul tableau de sortie.
+        :return: Image entrelacée (hauteur, largeur, bandes) en uint8.
+        """
+        band_list = reader.resolve_bands(bands)
+        out = np.empty((reader.dataset.RasterYSize, reader.dataset.RasterXSize, len(band_list)), dtype=np.uint8)
+        for window, tile in self.compose_blocks(reader, band_list, tile_size):
+            out[window.slices()] = tile
+        return out
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Mar 14 09:36:12 2025
+
+@author: ablot
+"""
+
+import numpy as np
+
+############################## Options de création GDAL #####################
+# Profils et options de création des images écrites par save.CreateImageFromDetails. Ce module ne dépend
+# pas de GDAL : les options sont de simples listes "CLE=VALEUR" passées ensuite aux drivers.
+
+# Profils d'options de création GeoTIFF (driver GTiff uniquement).
+# "tiled" : tuiles internes, lecture par fenêtres rapide ; les profils compressés y ajoutent
+# une compression sans perte avec prédicteur horizontal et une compression multithread.
+_TILED_OPTIONS = {"TILED": "YES", "BLOCKXSIZE": "512", "BLOCKYSIZE": "512", "BIGTIFF": "IF_SAFER"}
+CREATION_PROFILES = {
+    "default": {},  # Options par défaut de GDAL (TIFF en bandes, non compressé)
+    "tiled": dict(_TILED_OPTIONS),
+    "deflate": dict(_TILED_OPTIONS, COMPRESS="DEFLATE", PREDICTOR="2", NUM_THREADS="ALL_CPUS"),
+    "zstd": dict(_TILED_OPTIONS, COMPRESS="ZSTD", PREDICTOR="2", NUM_THREADS="ALL_CPUS"),
+    "lzw": dict(_TILED_OPTIONS, COMPRESS="LZW", PREDICTOR="2", NUM_THREADS="ALL_CPUS"),
+}
+
+
+def creation_options(profile="default", block_size=None, options=None):
+    """
+    Construit la liste d'options de création GDAL d'un profil.
+    :param profile: Nom du profil (cf. CREATION_PROFILES).
+    :param block_size: Taille des tuiles internes (entier, ou tuple (largeur, hauteur)) ; active TILED=YES.
+    :param options: Options supplémentaires ou prioritaires (dictionnaire ou liste "CLE=VALEUR").
+    :return: Liste de chaînes "CLE=VALEUR".
+    """
+    if profile not in CREATION_PROFILES:
+        raise ValueError(f"Profil de création '{profile}' inconnu. Choix possibles : {list(CREATION_PROFILES)}")
+    merged = dict(CREATION_PROFILES[profile])
+    if block_size:
+        block_x, block_y = (block_size, block_size) if np.isscalar(block_size) else block_size
+        merged.update(TILED="YES", BLOCKXSIZE=str(int(block_x)), BLOCKYSIZE=str(int(block_y)))
+    if options:
+        if not isinstance(options, dict):
+            options = dict(option.split("=", 1) for option in options)
+        merged.update({key.upper(): str(value) for key, value in options.items()})
+    return [f"{key}={value}" for key, value in merged.items()]
+
+
+def overview_levels(width, height, min_size=256):
+    """
+    Facteurs de réduction des aperçus (2, 4, 8...) jusqu'à ce que le plus petit aperçu
+    soit inférieur à min_size pixels dans sa plus grande dimension.
+    """
+    levels, factor = [], 2
+    while max(width, height) / (factor // 2) > min_size:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def cog_options(options):
+    """
+    Convertit des options de création GTiff en options du driver COG : le COG est toujours
+    tuilé (BLOCKSIZE au lieu de TILED/BLOCKXSIZE/BLOCKYSIZE) et son PREDICTOR vaut YES ou NO.
+    :param options: Liste "CLE=VALEUR" (cf. creation_options).
+    """
+    options = dict(option.split("=", 1) for option in options)
+    block_size = options.pop("BLOCKXSIZE", None)
+    for key in ("TILED", "BLOCKYSIZE", "COPY_SRC_OVERVIEWS"):
+        options.pop(key, None)
+    if block_size:
+        options["BLOCKSIZE"] = block_size
+    if options.get("PREDICTOR") == "2":
+        options["PREDICTOR"] = "YES"
+    return [f"{key}={value}" for key, value in options.items()]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Feb 25 14:02:11 2025
+
+@author: ablot
+"""
+
+import numpy as np
+
+############################## Luminance d'une pile de bandes #####################
+# Somme pondérée des bandes, calculée en une seule passe (einsum) avec un accumulateur float32.
+# LUMINANCE_WEIGHTS et resolve_weights sont aussi utilisés par LuminanceCalculator (tools/Luminance.py
+# à la racine du dépôt) : ils ne sont définis qu'ici.
+
+# Pondérations des bandes (dans l'ordre R, V, B)
+LUMINANCE_WEIGHTS = {
+    "rec709": (0.2126, 0.7152, 0.0722),  # ITU-R BT.709 (sRGB)
+    "rec601": (0.299, 0.587, 0.114),     # ITU-R BT.601
+    "mean": None,                        # Moyenne des bandes, quel que soit leur nombre
+}
+
+
+def resolve_weights(weights, band_count):
+    """
+    Retourne le vecteur de pondération (float32) correspondant à un nombre de bandes.
+    :param weights: Nom de LUMINANCE_WEIGHTS ("rec709", "rec601", "mean") ou suite de poids, un par bande.
+    :param band_count: Nombre de bandes.
+    :return: Tableau float32 de taille band_count.
+    """
+    if isinstance(weights, str):
+        if weights.lower() not in LUMINANCE_WEIGHTS:
+            raise ValueError(f"Pondération '{weights}' inconnue. Choix possibles : {list(LUMINANCE_WEIGHTS)}")
+        weights = LUMINANCE_WEIGHTS[weights.lower()]
+        if weights is None:
+            weights = [1.0 / band_count] * band_count
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.shape != (band_count,):
+        raise ValueError(f"{weights.size} poids fournis pour {band_count} bandes.")
+    return weights
+
+
+def band_luminance(bands, weights="rec709"):
+    """
+    Luminance d'une liste de matrices 2D (ou d'un tableau (bandes, hauteur, largeur)).
+    :param bands: Bandes de même forme, entières ou flottantes.
+    :param weights: Pondération (cf. resolve_weights).
+    :return: Luminance (hauteur, largeur) en float32.
+    """
+    weights = resolve_weights(weights, len(bands))
+    if isinstance(bands, list):
+        luminance = np.zeros(bands[0].shape, dtype=np.float32)
+        for weight, band in zip(weights, bands):
+            luminance += weight * band  # Accumulation en float32, sans empiler les bandes
+        return luminance
+    return np.einsum("c...,c->...", bands, weights, dtype=np.float32, casting="same_kind")
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Feb 12 09:41:18 2025
+
+@author: ablot
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+############################## Tables de correspondance (LUT) #####################
+# Pour une entrée entière (uint8 ou uint16), un opérateur ponctuel ne dépend que d'au plus
+# 65536 valeurs : on calcule une fois la table de sortie, puis on l'applique par indexation.
+
+# Types d'entrée pris en charge par les LUT
+LUT_INPUT_DTYPES = (np.dtype(np.uint8), np.dtype(np.uint16))
+
+# Nombre maximal d'éléments traités à la fois lors d'une écriture dans un tableau de sortie
+LUT_CHUNK_SIZE = 1 << 22
+
+# Opérateurs enregistrés : nom -> fonction (valeurs, type de sortie, **paramètres) -> table
+LUT_OPERATORS = {}
+
+# Taille maximale du cache des tables compilées (octets) ; une table uint16 -> float32 occupe 256 Kio
+LUT_CACHE_MAX_BYTES = 32 * 1024 ** 2
+
+
+class LutCache:
+    def __init__(self, max_bytes=LUT_CACHE_MAX_BYTES):
+        """
+        Cache LRU des tables compilées, borné en octets.
+        :param max_bytes: Taille maximale des tables conservées ; les moins récemment utilisées
+                          sont supprimées au-delà.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Retourne la table associée à une clé (None si elle n'est pas en cache).
+        """
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+            return table
+
+    def put(self, key, table):
+        """
+        Ajoute une table au cache, en supprimant les plus anciennes au-delà de max_bytes.
+        Une table plus grande que max_bytes n'est pas conservée.
+        """
+        if table.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = table
+            self.nbytes += table.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """
+        Vide le cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Tables déjà compilées, indexées par (opérateur, paramètres, type d'entrée, type de sortie)
+_LUT_CACHE = LutCache()
+
+
+def register_lut_operator(name):
+    """
+    Décorateur enregistrant une fonction de construction de table sous un nom d'opérateur.
+    La fonction reçoit toutes les valeurs possibles du type d'entrée (np.arange),
+    le type de sortie et les paramètres de l'opérateur.
+    """
+    def decorator(builder):
+        LUT_OPERATORS[name] = builder
+        return builder
+    return decorator
+
+
+def _output_max(out_dtype):
+    """
+    Valeur maximale du type de sortie (1.0 pour un type flottant).
+    """
+    out_dtype = np.dtype(out_dtype)
+    return float(np.iinfo(out_dtype).max) if np.issubdtype(out_dtype, np.integer) else 1.0
+
+
+@register_lut_operator("gamma")
+def _gamma_table(values, out_dtype, gamma):
+    """
+    Correction gamma de GammaTMO : normalisation par le maximum du type, puissance 1/gamma,
+    puis mise à l'échelle sur le type de sortie.
+    """
+    out_max = _output_max(out_dtype)
+    matrix = values.astype(np.float32)
+    matrix = matrix / float(np.iinfo(values.dtype).max)
+    corrected = np.power(matrix, 1 / gamma)
+    return (corrected * out_max).clip(0, out_max).astype(out_dtype)
+
+
+@register_lut_operator("gamma_inverse")
+def _gamma_inverse_table(values, out_dtype, gamma, scale):
+    """
+    Correction gamma inverse de GammaInverseTMO : division par scale (255 ou 1),
+    puissance gamma, puis mise à l'échelle sur le type de sortie.
+    """
+    out_max = _output_max(out_dtype)
+    matrix = values.astype(np.float32)
+    matrix = matrix / scale if scale != 1 else matrix
+    corrected = np.power(matrix, gamma)
+    return (corrected * out_max).clip(0, out_max).astype(out_dtype)
+
+
+@register_lut_operator("log1p")
+def _log1p_table(values, out_dtype):
+    """
+    Logarithme log(1 + x) utilisé par MantiukTMO.
+    """
+    return np.log1p(values.astype(np.float32)).astype(out_dtype)
+
+
+@register_lut_operator("reflectance_8bit")
+def _reflectance_8bit_table(values, out_dtype, scale, low, high, gamma, nodata=None):
+    """
+    Chaîne complète réflectance -> 8 bits du compositeur : division par le facteur d'échelle,
+    étirement linéaire entre low et high (en réflectance), gamma, puis mise à l'échelle arrondie.
+    La valeur nodata éventuelle est envoyée sur 0.
+    """
+    out_max = _output_max(out_dtype)
+    reflectance = values.astype(np.float32) / scale
+    stretched = np.clip((reflectance - low) / max(high - low, 1e-12), 0, 1)
+    corrected = np.power(stretched, 1 / gamma)
+    table = (corrected * out_max + 0.5).clip(0, out_max).astype(out_dtype)
+    if nodata is not None:
+        table[int(nodata)] = 0
+    return table
+
+
+def supports_lut(dtype):
+    """
+    Indique si un type de données peut être traité par LUT.
+    :param dtype: Type numpy de l'entrée.
+    """
+    return np.dtype(dtype) in LUT_INPUT_DTYPES
+
+
+def compile_lut(operator, in_dtype, out_dtype, cache=True, **params):
+    """
+    Construit (ou récupère dans le cache) la table d'un opérateur.
+    :param operator: Nom de l'opérateur enregistré ("gamma", "gamma_inverse", "log1p", ...).
+    :param in_dtype: Type d'entrée (uint8 ou uint16).
+    :param out_dtype: Type de sortie.
+    :param cache: False pour ne pas conserver la table, lorsque ses paramètres dépendent de l'image
+                  traitée et ne se répéteront pas.
+    :param params: Paramètres de l'opérateur.
+    :return: Table 1D de taille 2^bits du type d'entrée, du type de sortie.
+    """
+    in_dtype, out_dtype = np.dtype(in_dtype), np.dtype(out_dtype)
+    if not supports_lut(in_dtype):
+        raise ValueError(f"Type de données {in_dtype} non pris en charge pour une LUT (uint8 ou uint16).")
+    if operator not in LUT_OPERATORS:
+        raise ValueError(f"Opérateur LUT '{operator}' inconnu. Choix possibles : {list(LUT_OPERATORS)}")
+
+    key = (operator, tuple(sorted(params.items())), in_dtype.str, out_dtype.str)
+    table = _LUT_CACHE.get(key) if cache else None
+    if table is None:
+        values = np.arange(np.iinfo(in_dtype).max + 1, dtype=in_dtype)
+        table = LUT_OPERATORS[operator](values, out_dtype, **params)
+        table.setflags(write=False)
+        if cache:
+            _LUT_CACHE.put(key, table)
+    return table
+
+
+def apply_table(matrix, table, out=None):
+    """
+    Applique une table compilée à une matrice entière.
+    :param matrix: Matrice uint8 ou uint16 (toute forme).
+    :param table: Table 1D couvrant toutes les valeurs du type de matrix (cf. compile_lut).
+    :param out: Tableau de sortie optionnel (même forme que matrix, contigu ou non, par exemple un canal
+                d'une image entrelacée), rempli par blocs d'au plus LUT_CHUNK_SIZE éléments.
+    :return: Matrice transformée, du type de la table.
+    """
+    if out is None:
+        return table[matrix]
+    if matrix.flags.c_contiguous and out.flags.c_contiguous:
+        flat_in, flat_out = matrix.reshape(-1), out.reshape(-1)
+        for start in range(0, flat_in.size, LUT_CHUNK_SIZE):
+            stop = start + LUT_CHUNK_SIZE
+            np.take(table, flat_in[start:stop], out=flat_out[start:stop], mode="clip")
+        return out
+    if matrix.ndim < 2:
+        out[...] = table[matrix]
+        return out
+
+    # Sortie non contiguë : np.take écrit dans un tampon contigu réutilisé (au plus LUT_CHUNK_SIZE
+    # éléments), recopié dans la sortie par blocs de lignes
+    row_size = max(matrix[0].size, 1)
+    rows = max(1, LUT_CHUNK_SIZE // row_size)
+    buffer = np.empty((min(rows, len(matrix)),) + matrix.shape[1:], dtype=table.dtype)
+    for start in range(0, len(matrix), rows):
+        block = matrix[start:start + rows]
+        chunk = buffer[:len(block)]
+        np.take(table, block, out=chunk, mode="clip")  # Valeurs toujours dans la table : pas de contrôle
+        out[start:start + rows] = chunk
+    return out
+
+
+def apply_lut(matrix, operator, out_dtype, out=None, cache=True, **params):
+    """
+    Applique un opérateur ponctuel à une matrice entière par simple indexation dans sa table,
+    sans conversion intermédiaire en flottant.
+    :param matrix: Matrice uint8 ou uint16 (toute forme).
+    :param operator: Nom de l'opérateur enregistré.
+    :param out_dtype: Type de sortie.
+    :param out: Tableau de sortie optionnel (même forme que matrix), rempli par blocs (cf. apply_table).
+    :param cache: Conservation de la table dans le cache (cf. compile_lut).
+    :param params: Paramètres de l'opérateur.
+    :return: Matrice transformée, du type de sortie.
+    """
+    table = compile_lut(operator, matrix.dtype, out_dtype, cache=cache, **params)
+    return apply_table(matrix, table, out=out)
+
+
+def clear_lut_cache():
+    """
+    Vide le cache des tables compilées.
+    """
+    _LUT_CACHE.clear()
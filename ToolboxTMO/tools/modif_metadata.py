@@ -6,7 +6,12 @@ Created on Sun Jan 26 23:18:19 2025
 """
 
 import inspect
+import json
 import os
+import queue
+import threading
+import weakref
+from datetime import datetime
 
 class MetadataLogger:
     def __init__(self, metadata_file):
@@ -47,3 +52,187 @@ class MetadataLogger:
                 file.write("-" * 40 + "\n")
         except Exception as e:
             print(f"Erreur lors de l'enregistrement dans le fichier de métadonnées : {e}")
+
+
+def _to_json_value(value):
+    """
+    Convertit une valeur de paramètre en valeur sérialisable en JSON
+    (tuples, formes de matrices, scalaires numpy...).
+    """
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _to_json_value(item) for key, item in value.items()}
+    if hasattr(value, "item") and callable(value.item):
+        try:
+            return value.item()  # Scalaire numpy
+        except (ValueError, TypeError):
+            pass
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def format_record(record):
+    """
+    Met en forme un enregistrement JSON dans le format texte historique de MetadataLogger.
+    :param record: Dictionnaire avec les clés "kind", "name" et "params".
+    :return: Texte de l'enregistrement.
+    """
+    title = "Fonction appelée" if record["kind"] == "function" else "Classe utilisée"
+    lines = [f"{title} : {record['name']}", "Paramètres :"]
+    lines += [f"  {param}: {value}" for param, value in record["params"].items()]
+    lines.append("-" * 40)
+    return "\n".join(lines) + "\n"
+
+
+def _write_records(metadata_file, records):
+    """
+    Écrit un lot d'enregistrements à la fin du fichier (une ligne JSON par enregistrement).
+    """
+    try:
+        with open(metadata_file, 'a', encoding='utf-8') as file:
+            file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement dans le fichier de métadonnées : {e}")
+
+
+def _writer_loop(records, metadata_file, buffer_size, flush_interval):
+    """
+    Boucle du thread d'écriture : accumule les enregistrements et les écrit par lots.
+    Un threading.Event dans la file demande une écriture immédiate, None arrête le thread.
+    Le thread ne référence pas le journal, qui peut ainsi être libéré pendant qu'il tourne.
+    """
+    buffer = []
+    while True:
+        try:
+            item = records.get(timeout=flush_interval)
+        except queue.Empty:
+            item = threading.Event()  # Délai écoulé : écriture des enregistrements en attente
+
+        if isinstance(item, dict):
+            buffer.append(item)
+            if len(buffer) < buffer_size:
+                continue
+        if buffer:
+            _write_records(metadata_file, buffer)
+            buffer = []
+        if item is None:
+            return
+        if isinstance(item, threading.Event):
+            item.set()
+
+
+def _stop_writer(records, thread):
+    """
+    Demande l'écriture des enregistrements en attente puis l'arrêt du thread, et attend sa fin.
+    """
+    records.put(None)
+    if thread is not threading.current_thread():
+        thread.join()
+
+
+class BufferedMetadataLogger:
+    """
+    Journal de métadonnées tamponné : les enregistrements sont placés dans une file et écrits
+    au format JSON Lines par un thread d'arrière-plan, par lots, lorsque le tampon atteint
+    buffer_size enregistrements, après flush_interval secondes, sur appel de flush() ou à la
+    fin du programme. Même interface que MetadataLogger, partageable entre plusieurs TMO.
+    """
+    _shared = weakref.WeakValueDictionary()  # Journaux partagés encore utilisés, par fichier
+    _shared_lock = threading.Lock()
+
+    def __init__(self, metadata_file, buffer_size=256, flush_interval=5.0):
+        """
+        :param metadata_file: Chemin du fichier JSON Lines.
+        :param buffer_size: Nombre d'enregistrements déclenchant une écriture.
+        :param flush_interval: Délai maximal (secondes) avant l'écriture d'enregistrements en attente.
+        """
+        self.metadata_file = metadata_file
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=_writer_loop, name="BufferedMetadataLogger", daemon=True,
+                                        args=(self._queue, metadata_file, buffer_size, flush_interval))
+        self._thread.start()
+        # Arrêt du thread à la libération du journal ou, à défaut, à la fin du programme
+        self._finalizer = weakref.finalize(self, _stop_writer, self._queue, self._thread)
+
+    @classmethod
+    def shared(cls, metadata_file, **kwargs):
+        """
+        Retourne le journal partagé associé à un fichier (créé au premier appel, conservé tant qu'il
+        est utilisé).
+        :param metadata_file: Chemin du fichier JSON Lines.
+        """
+        key = os.path.abspath(metadata_file)
+        with cls._shared_lock:
+            logger = cls._shared.get(key)
+            if logger is None or logger._closed:
+                logger = cls._shared[key] = cls(metadata_file, **kwargs)
+            return logger
+
+    def _log(self, kind, name, params):
+        """
+        Place un enregistrement horodaté dans la file d'écriture.
+        """
+        if self._closed:
+            raise RuntimeError(f"Le journal de métadonnées '{self.metadata_file}' est fermé.")
+        self._queue.put({
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "kind": kind,
+            "name": name,
+            "params": {param: _to_json_value(value) for param, value in params.items()},
+        })
+
+    def log_function_call(self, func_name, **kwargs):
+        """
+        Enregistre le nom de la fonction et ses paramètres (sans attendre l'écriture).
+        """
+        self._log("function", func_name, kwargs)
+
+    def log_class_usage(self, class_name, **kwargs):
+        """
+        Enregistre l'utilisation d'une classe avec ses paramètres (sans attendre l'écriture).
+        """
+        self._log("class", class_name, kwargs)
+
+    def flush(self):
+        """
+        Écrit immédiatement les enregistrements en attente et attend la fin de l'écriture.
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """
+        Écrit les enregistrements en attente et arrête le thread d'écriture.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._finalizer()
+
+    def read_records(self):
+        """
+        Relit tous les enregistrements du fichier (après écriture des enregistrements en attente).
+        :return: Liste de dictionnaires.
+        """
+        self.flush()
+        if not os.path.exists(self.metadata_file):
+            return []
+        with open(self.metadata_file, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def export_text(self, output_file):
+        """
+        Exporte le journal dans le format texte lisible historique de MetadataLogger.
+        :param output_file: Chemin du fichier texte à écrire.
+        """
+        with open(output_file, 'w', encoding='utf-8') as file:
+            for record in self.read_records():
+                file.write(format_record(record))
@@ -4,19 +4,192 @@ Created on Thu Jan 16 17:49:46 2025
 @author: ablot
 """
 
-from osgeo import gdal
+from osgeo import gdal, gdal_array
 import numpy as np
 import os
+import importlib.util
+import threading
+from collections import OrderedDict
+
+# Définir le chemin du dossier contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+tools_tiling = import_dynamic("tiling", os.path.join(current_script_dir, 'tiling.py'))
+
+# Taille de tuile visée par défaut (pixels), arrondie aux blocs natifs GDAL
+DEFAULT_TILE_SIZE = 512
+
+# Ordre des bandes des produits Sentinel-2 (13 bandes L1C, 12 bandes L2A sans B10)
+SENTINEL2_BANDS = ("B1", "B2", "B3", "B4", "B5", "B6", "B7", "B8", "B8A", "B9", "B10", "B11", "B12")
+SENTINEL2_L2A_BANDS = tuple(name for name in SENTINEL2_BANDS if name != "B10")
+
+# Compositions prédéfinies, dans l'ordre des canaux du produit (R, V, B)
+BAND_PRESETS = {
+    "TCI": ("B4", "B3", "B2"),  # Vraies couleurs
+    "IRC": ("B8", "B4", "B3"),  # Infrarouge couleur
+}
+
+
+# Nombre maximal de jeux de données GDAL gardés ouverts par le pool partagé
+DATASET_POOL_SIZE = 8
+
+# Taille maximale (octets) des lectures brutes d'image entière mémorisées par le pool partagé.
+# 0 : aucune mémorisation ; la passer à un DatasetPool(max_read_bytes=...) transmis à OpenGDAL pour l'activer
+READ_CACHE_MAX_BYTES = 0
+
+
+############################## Pool de jeux de données #####################
+# Ouvrir plusieurs fois la même image (plusieurs OpenGDAL, ou get_pixel_matrix brut puis normalisé)
+# relisait tout le raster sur le disque. Le pool garde ouverts les derniers jeux de données utilisés
+# (identifiés par chemin, taille et date de modification) et, si on le lui demande (max_read_bytes),
+# mémorise les lectures brutes des bandes entières : les lectures suivantes, normalisées ou non,
+# en sont alors déduites sans accès disque.
+
+def source_key(path):
+    """
+    Identifie une image : chemin absolu, taille et date de modification (un fichier réécrit
+    change de clé). Les chemins non locaux (/vsicurl/, sous-jeux de données...) sont pris tels quels.
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return path, None, None
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class DatasetPool:
+    def __init__(self, max_handles=DATASET_POOL_SIZE, max_read_bytes=READ_CACHE_MAX_BYTES):
+        """
+        Pool LRU de jeux de données GDAL ouverts et cache des lectures brutes.
+        Les jeux de données sont partagés entre les objets OpenGDAL d'une même image, éventuellement
+        utilisés depuis plusieurs threads : un jeu de données GDAL n'étant pas thread-safe, chacun est
+        associé à un verrou qui sérialise ses lectures de pixels (cf. OpenGDAL._read_window).
+        :param max_handles: Nombre maximal de jeux de données gardés ouverts.
+        :param max_read_bytes: Taille maximale des lectures mémorisées (par défaut READ_CACHE_MAX_BYTES,
+                               soit aucune mémorisation).
+        """
+        self.max_handles = max_handles
+        self.max_read_bytes = max_read_bytes
+        self._handles = OrderedDict()  # Clé de l'image -> (jeu de données, verrou)
+        self._reads = OrderedDict()
+        self._read_bytes = 0
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """
+        Retourne le jeu de données GDAL d'une image, ouvert au besoin, et le verrou de ses lectures.
+        :return: Tuple (clé de l'image, jeu de données ou None si GDAL ne peut pas l'ouvrir, verrou).
+        """
+        key = source_key(path)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self._handles.move_to_end(key)
+                return (key,) + handle
+        dataset = gdal.Open(path)
+        if dataset is None:
+            return key, None, None
+        with self._lock:
+            # Un autre thread a pu ouvrir la même image entre-temps : son jeu de données est conservé
+            handle = self._handles.setdefault(key, (dataset, threading.Lock()))
+            self._handles.move_to_end(key)
+            while len(self._handles) > self.max_handles:
+                # Le jeu de données est fermé dès qu'aucun OpenGDAL ne l'utilise plus
+                self._handles.popitem(last=False)
+        return (key,) + handle
+
+    def get_read(self, key):
+        """
+        Retourne une lecture mémorisée (None si absente).
+        """
+        with self._lock:
+            stack = self._reads.get(key)
+            if stack is not None:
+                self._reads.move_to_end(key)
+            return stack
+
+    def put_read(self, key, stack):
+        """
+        Mémorise une lecture, en oubliant les plus anciennes au-delà de max_read_bytes.
+        :return: True si la lecture a été mémorisée (False si elle dépasse à elle seule la limite).
+        """
+        if stack.nbytes > self.max_read_bytes:
+            return False
+        with self._lock:
+            previous = self._reads.pop(key, None)
+            if previous is not None:
+                self._read_bytes -= previous.nbytes
+            self._reads[key] = stack
+            self._read_bytes += stack.nbytes
+            while self._read_bytes > self.max_read_bytes:
+                _, evicted = self._reads.popitem(last=False)
+                self._read_bytes -= evicted.nbytes
+        return True
+
+    def clear(self):
+        """
+        Ferme les jeux de données du pool et oublie les lectures mémorisées.
+        """
+        with self._lock:
+            self._handles.clear()
+            self._reads.clear()
+            self._read_bytes = 0
+
+
+# Pool utilisé par défaut par tous les objets OpenGDAL
+dataset_pool = DatasetPool()
+
+
+def _normalize_band_name(name):
+    """
+    Normalise un nom de bande pour la comparaison : "b04", "B04" et "B4" désignent la même bande.
+    """
+    name = name.strip().upper()
+    if name.startswith("B") and len(name) > 1:
+        name = "B" + (name[1:].lstrip("0") or "0")
+    return name
+
+
+def parse_bands(text):
+    """
+    Convertit une sélection de bandes saisie en ligne de commande (cf. OpenGDAL.resolve_bands) :
+    nom de composition ("TCI", "IRC"), ou liste séparée par des virgules de noms ("B4,B3,B2")
+    et/ou d'indices à partir de 1 ("4,3,2").
+    :return: None, nom de composition, ou liste de noms et d'indices entiers.
+    """
+    if not text or not text.strip():
+        return None
+    text = text.strip()
+    if text.upper() in BAND_PRESETS:
+        return text
+    return [int(band) if band.isdigit() else band for band in (band.strip() for band in text.split(",")) if band]
+
 
 class OpenGDAL:
-    def __init__(self, image_path, metadata_output_path=None):
+    def __init__(self, image_path, metadata_output_path=None, pool=None):
         """
         Initialise l'objet et sauvegarde les métadonnées si un chemin de sortie est spécifié.
         :param image_path: Chemin de l'image à ouvrir.
         :param metadata_output_path: Chemin du fichier pour sauvegarder les métadonnées (optionnel).
+        :param pool: Pool de jeux de données (DatasetPool) ; par défaut le pool partagé du module, qui ne
+                     mémorise pas les lectures. Un DatasetPool(max_read_bytes=...) active la mémorisation.
+                     False : jeu de données propre à l'objet.
         """
+        if pool is False:
+            pool = DatasetPool(max_handles=1, max_read_bytes=0)
+        self.pool = pool if pool is not None else dataset_pool
         self.image_path = image_path
-        self.dataset = gdal.Open(image_path)
+        self.source_key, self.dataset, self._dataset_lock = self.pool.open(image_path)
 
         if not self.dataset:
             raise FileNotFoundError(f"Impossible d'ouvrir le fichier {image_path} avec GDAL.")
@@ -73,33 +246,235 @@ class OpenGDAL:
             })
         return color_details
 
-    def get_pixel_matrix(self, normalize=True):
+    def get_pixel_matrix(self, normalize=True, stacked=False, out=None, bands=None):
         """
         Récupère les valeurs des pixels sous forme de matrice (ou matrices pour plusieurs bandes).
+        Toutes les bandes sont lues en un seul appel GDAL dans un tableau contigu (cf. read_stack).
         :param normalize: Si True, normalise les matrices entre 0 et 1.
-        :return: Matrice unique (si une bande) ou liste de matrices (si plusieurs bandes).
+        :param stacked: Si True, retourne directement le tableau (bandes, hauteur, largeur).
+        :param out: Tableau (bandes, hauteur, largeur) préalloué dans lequel lire les pixels (optionnel).
+        :param bands: Bandes à lire (cf. resolve_bands) : nom de composition ("TCI", "IRC"),
+                      liste de noms ("B4", ...) ou d'indices (à partir de 1). Par défaut toutes.
+        :return: Matrice unique (si une bande) ou liste de matrices (si plusieurs bandes),
+                 ou tableau (bandes, hauteur, largeur) si stacked=True.
         """
-        bands = self.dataset.RasterCount
-        raster_size = (self.dataset.RasterYSize, self.dataset.RasterXSize)
-    
-        # Créer une liste pour stocker les matrices de chaque bande
-        matrices = []
-    
-        for i in range(1, bands + 1):
-            band = self.dataset.GetRasterBand(i)
-            data = band.ReadAsArray()  # Lecture de la bande sous forme de matrice
-    
-            # Normalisation systématique entre 0 et 1
-            if normalize:
-                # Calcul de la valeur maximale pour la normalisation
-                max_val = np.iinfo(data.dtype).max  # La valeur maximale pour le type de données de la bande
-                data = data.astype(np.float32)  # Convertir en float pour la division
-                data = data / max_val  # Normaliser les valeurs entre 0 et 1
-    
-            matrices.append(data)
-    
+        stack = self.read_stack(normalize=normalize, out=out, bands=bands)
+        if stacked:
+            return stack
+
+        # Les matrices retournées sont des vues sur le tableau contigu (aucune copie)
+        matrices = list(stack)
+
         # Si une seule bande, retourner une matrice unique, sinon retourner une liste de matrices
-        return matrices if bands > 1 else matrices[0]
+        return matrices if len(matrices) > 1 else matrices[0]
+
+    def get_native_dtype(self, band=1):
+        """
+        Retourne le type numpy natif des pixels d'une bande (par défaut la première).
+        """
+        data_type = self.dataset.GetRasterBand(band).DataType
+        return np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(data_type))
+
+    def get_band_names(self):
+        """
+        Retourne le nom de chaque bande : description GDAL si elle est renseignée, sinon
+        nom Sentinel-2 déduit du nombre de bandes (13 ou 12), sinon None.
+        """
+        count = self.dataset.RasterCount
+        descriptions = [self.dataset.GetRasterBand(i).GetDescription().strip().upper()
+                        for i in range(1, count + 1)]
+        if all(descriptions):
+            return descriptions
+        if count == len(SENTINEL2_BANDS):
+            return list(SENTINEL2_BANDS)
+        if count == len(SENTINEL2_L2A_BANDS):
+            return list(SENTINEL2_L2A_BANDS)
+        return [None] * count
+
+    def resolve_bands(self, bands=None):
+        """
+        Convertit une sélection de bandes en liste d'indices GDAL (à partir de 1), dans l'ordre demandé.
+        :param bands: None (toutes les bandes), nom de composition de BAND_PRESETS ("TCI", "IRC"),
+                      ou liste de noms de bandes ("B8", "B04", ...) et/ou d'indices (à partir de 1).
+        :return: Liste d'indices de bandes.
+        """
+        count = self.dataset.RasterCount
+        if bands is None:
+            return list(range(1, count + 1))
+        if isinstance(bands, str):
+            if bands.upper() not in BAND_PRESETS:
+                raise ValueError(f"Composition '{bands}' inconnue. Choix possibles : {list(BAND_PRESETS)}")
+            bands = BAND_PRESETS[bands.upper()]
+
+        names = None
+        band_list = []
+        for band in bands:
+            if isinstance(band, str):
+                names = names or self.get_band_names()
+                name = _normalize_band_name(band)
+                matches = [i + 1 for i, band_name in enumerate(names)
+                           if band_name and _normalize_band_name(band_name) == name]
+                if not matches:
+                    raise ValueError(f"Bande '{band}' introuvable dans {self.image_path} (bandes : {names}).")
+                band = matches[0]
+            if not 1 <= band <= count:
+                raise ValueError(f"Indice de bande {band} hors limites (1-{count}).")
+            band_list.append(int(band))
+        return band_list
+
+    def read_stack(self, normalize=False, out=None, dtype=None, bands=None):
+        """
+        Lit toutes les bandes en un seul appel dataset.ReadAsArray dans un tableau contigu
+        (bandes, hauteur, largeur), préalloué ou fourni par l'appelant.
+        La normalisation éventuelle est faite sur place : la mémoire utilisée reste celle du tableau.
+        Si le pool mémorise les lectures (max_read_bytes), la lecture brute des bandes est conservée : une
+        nouvelle lecture des mêmes bandes, normalisée ou non, en est déduite sans accès disque (la lecture brute
+        et le tableau retourné sont alors tous deux en mémoire). Le tableau retourné est toujours propre à
+        l'appelant (copie de la lecture mémorisée) et modifiable.
+        :param normalize: Si True, normalise entre 0 et 1 en float32. Sans mémorisation (pool par défaut),
+                          GDAL lit directement en float32, sans tableau brut intermédiaire.
+        :param out: Tableau (bandes, hauteur, largeur) C-contigu dans lequel lire (optionnel). Il est rempli
+                    depuis une lecture mémorisée si elle existe, sinon directement par GDAL (sans mémorisation).
+        :param dtype: Type du tableau alloué si out n'est pas fourni (par défaut le type natif,
+                      ou float32 si normalize=True). GDAL effectue la conversion pendant la lecture.
+        :param bands: Bandes à lire (cf. resolve_bands) ; seules celles-ci sont lues sur le disque,
+                      dans l'ordre demandé.
+        :return: Tableau (bandes, hauteur, largeur).
+        """
+        band_list = self.resolve_bands(bands)
+        # La lecture brute n'est faite (et mémorisée) que si le pool peut la conserver ; sinon la lecture
+        # est faite directement dans le type demandé, sans tableau brut intermédiaire
+        raw = self._raw_stack(band_list, read=out is None and dtype is None)
+        if raw is None:
+            return self._read_window(0, 0, self.dataset.RasterXSize, self.dataset.RasterYSize,
+                                     normalize, out=out, dtype=dtype, bands=band_list)
+
+        # Copie (normalisée ou convertie) de la lecture brute mémorisée
+        if normalize:
+            max_val = np.iinfo(raw.dtype).max
+        out = self._check_out(out, raw.shape, np.float32 if normalize else (dtype or raw.dtype), normalize)
+        np.copyto(out, raw, casting="unsafe")
+        if normalize:
+            out /= max_val
+        return out
+
+    def _raw_stack(self, band_list, read=True):
+        """
+        Lecture brute mémorisée des bandes entières band_list.
+        :param read: Si False, retourne seulement une lecture déjà mémorisée.
+        :return: Tableau (bandes, hauteur, largeur) partagé, à ne pas modifier ni retourner tel quel, ou None
+                 si la lecture n'est pas mémorisée et ne peut pas l'être (read=False, ou taille supérieure
+                 à la limite du pool).
+        """
+        key = (self.source_key, tuple(band_list))
+        raw = self.pool.get_read(key)
+        if raw is not None or not read:
+            return raw
+        nbytes = (len(band_list) * self.dataset.RasterXSize * self.dataset.RasterYSize
+                  * self.get_native_dtype(band_list[0]).itemsize)
+        if nbytes > self.pool.max_read_bytes:
+            return None
+        raw = self._read_window(0, 0, self.dataset.RasterXSize, self.dataset.RasterYSize, False, bands=band_list)
+        self.pool.put_read(key, raw)
+        return raw
+
+    def read_decimated(self, max_size, xoff=0, yoff=0, xsize=None, ysize=None, bands=None):
+        """
+        Lit une fenêtre sous-échantillonnée de sorte que son plus grand côté fasse au plus max_size pixels.
+        GDAL lit directement dans un tampon réduit (buf_xsize, buf_ysize) et utilise pour cela
+        les aperçus (overviews) de l'image lorsqu'ils existent : seule une fraction des pixels est lue.
+        :param max_size: Taille maximale (pixels) du plus grand côté du résultat.
+        :param xoff: Colonne de départ de la fenêtre (pleine résolution).
+        :param yoff: Ligne de départ de la fenêtre.
+        :param xsize: Largeur de la fenêtre (par défaut jusqu'au bord de l'image).
+        :param ysize: Hauteur de la fenêtre (par défaut jusqu'au bord de l'image).
+        :param bands: Bandes à lire (cf. resolve_bands), par défaut toutes.
+        :return: Tableau (bandes, hauteur, largeur) du type natif ; pleine résolution si la fenêtre
+                 est plus petite que max_size.
+        """
+        xsize = self.dataset.RasterXSize - xoff if xsize is None else xsize
+        ysize = self.dataset.RasterYSize - yoff if ysize is None else ysize
+        band_list = self.resolve_bands(bands)
+        factor = max(1.0, max(xsize, ysize) / float(max_size))
+        buf_xsize, buf_ysize = max(1, int(round(xsize / factor))), max(1, int(round(ysize / factor)))
+        with self._dataset_lock:
+            stack = self.dataset.ReadAsArray(xoff, yoff, xsize, ysize, buf_xsize=buf_xsize, buf_ysize=buf_ysize,
+                                             band_list=band_list)
+        return stack[np.newaxis] if stack.ndim == 2 else stack
+
+    def get_block_size(self):
+        """
+        Retourne la taille de bloc native GDAL de l'image (largeur, hauteur).
+        Pour un TIFF en bandes ("striped"), le bloc fait une ligne entière.
+        """
+        block_x, block_y = self.dataset.GetRasterBand(1).GetBlockSize()
+        return block_x, block_y
+
+    def iter_blocks(self, tile_size=None, overlap=0, normalize=True, bands=None):
+        """
+        Lit l'image tuile par tuile, les tuiles étant alignées sur les blocs natifs GDAL.
+        Permet de traiter des images plus grandes que la mémoire disponible.
+        :param tile_size: Taille visée des tuiles (entier ou tuple (largeur, hauteur)), arrondie
+                          au multiple supérieur de la taille de bloc native.
+                          Par défaut, DEFAULT_TILE_SIZE pixels.
+        :param overlap: Recouvrement (halo) ajouté de chaque côté des tuiles, en pixels.
+        :param normalize: Si True, normalise les valeurs entre 0 et 1 (float32).
+        :param bands: Bandes à lire (cf. resolve_bands), par défaut toutes.
+        :return: Générateur de tuples (window, stack) où window est un BlockWindow et stack
+                 un tableau (bandes, hauteur, largeur) couvrant la zone lue (halo compris).
+        """
+        width, height = self.dataset.RasterXSize, self.dataset.RasterYSize
+        block_x, block_y = self.get_block_size()
+        tile_x, tile_y = tools_tiling.as_tile_shape(tile_size or DEFAULT_TILE_SIZE)
+        tile_x = tools_tiling.align_to_blocks(tile_x, block_x, width)
+        tile_y = tools_tiling.align_to_blocks(tile_y, block_y, height)
+        band_list = self.resolve_bands(bands)
+
+        for window in tools_tiling.iter_windows(width, height, (tile_x, tile_y), overlap):
+            stack = self._read_window(window.read_xoff, window.read_yoff,
+                                      window.read_xsize, window.read_ysize, normalize, bands=band_list)
+            yield window, stack
+
+    def _read_window(self, xoff, yoff, xsize, ysize, normalize, out=None, dtype=None, bands=None):
+        """
+        Lit une fenêtre de toutes les bandes sous forme de tableau (bandes, hauteur, largeur),
+        en un seul appel GDAL et directement dans le tableau de destination.
+        :param normalize: Si True, normalise les valeurs entre 0 et 1 (float32), sur place.
+        :param out: Tableau de destination préalloué (optionnel).
+        :param dtype: Type du tableau alloué si out n'est pas fourni.
+        :param bands: Bandes à lire (cf. resolve_bands), par défaut toutes.
+        """
+        band_list = self.resolve_bands(bands)
+        bands = len(band_list)
+        native_dtype = self.get_native_dtype(band_list[0])
+        if normalize:
+            # Valeur maximale du type natif, vérifiée avant toute lecture
+            max_val = np.iinfo(native_dtype).max
+
+        out = self._check_out(out, (bands, ysize, xsize), np.float32 if normalize else (dtype or native_dtype),
+                              normalize)
+
+        # Pour une image mono-bande, GDAL attend un tampon 2D
+        buf_obj = out[0] if bands == 1 else out
+        with self._dataset_lock:  # Jeu de données éventuellement partagé entre threads (cf. DatasetPool)
+            self.dataset.ReadAsArray(xoff, yoff, xsize, ysize, buf_obj=buf_obj, band_list=band_list)
+
+        if normalize:
+            out /= max_val
+        return out
+
+    @staticmethod
+    def _check_out(out, shape, dtype, normalize):
+        """
+        Alloue le tableau de destination d'une lecture, ou vérifie celui fourni par l'appelant.
+        """
+        if out is None:
+            return np.empty(shape, dtype=dtype)
+        if out.shape != shape or not out.flags.c_contiguous:
+            raise ValueError(f"Le tableau de sortie doit être C-contigu de forme {shape}, reçu {out.shape}.")
+        if normalize and not np.issubdtype(out.dtype, np.floating):
+            raise ValueError("La normalisation nécessite un tableau de sortie flottant.")
+        return out
 
     def save_metadata(self, output_file):
         """
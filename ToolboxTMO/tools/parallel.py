@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Feb 18 11:34:09 2025
+
+@author: ablot
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+############################## Parallélisme intra-image #####################
+# Les ufuncs numpy et les filtres scipy.ndimage libèrent le GIL : un pool de threads
+# suffit pour traiter plusieurs bandes (ou bandes de lignes) simultanément, sans copie
+# entre processus. Chaque tâche écrit dans sa propre zone : le résultat est identique
+# au traitement séquentiel.
+
+
+def run_tasks(function, tasks, n_workers=1):
+    """
+    Exécute function(*task) pour chaque tâche et retourne les résultats dans l'ordre des tâches.
+    :param function: Fonction à appeler.
+    :param tasks: Liste de tuples d'arguments.
+    :param n_workers: Nombre de threads ; 1 (ou None) pour un traitement séquentiel.
+    :return: Liste des résultats.
+    """
+    tasks = list(tasks)
+    if not n_workers or n_workers <= 1 or len(tasks) <= 1:
+        return [function(*task) for task in tasks]
+    with ThreadPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+        return list(executor.map(lambda task: function(*task), tasks))
+
+
+def row_strips(height, strip_rows):
+    """
+    Découpe un intervalle de lignes en bandes de strip_rows lignes.
+    :return: Liste de slices.
+    """
+    return [slice(start, min(start + strip_rows, height)) for start in range(0, height, strip_rows)]
+
+
+def apply_by_strips(function, matrix, out_dtype, n_workers=1, strip_rows=None, allocate=None):
+    """
+    Applique un opérateur ponctuel à une matrice par bandes de lignes traitées en parallèle,
+    chacune écrite directement dans la matrice de sortie.
+    :param function: Opérateur ponctuel (matrice -> matrice de même forme).
+    :param matrix: Matrice d'entrée (lignes sur le premier axe).
+    :param out_dtype: Type de la matrice de sortie.
+    :param n_workers: Nombre de threads.
+    :param strip_rows: Nombre de lignes par bande ; None pour traiter la matrice d'un bloc.
+    :param allocate: Fonction (forme, type) -> matrice de sortie, par exemple ScratchSpace.empty
+                     pour une sortie sur disque ; par défaut np.empty.
+    :return: Matrice de sortie.
+    """
+    if (not strip_rows or strip_rows >= matrix.shape[0]) and allocate is None:
+        return function(matrix)
+
+    out = (allocate or np.empty)(matrix.shape, out_dtype)
+
+    def process_strip(rows):
+        out[rows] = function(matrix[rows])
+
+    run_tasks(process_strip, [(rows,) for rows in row_strips(matrix.shape[0], strip_rows or matrix.shape[0])],
+              n_workers)
+    return out
+
+
+def map_matrices(function, matrices, out_dtype, n_workers=1, strip_rows=None, allocate=None):
+    """
+    Applique un opérateur ponctuel à une liste de matrices (bandes).
+    Sans découpage, les bandes sont traitées en parallèle ; avec strip_rows, les bandes sont
+    traitées l'une après l'autre et leurs bandes de lignes en parallèle.
+    :param allocate: Fonction d'allocation des matrices de sortie (cf. apply_by_strips).
+    :return: Liste des matrices de sortie, dans l'ordre des bandes.
+    """
+    if strip_rows or allocate is not None:
+        return [apply_by_strips(function, matrix, out_dtype, n_workers, strip_rows, allocate) for matrix in matrices]
+    return run_tasks(function, [(matrix,) for matrix in matrices], n_workers)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Feb 27 10:18:05 2025
+
+@author: ablot
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+import numpy as np
+
+############################## Cache des résultats sur disque #####################
+# Les sorties d'un TMO sont conservées dans des fichiers .npz compressés, nommés d'après une clé
+# calculée sur l'empreinte des pixels d'entrée, la classe de l'opérateur et ses paramètres :
+# relancer une chaîne de traitement sur la même scène avec les mêmes paramètres relit le résultat
+# au lieu de le recalculer. Au-delà de la taille maximale, les entrées les moins récemment
+# utilisées (date de modification, mise à jour à chaque lecture) sont supprimées.
+
+# Variable d'environnement donnant le dossier du cache
+RESULT_CACHE_DIR_ENV = "RS_SDR_CACHE_DIR"
+
+# Taille maximale par défaut du cache (octets)
+RESULT_CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+# Extension des fichiers du cache
+RESULT_CACHE_EXTENSION = ".npz"
+
+# Version du format des clés (à incrémenter si le calcul d'un TMO change)
+RESULT_CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """
+    Dossier du cache par défaut : variable d'environnement RS_SDR_CACHE_DIR, sinon ~/.rs_sdr_cache.
+    """
+    return os.environ.get(RESULT_CACHE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".rs_sdr_cache")
+
+
+def array_fingerprint(matrix):
+    """
+    Empreinte du contenu d'une matrice : forme, type et hachage BLAKE2 des pixels.
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(matrix), digest_size=16).hexdigest()
+    return matrix.shape, matrix.dtype.str, digest
+
+
+def file_fingerprint(path):
+    """
+    Empreinte rapide d'un fichier : chemin absolu, taille et date de modification.
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        Cache des sorties de TMO sur disque.
+        :param directory: Dossier du cache (par défaut cf. default_cache_dir).
+        :param max_bytes: Taille maximale des fichiers du cache ; les entrées les moins récemment
+                          utilisées sont supprimées au-delà.
+        """
+        self.directory = directory or default_cache_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, operator, params, matrices=None, source=None):
+        """
+        Calcule la clé d'un résultat.
+        :param operator: Nom de l'opérateur (classe du TMO).
+        :param params: Dictionnaire des paramètres qui influent sur le résultat (sérialisable en JSON).
+        :param matrices: Matrices d'entrée, identifiées par l'empreinte de leurs pixels.
+        :param source: Chemin d'un fichier d'entrée, identifié par file_fingerprint (plus rapide que le
+                       hachage des pixels, mais ne distingue pas deux lectures différentes du même fichier).
+        :return: Clé hexadécimale.
+        """
+        inputs = [array_fingerprint(matrix) for matrix in matrices or []]
+        if source is not None:
+            inputs.append(file_fingerprint(source))
+        description = json.dumps(
+            {"version": RESULT_CACHE_VERSION, "operator": operator, "params": params, "inputs": inputs},
+            sort_keys=True, default=str
+        )
+        return hashlib.blake2b(description.encode("utf-8"), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + RESULT_CACHE_EXTENSION)
+
+    def get(self, key):
+        """
+        Relit un résultat.
+        :param key: Clé calculée par make_key.
+        :return: Liste de matrices, ou None si la clé n'est pas en cache.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as archive:
+                matrices = [archive[f"band_{b}"] for b in range(len(archive.files))]
+        except FileNotFoundError:
+            # Absente, ou supprimée entre-temps par un autre processus
+            self.misses += 1
+            return None
+        except Exception:
+            # Entrée endommagée (archive tronquée, données compressées invalides...) : supprimée et recalculée
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # Entrée marquée comme récemment utilisée
+        except OSError:
+            pass
+        self.hits += 1
+        return matrices
+
+    def put(self, key, matrices):
+        """
+        Enregistre un résultat (fichier .npz compressé, écrit de façon atomique), puis applique
+        la limite de taille.
+        :param key: Clé calculée par make_key.
+        :param matrices: Liste de matrices.
+        """
+        path = self._path(key)
+        temporary = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp{RESULT_CACHE_EXTENSION}")
+        try:
+            np.savez_compressed(temporary, **{f"band_{b}": np.asarray(matrix) for b, matrix in enumerate(matrices)})
+            os.replace(temporary, path)
+        except BaseException:
+            self._remove(temporary)  # Écriture interrompue : aucune entrée partielle ne subsiste
+            raise
+        self.evict()
+
+    @staticmethod
+    def _remove(path):
+        """
+        Supprime un fichier du cache s'il existe encore.
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        """
+        Fichiers du cache : liste de tuples (date d'utilisation, taille, chemin).
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(RESULT_CACHE_EXTENSION) and not name.startswith("."):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def size_bytes(self):
+        """
+        Taille totale des fichiers du cache (octets).
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à respecter max_bytes.
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        """
+        Supprime toutes les entrées du cache.
+        """
+        for _, _, path in self._entries():
+            self._remove(path)
+
+
+def cached_result(cache, operator, params, matrices, compute):
+    """
+    Retourne le résultat en cache s'il existe, sinon le calcule et l'enregistre.
+    :param cache: ResultCache, ou None pour un calcul direct.
+    :param operator: Nom de l'opérateur (cf. ResultCache.make_key).
+    :param params: Paramètres de l'opérateur.
+    :param matrices: Matrices d'entrée.
+    :param compute: Fonction sans argument retournant la liste des matrices de sortie.
+    :return: Tuple (liste de matrices, True si le résultat provient du cache).
+    """
+    if cache is None:
+        return compute(), False
+    key = cache.make_key(operator, params, matrices)
+    result = cache.get(key)
+    if result is not None:
+        return result, True
+    result = compute()
+    cache.put(key, result)
+    return result, False
+
+
+def open_result_cache(cache):
+    """
+    Retourne le cache de résultats à utiliser par un TMO.
+    :param cache: None ou False (pas de cache), True (cache par défaut), chemin d'un dossier
+                  ou objet ResultCache.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ResultCache()
+    if isinstance(cache, (str, os.PathLike)):
+        return ResultCache(cache)
+    return cache
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Feb 19 14:48:21 2025
+
+@author: ablot
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+############################## Registre des paramètres d'exécution #####################
+# Chaque exécution d'un TMO direct reçoit un identifiant (run_id) et ses paramètres sont
+# enregistrés dans une base SQLite indexée, à côté du fichier de métadonnées. Les opérateurs
+# inverses retrouvent ainsi les paramètres exacts d'une exécution par simple recherche de clé,
+# quelle que soit la taille de l'historique. La base n'est créée qu'au premier enregistrement.
+
+
+def default_store_path(metadata_file):
+    """
+    Chemin de la base associée à un fichier de métadonnées : "<nom>_runs.sqlite".
+    :param metadata_file: Chemin du fichier de métadonnées.
+    """
+    root, _ = os.path.splitext(metadata_file)
+    return f"{root}_runs.sqlite"
+
+
+class RunParameterStore:
+    def __init__(self, store_path):
+        """
+        Registre des paramètres d'exécution. Le fichier SQLite n'est créé qu'au premier record_run :
+        une recherche dans un registre sans fichier ne trouve aucune exécution.
+        :param store_path: Chemin du fichier SQLite.
+        """
+        self.store_path = store_path
+        self._schema_ready = False
+
+    def _ensure_schema(self, connection):
+        """
+        Crée la table et ses index s'ils n'existent pas (une fois par instance) : runs_lookup pour la
+        dernière exécution d'une image, runs_latest pour la dernière exécution d'un opérateur sans image_key.
+        """
+        if self._schema_ready:
+            return
+        connection.execute("PRAGMA journal_mode=WAL")  # Lectures concurrentes pendant les écritures
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " operator TEXT NOT NULL,"
+            " image_key TEXT,"
+            " created REAL NOT NULL,"
+            " params TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS runs_lookup ON runs (operator, image_key, created)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS runs_latest ON runs (operator, created)"
+        )
+        self._schema_ready = True
+
+    @classmethod
+    def for_metadata_file(cls, metadata_file):
+        """
+        Ouvre la base associée à un fichier de métadonnées (cf. default_store_path).
+        """
+        return cls(default_store_path(metadata_file))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Ouvre une connexion, valide la transaction en sortie puis ferme la connexion ; une connexion
+        par opération permet l'usage depuis plusieurs threads ou processus.
+        """
+        with contextlib.closing(sqlite3.connect(self.store_path, timeout=30)) as connection:
+            with connection:  # Validation (ou annulation en cas d'erreur) de la transaction
+                self._ensure_schema(connection)
+                yield connection
+
+    @staticmethod
+    def _to_record(row):
+        """
+        Convertit une ligne de la table en dictionnaire.
+        """
+        if row is None:
+            return None
+        run_id, operator, image_key, created, params = row
+        return {
+            "run_id": run_id,
+            "operator": operator,
+            "image_key": image_key,
+            "created": created,
+            "params": json.loads(params),
+        }
+
+    def record_run(self, operator, params, image_key=None):
+        """
+        Enregistre les paramètres d'une exécution.
+        :param operator: Nom de l'opérateur (nom de la classe du TMO).
+        :param params: Dictionnaire de paramètres sérialisables en JSON.
+        :param image_key: Clé de l'image traitée (par exemple son chemin), optionnelle.
+        :return: Identifiant de l'exécution (run_id).
+        """
+        run_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO runs (run_id, operator, image_key, created, params) VALUES (?, ?, ?, ?, ?)",
+                (run_id, operator, image_key, time.time(), json.dumps(params, default=str)),
+            )
+        return run_id
+
+    def get_run(self, run_id):
+        """
+        Retourne l'enregistrement d'une exécution (recherche par clé primaire).
+        :param run_id: Identifiant de l'exécution.
+        :return: Dictionnaire (run_id, operator, image_key, created, params) ou None.
+        """
+        if not os.path.exists(self.store_path):
+            return None
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT run_id, operator, image_key, created, params FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return self._to_record(row)
+
+    def latest_run(self, operator, image_key=None):
+        """
+        Retourne l'exécution la plus récente d'un opérateur, pour une image donnée si image_key est fourni
+        (recherche dans l'index runs_lookup, ou runs_latest sans image_key). Sans image_key, toutes les images
+        qui partagent le registre sont candidates : préférer get_run(run_id) quand l'exécution est connue.
+        :param operator: Nom de l'opérateur.
+        :param image_key: Clé de l'image (optionnelle).
+        :return: Dictionnaire ou None.
+        """
+        query = "SELECT run_id, operator, image_key, created, params FROM runs WHERE operator = ?"
+        args = [operator]
+        if image_key is not None:
+            query += " AND image_key = ?"
+            args.append(image_key)
+        query += " ORDER BY created DESC, rowid DESC LIMIT 1"
+        if not os.path.exists(self.store_path):
+            return None
+        with self._connect() as connection:
+            row = connection.execute(query, args).fetchone()
+        return self._to_record(row)
+
+
+def open_run_store(run_store, metadata_file):
+    """
+    Retourne le registre à utiliser par un TMO.
+    :param run_store: Objet RunParameterStore, chemin d'une base SQLite, None pour la base
+                      associée au fichier de métadonnées, ou False pour ne pas enregistrer les exécutions.
+    :param metadata_file: Chemin du fichier de métadonnées.
+    :return: RunParameterStore, ou None si run_store vaut False.
+    """
+    if run_store is False:
+        return None
+    if run_store is None:
+        return RunParameterStore.for_metadata_file(metadata_file)
+    if isinstance(run_store, (str, os.PathLike)):
+        return RunParameterStore(run_store)
+    return run_store
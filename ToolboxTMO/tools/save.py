@@ -8,8 +8,12 @@ Created on Thu Jan 16 17:50:19 2025
 ################### class save
 ### doit sauvegarder l'image et les métadonnées
 from osgeo import gdal, osr
+from functools import lru_cache
+import ast
+import importlib.util
 import numpy as np
 import os
+import time
 from PIL import Image, PngImagePlugin
 
 # Définir le chemin du dossier de sortie
@@ -17,36 +21,145 @@ current_script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_script_dir)
 cf_path = os.path.join(parent_dir, 'Created_files')
 
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+
+# Clés traitées à part (et non recopiées dans les métadonnées de l'image produite)
+SPATIAL_KEYS = ("geotransform", "projection")
+
+tools_options = import_dynamic("gdal_options", os.path.join(current_script_dir, 'gdal_options.py'))
+
+CREATION_PROFILES = tools_options.CREATION_PROFILES
+creation_options = tools_options.creation_options
+overview_levels = tools_options.overview_levels
+cog_options = tools_options.cog_options
+
+
+@lru_cache(maxsize=32)
+def _parse_details_file(details_file, mtime_ns):
+    """
+    Lit et analyse un fichier de détails écrit par OpenGDAL.save_metadata.
+    Le résultat est mis en cache par (chemin, date de modification) : des enregistrements
+    successifs à partir du même fichier ne relisent ni n'analysent le texte.
+    :return: Tuple (dictionnaire des détails, géotransformation ou None, projection WKT ou None).
+    """
+    details = {}
+    with open(details_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if ":" in line:
+                key, value = line.split(":", 1)
+                details[key.strip()] = value.strip()
+
+    geotransform = details.get("geotransform")
+    if geotransform:
+        geotransform = tuple(map(float, geotransform.strip("()").split(",")))
+    return details, geotransform or None, _projection_wkt(details.get("projection"))
+
+
+@lru_cache(maxsize=32)
+def _projection_wkt(projection):
+    """
+    Convertit une projection (WKT) en WKT normalisé par osr, avec mise en cache.
+    """
+    if not projection:
+        return None
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(projection)
+    return srs.ExportToWkt()
+
+
+def _details_from_dataset(dataset):
+    """
+    Construit le dictionnaire des détails (comme OpenGDAL.get_image_details) à partir d'un dataset GDAL ouvert.
+    """
+    _, extension = os.path.splitext(dataset.GetDescription())
+    return {
+        'driver': dataset.GetDriver().LongName,
+        'size': (dataset.RasterXSize, dataset.RasterYSize),
+        'bands': dataset.RasterCount,
+        'projection': dataset.GetProjection(),
+        'geotransform': dataset.GetGeoTransform(),
+        'extension': extension or ".tif",
+    }
+
+
 class CreateImageFromDetails:
-    def __init__(self, pixel_matrices, details_file, output_image_name_without_extension):
+    def __init__(self, pixel_matrices, details_file, output_image_name_without_extension, output_dir=None,
+                 profile="default", block_size=None, creation_options=None, cog=False,
+                 overview_resampling="AVERAGE", overview_min_size=256, overview_threads="ALL_CPUS"):
+        """
+        Prépare l'enregistrement d'une image à partir de matrices et des détails de l'image source.
+        :param pixel_matrices: Matrice 2D ou liste de matrices 2D (une par bande). Peut valoir None
+                               pour une écriture en flux (cf. write_blocks).
+        :param details_file: Source des détails : fichier écrit par OpenGDAL.save_metadata,
+                             dictionnaire OpenGDAL.details, objet OpenGDAL ou dataset GDAL ouvert.
+        :param output_image_name_without_extension: Nom du fichier de sortie, sans extension.
+        :param output_dir: Dossier de sortie (par défaut le dossier Created_files).
+        :param profile: Profil d'options de création GeoTIFF : "default", "tiled", "deflate", "zstd" ou "lzw".
+        :param block_size: Taille des tuiles internes GeoTIFF (entier ou tuple (largeur, hauteur)).
+        :param creation_options: Options de création GDAL supplémentaires (dictionnaire ou liste "CLE=VALEUR").
+        :param cog: Si True, produit un Cloud-Optimized GeoTIFF avec aperçus internes (extension .tif uniquement).
+        :param overview_resampling: Méthode de rééchantillonnage des aperçus ("AVERAGE", "NEAREST", "GAUSS",
+                                    "CUBIC", "LANCZOS"...).
+        :param overview_min_size: Taille (pixels) en dessous de laquelle on ne crée plus d'aperçu.
+        :param overview_threads: Nombre de threads pour le calcul des aperçus (GDAL_NUM_THREADS).
+        """
+        pixel_matrices = [] if pixel_matrices is None else pixel_matrices
         self.pixel_matrices = pixel_matrices if isinstance(pixel_matrices, list) else [pixel_matrices]
         for matrix in self.pixel_matrices:
             if len(matrix.shape) != 2:
                 raise ValueError("Chaque matrice dans 'pixel_matrices' doit être en 2D (hauteur x largeur).")
         self.details_file = details_file
         self.output_image_name_without_extension = output_image_name_without_extension
-        self.details = self._read_details_from_file()
+        self.details, self.geotransform, self.projection = self._read_details(details_file)
     
         self.extension = self.details.get("extension", ".tif")
         if not self.extension.startswith("."):
             self.extension = "." + self.extension
     
-        self.output_image_path = os.path.join(cf_path, f"{self.output_image_name_without_extension}{self.extension}")
+        self.output_dir = output_dir or cf_path
+        self.output_image_path = os.path.join(self.output_dir, f"{self.output_image_name_without_extension}{self.extension}")
         self.driver = self._get_driver()
+        self.profile = profile
+        self.block_size = block_size
+        self.creation_options = creation_options
+        self.write_report = None  # Renseigné après l'écriture (durée, débit, taille du fichier)
+        self.cog = cog
+        self.overview_resampling = overview_resampling
+        self.overview_min_size = overview_min_size
+        self.overview_threads = overview_threads
+        if self.cog and self.driver != "GTiff":
+            raise ValueError(f"La sortie COG nécessite une extension .tif (extension actuelle : '{self.extension}').")
 
-    def _read_details_from_file(self):
+    def _read_details(self, source):
         """
-        Lit les détails et métadonnées depuis le fichier texte fourni.
-        Retourne un dictionnaire avec les détails nécessaires pour recréer l'image.
+        Récupère les détails nécessaires pour recréer l'image.
+        :param source: Chemin d'un fichier de détails, dictionnaire de détails, objet OpenGDAL ou dataset GDAL.
+        :return: Tuple (dictionnaire des détails en texte, géotransformation ou None, projection WKT ou None).
         """
-        details = {}
-        with open(self.details_file, 'r', encoding='utf-8') as file:
-            for line in file:
-                line = line.strip()
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    details[key.strip()] = value.strip()
-        return details
+        if isinstance(source, (str, os.PathLike)):
+            path = os.path.abspath(source)
+            details, geotransform, projection = _parse_details_file(path, os.stat(path).st_mtime_ns)
+            return dict(details), geotransform, projection
+
+        if hasattr(source, "GetGeoTransform"):
+            source = _details_from_dataset(source)  # Dataset GDAL
+        elif hasattr(source, "details"):
+            source = source.details  # Objet OpenGDAL
+        details = {key: str(value) for key, value in source.items()}
+        geotransform = source.get("geotransform")
+        geotransform = tuple(map(float, geotransform)) if geotransform else None
+        projection = source.get("projection")
+        return details, geotransform, _projection_wkt(projection if isinstance(projection, str) else None)
 
     def _get_driver(self):
         """
@@ -62,12 +175,43 @@ class CreateImageFromDetails:
 
         return extension_to_driver.get(self.extension.lower())
 
+    def _get_creation_options(self):
+        """
+        Options de création passées au driver : profil et options utilisateur pour GTiff,
+        options utilisateur seules pour les autres formats.
+        """
+        if self.driver == "GTiff":
+            return creation_options(self.profile, self.block_size, self.creation_options)
+        return creation_options("default", options=self.creation_options)
+
+    def _report_write(self, seconds, raw_bytes):
+        """
+        Calcule et affiche le débit d'écriture et le taux de compression de la dernière image écrite.
+        :param seconds: Durée de l'écriture.
+        :param raw_bytes: Volume des données écrites, non compressé (octets).
+        """
+        file_bytes = os.path.getsize(self.output_image_path) if os.path.exists(self.output_image_path) else 0
+        self.write_report = {
+            "seconds": seconds,
+            "raw_bytes": raw_bytes,
+            "file_bytes": file_bytes,
+            "mb_per_second": raw_bytes / 1e6 / seconds if seconds > 0 else 0.0,
+            "compression_ratio": raw_bytes / file_bytes if file_bytes else 0.0,
+            "options": self._get_creation_options(),
+        }
+        print(f"Écriture : {raw_bytes / 1e6:.1f} Mo en {seconds:.2f} s "
+              f"({self.write_report['mb_per_second']:.1f} Mo/s), fichier de {file_bytes / 1e6:.1f} Mo "
+              f"(ratio {self.write_report['compression_ratio']:.2f}).")
+        return self.write_report
+
     def create_image(self):
         """
         Crée une image en fonction des métadonnées.
         Utilise Pillow pour JPEG, sinon GDAL pour les autres formats.
         Gère automatiquement les codages 8 bits et 16 bits.
         """
+        if not self.pixel_matrices:
+            raise ValueError("Aucune matrice à enregistrer : utiliser write_blocks pour une écriture en flux.")
         if self.extension.lower() in [".jpg", ".jpeg"]:
             # Pour JPEG, convertir en 8 bits car JPEG ne prend pas en charge 16 bits
             self.pixel_matrices = [self._scale_to_8bit(matrix) for matrix in self.pixel_matrices]
@@ -84,6 +228,123 @@ class CreateImageFromDetails:
             return (matrix / 65535.0 * 255).astype(np.uint8)
         return matrix
 
+    @staticmethod
+    def _gdal_data_type(dtype):
+        """
+        Retourne le type GDAL correspondant au type numpy des données (uint8 ou uint16).
+        """
+        if np.issubdtype(dtype, np.uint16):
+            return gdal.GDT_UInt16
+        elif np.issubdtype(dtype, np.uint8):
+            return gdal.GDT_Byte
+        raise ValueError("Type de données non pris en charge : uniquement uint8 ou uint16.")
+
+    def _raster_size(self):
+        """
+        Taille (largeur, hauteur) de l'image source, lue dans les détails.
+        """
+        size = self.details.get("size")
+        if not size:
+            raise ValueError("Taille de l'image absente des détails : préciser width et height.")
+        width, height = ast.literal_eval(size)
+        return int(width), int(height)
+
+    def _open_output_dataset(self, cols, rows, bands, data_type):
+        """
+        Crée le dataset GDAL de sortie avec les options de création du profil.
+        """
+        driver = gdal.GetDriverByName(self.driver)
+        if not driver or not driver.Create:
+            raise ValueError(f"Le driver '{self.driver}' n'est pas supporté ou ne permet pas la création.")
+    
+        if self.cog:
+            # Image intermédiaire tuilée non compressée, recopiée en COG à la fermeture
+            path, options = self._cog_scratch_path(), creation_options("tiled", self.block_size)
+        else:
+            path, options = self.output_image_path, self._get_creation_options()
+        out_dataset = driver.Create(path, cols, rows, bands, data_type, options=options)
+        if not out_dataset:
+            raise RuntimeError(f"Impossible de créer le fichier de sortie : {path}")
+        return out_dataset
+
+    def _cog_scratch_path(self):
+        """
+        Chemin de l'image intermédiaire utilisée pour produire un COG.
+        """
+        return os.path.join(self.output_dir, f"{self.output_image_name_without_extension}.cog_tmp.tif")
+
+    def _build_overviews(self, dataset):
+        """
+        Calcule les aperçus internes d'un dataset, en parallèle (GDAL_NUM_THREADS).
+        :return: Facteurs de réduction des aperçus créés.
+        """
+        levels = overview_levels(dataset.RasterXSize, dataset.RasterYSize, self.overview_min_size)
+        if not levels:
+            return levels
+        previous_threads = gdal.GetConfigOption("GDAL_NUM_THREADS")
+        gdal.SetConfigOption("GDAL_NUM_THREADS", str(self.overview_threads))
+        try:
+            if dataset.BuildOverviews(resampling=self.overview_resampling, overviewlist=levels) != 0:
+                raise RuntimeError(f"Échec du calcul des aperçus pour {self.output_image_path}")
+        finally:
+            gdal.SetConfigOption("GDAL_NUM_THREADS", previous_threads)
+        return levels
+
+    def _write_cog(self, dataset):
+        """
+        Calcule les aperçus de l'image intermédiaire puis la recopie en Cloud-Optimized GeoTIFF
+        (driver COG, ou GTiff avec COPY_SRC_OVERVIEWS si le driver COG n'est pas disponible).
+        """
+        levels = self._build_overviews(dataset)
+        options = self._get_creation_options()
+        driver = gdal.GetDriverByName("COG")
+        if driver:
+            options = cog_options(options)
+        else:
+            driver = gdal.GetDriverByName("GTiff")
+            options = creation_options(self.profile, self.block_size or 512, options + ["COPY_SRC_OVERVIEWS=YES"])
+
+        out_dataset = driver.CreateCopy(self.output_image_path, dataset, 0, options=options)
+        if not out_dataset:
+            raise RuntimeError(f"Impossible de créer le fichier de sortie : {self.output_image_path}")
+        out_dataset = None
+        print(f"COG : {len(levels)} aperçus ({self.overview_resampling}) {levels}")
+
+    def _finalize_output_dataset(self, out_dataset, shapes, data_type):
+        """
+        Ajoute géoréférencement et métadonnées au dataset de sortie (et produit le COG le cas échéant).
+        Le dataset doit ensuite être fermé par l'appelant, puis _output_written appelée.
+        :param shapes: Formes (hauteur, largeur) des bandes écrites.
+        """
+        # Ajouter le géotransform et la projection si disponibles (déjà analysés et mis en cache)
+        if self.geotransform:
+            out_dataset.SetGeoTransform(self.geotransform)
+    
+        if self.projection:
+            out_dataset.SetProjection(self.projection)
+    
+        # Ajouter des métadonnées supplémentaires
+        metadata = {k: v for k, v in self.details.items() if k not in SPATIAL_KEYS}
+        metadata["Pixel Matrices Shape"] = str(shapes)
+        metadata["Bit Depth"] = "16-bit" if data_type == gdal.GDT_UInt16 else "8-bit"
+        out_dataset.SetMetadata(metadata)
+    
+        out_dataset.FlushCache()
+        if self.cog:
+            self._write_cog(out_dataset)
+
+    def _output_written(self, start, raw_bytes):
+        """
+        Après fermeture du dataset de sortie : supprime l'image intermédiaire du COG
+        et rend compte de l'écriture.
+        :param start: Instant (time.perf_counter) du début de l'écriture.
+        :param raw_bytes: Volume des données écrites, non compressé (octets).
+        """
+        if self.cog:
+            gdal.Unlink(self._cog_scratch_path())
+        print(f"Image GDAL sauvegardée dans : {self.output_image_path}")
+        return self._report_write(time.perf_counter() - start, raw_bytes)
+
     def _create_image_with_gdal(self):
         """
         Crée une image avec GDAL (pour TIFF, PNG, BMP).
@@ -97,46 +358,64 @@ class CreateImageFromDetails:
         bands = len(self.pixel_matrices)
     
         # Détection automatique du type de données
-        if np.issubdtype(self.pixel_matrices[0].dtype, np.uint16):
-            data_type = gdal.GDT_UInt16
-        elif np.issubdtype(self.pixel_matrices[0].dtype, np.uint8):
-            data_type = gdal.GDT_Byte
-        else:
-            raise ValueError("Type de données non pris en charge : uniquement uint8 ou uint16.")
+        data_type = self._gdal_data_type(self.pixel_matrices[0].dtype)
     
         # Création du dataset GDAL
-        driver = gdal.GetDriverByName(self.driver)
-        if not driver or not driver.Create:
-            raise ValueError(f"Le driver '{self.driver}' n'est pas supporté ou ne permet pas la création.")
-    
-        out_dataset = driver.Create(self.output_image_path, cols, rows, bands, data_type)
-        if not out_dataset:
-            raise RuntimeError(f"Impossible de créer le fichier de sortie : {self.output_image_path}")
+        start = time.perf_counter()
+        out_dataset = self._open_output_dataset(cols, rows, bands, data_type)
     
         # Écrire les bandes dans le dataset
         for i, matrix in enumerate(self.pixel_matrices):
             out_dataset.GetRasterBand(i + 1).WriteArray(matrix)
     
-        # Ajouter le géotransform et la projection si disponibles
-        geotransform = self.details.get("geotransform")
-        if geotransform:
-            out_dataset.SetGeoTransform(tuple(map(float, geotransform.strip("()").split(","))))
-    
-        projection = self.details.get("projection")
-        if projection:
-            srs = osr.SpatialReference()
-            srs.ImportFromWkt(projection)
-            out_dataset.SetProjection(srs.ExportToWkt())
-    
-        # Ajouter des métadonnées supplémentaires
-        metadata = {k: v for k, v in self.details.items() if k not in ["geotransform", "projection"]}
-        metadata["Pixel Matrices Shape"] = str([matrix.shape for matrix in self.pixel_matrices])
-        metadata["Bit Depth"] = "16-bit" if data_type == gdal.GDT_UInt16 else "8-bit"
-        out_dataset.SetMetadata(metadata)
-    
-        out_dataset.FlushCache()
-        out_dataset = None
-        print(f"Image GDAL sauvegardée dans : {self.output_image_path}")
+        self._finalize_output_dataset(out_dataset, [matrix.shape for matrix in self.pixel_matrices], data_type)
+        out_dataset = None  # Fermeture : fin de la compression et de l'écriture sur le disque
+        self._output_written(start, sum(matrix.nbytes for matrix in self.pixel_matrices))
+
+    def write_blocks(self, blocks, width=None, height=None, interleaved=False):
+        """
+        Écrit une image en flux : le dataset est créé à l'arrivée de la première tuile, puis chaque
+        tuile est écrite à sa position dès qu'elle est produite. L'image complète n'est jamais en mémoire.
+        :param blocks: Itérable de tuples (window, tuile), par exemple MantiukTMO.tone_map_blocks.
+                       window fournit xoff et yoff (cf. tiling.BlockWindow) ; la tuile est un tableau
+                       (bandes, hauteur, largeur), ou (hauteur, largeur) pour une seule bande.
+        :param width: Largeur de l'image (par défaut celle des détails).
+        :param height: Hauteur de l'image (par défaut celle des détails).
+        :param interleaved: True pour des tuiles entrelacées (hauteur, largeur, bandes),
+                            comme celles de ReflectanceCompositor.compose_blocks.
+        :return: Chemin de l'image écrite.
+        """
+        if not self.driver:
+            raise ValueError(f"L'écriture en flux n'est pas possible pour l'extension '{self.extension}'.")
+        if width is None or height is None:
+            width, height = self._raster_size()
+
+        start = time.perf_counter()
+        out_dataset, data_type, bands, raw_bytes = None, None, 0, 0
+        for window, tile in blocks:
+            tile = np.asarray(tile)
+            if tile.ndim == 2:
+                tile = tile[np.newaxis]
+            elif interleaved:
+                tile = tile.transpose(2, 0, 1)
+
+            if out_dataset is None:
+                # Type et nombre de bandes fixés par la première tuile
+                data_type, bands = self._gdal_data_type(tile.dtype), len(tile)
+                out_dataset = self._open_output_dataset(width, height, bands, data_type)
+            elif len(tile) != bands:
+                raise ValueError(f"Tuile à {len(tile)} bandes, {bands} attendues.")
+
+            for i, band_tile in enumerate(tile):
+                out_dataset.GetRasterBand(i + 1).WriteArray(band_tile, xoff=int(window.xoff), yoff=int(window.yoff))
+            raw_bytes += tile.nbytes
+
+        if out_dataset is None:
+            raise ValueError("Aucune tuile à écrire.")
+        self._finalize_output_dataset(out_dataset, [(height, width)] * bands, data_type)
+        out_dataset = None  # Fermeture : fin de la compression et de l'écriture sur le disque
+        self._output_written(start, raw_bytes)
+        return self.output_image_path
 
     def _create_image_with_pillow(self):
         """
@@ -159,7 +438,7 @@ class CreateImageFromDetails:
         image = Image.fromarray(image_data)
     
         # Ajouter des métadonnées (limitées pour JPEG)
-        metadata = {key: value for key, value in self.details.items() if key not in ["geotransform", "projection"]}
+        metadata = {key: value for key, value in self.details.items() if key not in SPATIAL_KEYS}
     
         # Utiliser PngInfo pour ajouter des métadonnées
         jpeg_metadata = PngImagePlugin.PngInfo()  # PngInfo peut être utilisé même pour JPEG
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Feb 21 09:22:50 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import uuid
+import weakref
+
+############################## Espace de travail sur disque #####################
+# Les matrices intermédiaires (entrée normalisée, sorties des TMO) peuvent être adossées à des
+# fichiers numpy.memmap : le système ne garde en mémoire que les pages en cours d'utilisation,
+# ce qui permet de traiter des scènes plus grandes que la mémoire vive. Les fichiers sont créés
+# dans un sous-dossier temporaire ; chaque fichier est supprimé dès que sa matrice (et toutes ses vues)
+# est libérée, et le dossier lorsqu'il est vide et que l'espace de travail est libéré.
+
+# Variable d'environnement donnant le dossier des fichiers temporaires (par défaut celui du système)
+SCRATCH_DIR_ENV = "RS_SDR_SCRATCH_DIR"
+
+# Nombre de lignes traitées à la fois par les TMO lorsque leurs sorties sont sur disque
+SCRATCH_STRIP_ROWS = 1024
+
+
+def _remove_directory(directory):
+    """
+    Supprime le dossier de l'espace de travail s'il est vide.
+    """
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass  # Fichiers encore utilisés : le dernier supprimé retirera le dossier
+
+
+def _remove_file(path, space_ref):
+    """
+    Supprime le fichier d'une matrice libérée (appelé une fois la projection mémoire fermée, ce qui
+    permet aussi la suppression sous Windows), puis le dossier si l'espace de travail est libéré.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Déjà supprimé par cleanup()
+    if space_ref() is None:
+        _remove_directory(os.path.dirname(path))
+
+
+class ScratchSpace:
+    def __init__(self, directory=None, min_bytes=0, prefix="rs_sdr_"):
+        """
+        Crée un espace de travail temporaire pour des matrices sur disque.
+        :param directory: Dossier parent des fichiers (par défaut la variable d'environnement
+                          RS_SDR_SCRATCH_DIR, sinon le dossier temporaire du système).
+        :param min_bytes: Taille en dessous de laquelle les matrices restent en mémoire.
+        :param prefix: Préfixe du sous-dossier créé.
+        """
+        directory = directory or os.environ.get(SCRATCH_DIR_ENV) or None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix=prefix, dir=directory)
+        self.min_bytes = min_bytes
+        # Au ramasse-miettes ou à la fin du programme, le dossier n'est supprimé que s'il est vide :
+        # les matrices allouées peuvent survivre à l'espace de travail (cf. empty)
+        self._finalizer = weakref.finalize(self, _remove_directory, self.directory)
+
+    def empty(self, shape, dtype):
+        """
+        Alloue une matrice non initialisée, sur disque si sa taille atteint min_bytes.
+        Le fichier est supprimé lorsque la matrice et toutes ses vues sont libérées, même si l'espace
+        de travail l'a été avant.
+        :param shape: Forme de la matrice.
+        :param dtype: Type de données.
+        :return: numpy.memmap (ou ndarray pour une petite matrice).
+        """
+        shape = tuple(np.atleast_1d(shape).astype(int))
+        if int(np.prod(shape)) * np.dtype(dtype).itemsize < max(self.min_bytes, 1):
+            return np.empty(shape, dtype=dtype)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.dat")
+        matrix = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+        # Suppression liée à la projection mémoire, partagée par la matrice et ses vues
+        weakref.finalize(matrix._mmap, _remove_file, path, weakref.ref(self))
+        return matrix
+
+    def empty_like(self, array, dtype=None):
+        """
+        Alloue une matrice de même forme (et par défaut de même type) qu'un tableau.
+        """
+        return self.empty(array.shape, dtype or array.dtype)
+
+    def copy(self, array):
+        """
+        Copie un tableau dans une matrice de l'espace de travail.
+        """
+        out = self.empty_like(array)
+        out[...] = array
+        return out
+
+    def cleanup(self):
+        """
+        Supprime le dossier et tous ses fichiers. Les matrices allouées ne doivent plus être utilisées.
+        """
+        self._finalizer.detach()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+
+def open_scratch(scratch):
+    """
+    Retourne l'espace de travail à utiliser par un TMO.
+    :param scratch: None (matrices en mémoire), True (espace temporaire par défaut), chemin d'un dossier,
+                    ou objet ScratchSpace (à privilégier pour partager un espace entre étapes et
+                    maîtriser sa durée de vie). Avec True ou un chemin, l'espace appartient au TMO ; les
+                    fichiers des matrices retournées restent valides tant que ces matrices sont utilisées.
+    """
+    if scratch is None or scratch is False:
+        return None
+    if scratch is True:
+        return ScratchSpace()
+    if isinstance(scratch, (str, os.PathLike)):
+        return ScratchSpace(scratch)
+    return scratch
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Feb 20 10:05:37 2025
+
+@author: ablot
+"""
+
+import numpy as np
+import os
+import importlib.util
+
+# Définir le chemin du dossier contenant les modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+tools_parallel = import_dynamic("parallel", os.path.join(current_script_dir, 'parallel.py'))
+
+row_strips = tools_parallel.row_strips
+
+############################## Statistiques en flux #####################
+# Minimum, maximum, moyenne, variance et histogramme de chaque bande, accumulés tuile par tuile
+# en une seule passe dès que les bornes de l'histogramme sont connues. Les moyennes et variances partielles sont fusionnées par la formule de
+# Chan et al., numériquement stable ; les percentiles sont déduits de l'histogramme.
+
+# Nombre de classes par défaut de l'histogramme d'une image flottante
+DEFAULT_BINS = 1024
+
+# Nombre de lignes lues à la fois dans une matrice en mémoire (limite les temporaires)
+STATISTICS_STRIP_ROWS = 512
+
+
+def exact_histogram_dtype(dtype):
+    """
+    Indique si un type admet un histogramme exact à une classe par valeur (entiers sur 8 ou 16 bits,
+    signés ou non). Pour les autres types, les bornes de l'histogramme doivent être connues.
+    """
+    dtype = np.dtype(dtype)
+    return np.issubdtype(dtype, np.integer) and dtype.itemsize <= 2
+
+
+def data_range(stacks, nodata=None):
+    """
+    Étendue des valeurs d'une suite de tuiles (hors nodata et valeurs non finies), utilisée comme
+    bornes d'histogramme lorsqu'elles ne sont pas fournies.
+    :param stacks: Itérable de tuiles (cf. BandStatistics.update).
+    :param nodata: Valeur d'absence de donnée.
+    :return: Tuple (minimum, maximum), d'étendue non nulle.
+    """
+    low, high = np.inf, -np.inf
+    for stack in stacks:
+        for band in [stack] if getattr(stack, "ndim", None) == 2 else stack:
+            values = band[np.isfinite(band)] if np.issubdtype(band.dtype, np.floating) else band.ravel()
+            if nodata is not None:
+                values = values[values != nodata]
+            if values.size:
+                low, high = min(low, float(values.min())), max(high, float(values.max()))
+    if low > high:
+        return 0.0, 1.0  # Aucune valeur valide
+    return (low, high) if high > low else (low, low + 1.0)
+
+
+class BandStatistics:
+    def __init__(self, bins=None, value_range=None, nodata=None, histogram=True):
+        """
+        Accumulateur de statistiques par bande.
+        :param bins: Nombre de classes de l'histogramme. Par défaut, une classe par valeur pour une
+                     image entière sur 8 ou 16 bits (percentiles exacts) et DEFAULT_BINS sinon.
+        :param value_range: Bornes (bas, haut) de l'histogramme. Par défaut, l'étendue du type entier sur
+                            8 ou 16 bits ; obligatoire pour les autres types (flottants notamment, cf.
+                            compute_statistics qui la déduit des données). Les valeurs hors bornes sont
+                            comptées dans la première ou la dernière classe.
+        :param nodata: Valeur d'absence de donnée, exclue de toutes les statistiques, comme les valeurs
+                       non finies (NaN, infinis) d'une image flottante.
+        :param histogram: Si False, seuls l'effectif, les extrema et les moments sont accumulés (aucun
+                          histogramme, bins et value_range ignorés) : percentile() n'est alors pas disponible.
+        """
+        self.bins = bins
+        self.value_range = value_range
+        self.nodata = nodata
+        self.with_histogram = histogram
+        self.count = None
+        self.minimum = None
+        self.maximum = None
+        self.mean = None
+        self._m2 = None  # Somme des carrés des écarts à la moyenne
+        self.histogram = None
+        self.bin_edges = None
+
+    def _initialize(self, band_count, dtype):
+        """
+        Alloue les accumulateurs à la première tuile : nombre de bandes et classes de l'histogramme.
+        """
+        self.count = np.zeros(band_count, dtype=np.int64)
+        self.minimum = np.full(band_count, np.inf)
+        self.maximum = np.full(band_count, -np.inf)
+        self.mean = np.zeros(band_count)
+        self._m2 = np.zeros(band_count)
+        if not self.with_histogram:
+            return
+
+        integer = exact_histogram_dtype(dtype)
+        if self.value_range is None:
+            if not integer:
+                raise ValueError(f"Bornes de l'histogramme (value_range) requises pour des données {np.dtype(dtype)}.")
+            info = np.iinfo(dtype)
+            self.value_range = (int(info.min), int(info.max) + 1)
+        if self.bins is None:
+            self.bins = int(self.value_range[1] - self.value_range[0]) if integer else DEFAULT_BINS
+        # Une classe par valeur entière : histogramme par np.bincount des valeurs décalées du minimum
+        # du type (types signés), sans comparaison aux bornes
+        self._exact_integer = integer and self.value_range == (np.iinfo(dtype).min, np.iinfo(dtype).max + 1) \
+            and self.bins == self.value_range[1] - self.value_range[0]
+        self.histogram = np.zeros((band_count, self.bins), dtype=np.int64)
+        self.bin_edges = np.linspace(self.value_range[0], self.value_range[1], self.bins + 1)
+
+    def update(self, stack):
+        """
+        Ajoute une tuile aux statistiques.
+        :param stack: Tableau (bandes, hauteur, largeur), liste de matrices 2D (une par bande)
+                      ou matrice 2D (une seule bande).
+        :return: L'accumulateur (pour chaîner les appels).
+        """
+        bands = [stack] if getattr(stack, "ndim", None) == 2 else stack
+        if self.count is None:
+            self._initialize(len(bands), bands[0].dtype)
+        elif len(bands) != len(self.count):
+            raise ValueError(f"Tuile à {len(bands)} bandes, {len(self.count)} attendues.")
+
+        for b, band in enumerate(bands):
+            values = band.ravel()
+            if np.issubdtype(values.dtype, np.floating):
+                values = values[np.isfinite(values)]  # NaN et infinis exclus, comme dans data_range
+            if self.nodata is not None:
+                values = values[values != self.nodata]
+            if values.size == 0:
+                continue
+            self._update_moments(b, values)
+            if self.with_histogram:
+                self._update_histogram(b, values)
+        return self
+
+    def _update_moments(self, b, values):
+        """
+        Fusionne les moments d'une tuile avec ceux déjà accumulés pour la bande b (formule de Chan).
+        """
+        n_tile = values.size
+        mean_tile = values.mean(dtype=np.float64)
+        m2_tile = np.square(values - mean_tile, dtype=np.float64).sum()
+        self.minimum[b] = min(self.minimum[b], float(values.min()))
+        self.maximum[b] = max(self.maximum[b], float(values.max()))
+        self._merge_moments(b, n_tile, mean_tile, m2_tile)
+
+    def _merge_moments(self, b, n_other, mean_other, m2_other):
+        """
+        Fusion de deux ensembles de moments (effectif, moyenne, somme des carrés des écarts).
+        """
+        n = self.count[b] + n_other
+        delta = mean_other - self.mean[b]
+        self.mean[b] += delta * n_other / n
+        self._m2[b] += m2_other + delta * delta * self.count[b] * n_other / n
+        self.count[b] = n
+
+    def _update_histogram(self, b, values):
+        """
+        Ajoute les valeurs d'une tuile à l'histogramme de la bande b.
+        """
+        if self._exact_integer:
+            offset = self.value_range[0]
+            indices = values if offset == 0 else values.astype(np.int32) - offset
+            self.histogram[b] += np.bincount(indices, minlength=self.bins)
+            return
+        low, high = self.value_range
+        if values.min() < low or values.max() > high:
+            values = np.clip(values, low, high)  # Valeurs hors bornes dans les classes extrêmes
+        self.histogram[b] += np.histogram(values, bins=self.bins, range=(low, high))[0]
+
+    def merge(self, other):
+        """
+        Fusionne un autre accumulateur (par exemple calculé dans un autre thread ou processus).
+        Les deux accumulateurs doivent avoir les mêmes classes d'histogramme (ou aucun histogramme).
+        :return: L'accumulateur.
+        """
+        if other.count is None:
+            return self
+        if self.with_histogram != other.with_histogram:
+            raise ValueError("Impossible de fusionner un accumulateur avec histogramme et un accumulateur sans.")
+        if self.count is None:
+            self.count = np.zeros_like(other.count)
+            self.minimum, self.maximum = other.minimum.copy(), other.maximum.copy()
+            self.mean, self._m2 = np.zeros_like(other.mean), np.zeros_like(other._m2)
+            if self.with_histogram:
+                self.bins, self.value_range = other.bins, other.value_range
+                self._exact_integer = other._exact_integer
+                self.histogram, self.bin_edges = np.zeros_like(other.histogram), other.bin_edges.copy()
+        elif self.with_histogram and not np.array_equal(self.bin_edges, other.bin_edges):
+            raise ValueError("Impossible de fusionner des histogrammes de classes différentes.")
+
+        for b in range(len(self.count)):
+            if other.count[b]:
+                self.minimum[b] = min(self.minimum[b], other.minimum[b])
+                self.maximum[b] = max(self.maximum[b], other.maximum[b])
+                self._merge_moments(b, other.count[b], other.mean[b], other._m2[b])
+        if self.with_histogram:
+            self.histogram += other.histogram
+        return self
+
+    @property
+    def variance(self):
+        """
+        Variance de chaque bande (de population).
+        """
+        return self._m2 / np.maximum(self.count, 1)
+
+    @property
+    def std(self):
+        """
+        Écart-type de chaque bande.
+        """
+        return np.sqrt(self.variance)
+
+    def percentile(self, q):
+        """
+        Percentile(s) de chaque bande, estimé(s) à partir de l'histogramme (interpolation linéaire
+        dans la classe ; exact pour un histogramme à une classe par valeur entière).
+        :param q: Percentile ou liste de percentiles entre 0 et 100.
+        :return: Tableau (bandes,) ou (bandes, len(q)).
+        """
+        if not self.with_histogram:
+            raise ValueError("Percentiles indisponibles : accumulateur créé sans histogramme (histogram=False).")
+        q_values = np.atleast_1d(np.asarray(q, dtype=float))
+        results = np.zeros((len(self.histogram), len(q_values)))
+        for b, histogram in enumerate(self.histogram):
+            cumulative = np.cumsum(histogram)
+            if cumulative[-1] == 0:
+                results[b] = np.nan
+                continue
+            targets = q_values / 100.0 * cumulative[-1]
+            # Au moins une valeur : le percentile 0 est la première classe non vide
+            index = np.minimum(np.searchsorted(cumulative, np.maximum(targets, 1)), len(histogram) - 1)
+            if self._exact_integer:
+                results[b] = self.bin_edges[index]
+                continue
+            before = np.where(index > 0, cumulative[index - 1], 0)
+            fraction = (targets - before) / np.maximum(histogram[index], 1)
+            results[b] = self.bin_edges[index] + fraction * (self.bin_edges[index + 1] - self.bin_edges[index])
+        return results[:, 0] if np.ndim(q) == 0 else results
+
+    def summary(self, percentiles=(2, 50, 98)):
+        """
+        Résumé des statistiques de chaque bande.
+        :return: Liste de dictionnaires (count, min, max, mean, std et percentiles demandés, sauf pour
+                 un accumulateur sans histogramme).
+        """
+        if not self.with_histogram:
+            percentiles = ()
+        values = self.percentile(list(percentiles)) if percentiles else np.zeros((len(self.count), 0))
+        return [
+            dict({"count": int(self.count[b]), "min": float(self.minimum[b]), "max": float(self.maximum[b]),
+                  "mean": float(self.mean[b]), "std": float(self.std[b])},
+                 **{f"p{q:g}": float(values[b, i]) for i, q in enumerate(percentiles)})
+            for b in range(len(self.count))
+        ]
+
+
+def compute_statistics(source, bands=None, tile_size=None, approximate=False, preview_size=1024,
+                       bins=None, value_range=None, nodata=None):
+    """
+    Calcule les statistiques de chaque bande. Une seule passe suffit pour une image entière sur 8 ou 16 bits
+    ou si value_range est fourni ; sinon (image flottante) une passe préalable calcule l'étendue des données,
+    et un objet OpenGDAL est alors lu deux fois sur le disque : fournir value_range pour l'éviter.
+    :param source: Objet OpenGDAL (lecture tuile par tuile), tableau (bandes, hauteur, largeur),
+                   liste de matrices 2D ou matrice 2D (parcourus par bandes de lignes).
+    :param bands: Bandes à lire pour un objet OpenGDAL (cf. OpenGDAL.resolve_bands).
+    :param tile_size: Taille des tuiles lues (cf. OpenGDAL.iter_blocks).
+    :param approximate: Pour un objet OpenGDAL, estime les statistiques sur une lecture réduite
+                        (preview_size pixels au plus), servie par les aperçus GDAL s'ils existent.
+    :param preview_size: Taille maximale du plus grand côté de la lecture réduite.
+    :param bins: Nombre de classes de l'histogramme (cf. BandStatistics).
+    :param value_range: Bornes de l'histogramme (cf. BandStatistics). Par défaut, l'étendue du type pour une
+                        image entière sur 8 ou 16 bits, sinon l'étendue des données (passe préalable, cf. data_range).
+    :param nodata: Valeur d'absence de donnée.
+    :return: Accumulateur BandStatistics.
+    """
+    if hasattr(source, "dataset"):
+        if approximate:
+            stack = source.read_decimated(preview_size, bands=bands)
+            if value_range is None and not exact_histogram_dtype(stack.dtype):
+                value_range = data_range([stack], nodata)
+            return BandStatistics(bins=bins, value_range=value_range, nodata=nodata).update(stack)
+        dtype = source.get_native_dtype(source.resolve_bands(bands)[0])
+
+        def stacks():
+            return (stack for _, stack in source.iter_blocks(tile_size, normalize=False, bands=bands))
+    else:
+        matrices = [source] if getattr(source, "ndim", None) == 2 else source
+        dtype = matrices[0].dtype
+
+        def stacks():
+            return ([matrix[rows] for matrix in matrices] for rows in row_strips(matrices[0].shape[0],
+                                                                                  STATISTICS_STRIP_ROWS))
+
+    if value_range is None and not exact_histogram_dtype(dtype):
+        # Bornes inconnues (image flottante) : passe préalable sur les extrema
+        value_range = data_range(stacks(), nodata)
+    statistics = BandStatistics(bins=bins, value_range=value_range, nodata=nodata)
+    for stack in stacks():
+        statistics.update(stack)
+    return statistics
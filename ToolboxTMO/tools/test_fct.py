@@ -4,7 +4,7 @@ Created on Tue Jan 21 20:04:15 2025
 
 @author: ablot
 """
-from open import OpenGDAL
+from open import OpenGDAL, DatasetPool
 from save import CreateImageFromDetails
 from Mantiuk import MantiukTMO
 from ImageDisplay import ImageDisplay as Idisp
@@ -24,8 +24,9 @@ output_path1 = r"C:\Users\ablot\Documents\PPMD\TMO_Toolbox\TMO\TMO_Toolbox\tools
 output_path2 = r"C:\Users\ablot\Documents\PPMD\TMO_Toolbox\TMO\TMO_Toolbox\tools\ImageApres.tif"
 
 
-# Chargement des données
-image_metadata = OpenGDAL(image_path, meta_path)
+# Chargement des données ; l'image est rouverte plus bas : ses lectures sont mémorisées (1 Go)
+read_pool = DatasetPool(max_read_bytes=1024 ** 3)
+image_metadata = OpenGDAL(image_path, meta_path, pool=read_pool)
 pixel_matrix = image_metadata.get_pixel_matrix(normalize=True)
  
 # Création d'une première image
@@ -64,7 +65,7 @@ pixel_matrix = image_metadata.get_pixel_matrix(normalize=True)
 #### test TMO 
 
 CreateImageFromDetails(pixel_matrix, meta_path, output_path1).create_image()
-image_metadata = OpenGDAL(image_path, meta_path)
+image_metadata = OpenGDAL(image_path, meta_path, pool=read_pool)  # Relue depuis le pool, sans accès disque
 pixel_matrix = image_metadata.get_pixel_matrix(normalize=True)
 
 for i in range(len(pixel_matrix)):
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Feb 10 14:12:05 2025
+
+@author: ablot
+"""
+
+from collections import namedtuple
+
+
+class BlockWindow(namedtuple("BlockWindow", [
+        "xoff", "yoff", "xsize", "ysize",
+        "read_xoff", "read_yoff", "read_xsize", "read_ysize"])):
+    """
+    Fenêtre de traitement d'une tuile.
+    - (xoff, yoff, xsize, ysize) : zone "utile" de la tuile, sans recouvrement.
+    - (read_xoff, read_yoff, read_xsize, read_ysize) : zone réellement lue,
+      élargie du recouvrement (halo) et tronquée aux bords de l'image.
+    """
+    __slots__ = ()
+
+    def core_slices(self):
+        """
+        Retourne les slices (lignes, colonnes) permettant d'extraire la zone utile
+        d'une tuile lue avec recouvrement.
+        :return: Tuple (slice des lignes, slice des colonnes).
+        """
+        row_start = self.yoff - self.read_yoff
+        col_start = self.xoff - self.read_xoff
+        return (slice(row_start, row_start + self.ysize),
+                slice(col_start, col_start + self.xsize))
+
+    def read_slices(self):
+        """
+        Retourne les slices (lignes, colonnes) de la zone lue dans l'image complète.
+        :return: Tuple (slice des lignes, slice des colonnes).
+        """
+        return (slice(self.read_yoff, self.read_yoff + self.read_ysize),
+                slice(self.read_xoff, self.read_xoff + self.read_xsize))
+
+    def slices(self):
+        """
+        Retourne les slices (lignes, colonnes) de la zone utile dans l'image complète.
+        :return: Tuple (slice des lignes, slice des colonnes).
+        """
+        return (slice(self.yoff, self.yoff + self.ysize),
+                slice(self.xoff, self.xoff + self.xsize))
+
+
+def as_tile_shape(tile_size):
+    """
+    Convertit une taille de tuile (entier ou couple) en couple (largeur, hauteur).
+    :param tile_size: Entier (tuile carrée) ou tuple (largeur, hauteur).
+    :return: Tuple (largeur, hauteur).
+    """
+    if isinstance(tile_size, int):
+        tile_size = (tile_size, tile_size)
+    tile_x, tile_y = tile_size
+    if tile_x <= 0 or tile_y <= 0:
+        raise ValueError(f"Taille de tuile invalide : {tile_size}")
+    return int(tile_x), int(tile_y)
+
+
+def align_to_blocks(size, block_size, limit):
+    """
+    Arrondit une taille au multiple supérieur de la taille de bloc, sans dépasser la limite.
+    :param size: Taille souhaitée (en pixels).
+    :param block_size: Taille du bloc natif (en pixels).
+    :param limit: Taille maximale (dimension de l'image).
+    :return: Taille alignée sur les blocs.
+    """
+    aligned = -(-size // block_size) * block_size
+    return max(1, min(aligned, limit))
+
+
+def iter_windows(width, height, tile_size, overlap=0):
+    """
+    Génère les fenêtres de tuiles couvrant une image, ligne par ligne.
+    :param width: Largeur de l'image (pixels).
+    :param height: Hauteur de l'image (pixels).
+    :param tile_size: Taille des tuiles, entier ou tuple (largeur, hauteur).
+    :param overlap: Recouvrement (halo) ajouté de chaque côté de la tuile, en pixels.
+    :return: Générateur de BlockWindow.
+    """
+    if overlap < 0:
+        raise ValueError("Le recouvrement doit être positif ou nul.")
+    tile_x, tile_y = as_tile_shape(tile_size)
+
+    for yoff in range(0, height, tile_y):
+        ysize = min(tile_y, height - yoff)
+        read_yoff = max(0, yoff - overlap)
+        read_yend = min(height, yoff + ysize + overlap)
+        for xoff in range(0, width, tile_x):
+            xsize = min(tile_x, width - xoff)
+            read_xoff = max(0, xoff - overlap)
+            read_xend = min(width, xoff + xsize + overlap)
+            yield BlockWindow(xoff, yoff, xsize, ysize,
+                              read_xoff, read_yoff,
+                              read_xend - read_xoff, read_yend - read_yoff)
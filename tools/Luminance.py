@@ -5,18 +5,74 @@ Created on Thu Nov  7 11:27:04 2024
 @author: ablot
 """
 
+from functools import cached_property
+import importlib.util
+import os
 import imageio
 import numpy as np
 
+# Dossier des outils de ToolboxTMO, qui contient la définition des pondérations
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+toolbox_tools_dir = os.path.join(os.path.dirname(current_script_dir), 'ToolboxTMO', 'tools')
+
+
+# Fonction pour charger un module de manière dynamique
+def import_dynamic(module_name, module_path):
+    assert os.path.exists(module_path), f"Module introuvable : {module_path}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(f"Module '{module_name}' importé avec succès depuis {module_path}")
+    return module
+
+tools_luminance = import_dynamic("luminance", os.path.join(toolbox_tools_dir, 'luminance.py'))
+
+# Pondérations des canaux et résolution des poids : définition unique, partagée avec MantiukTMO
+LUMINANCE_WEIGHTS = tools_luminance.LUMINANCE_WEIGHTS
+resolve_weights = tools_luminance.resolve_weights
+
+
+def weighted_luminance(image, weights="mean", channel_axis=-1):
+    """
+    Calcule la luminance d'une image multicanal par une seule somme pondérée (einsum) sur l'axe
+    des canaux, accumulée en float32 : pas de débordement pour une entrée 8 ou 16 bits.
+    :param image: Tableau (hauteur, largeur, canaux) ou (canaux, hauteur, largeur) selon channel_axis.
+                  Une image 2D est retournée telle quelle, en float32.
+    :param weights: Pondération (cf. resolve_weights).
+    :param channel_axis: Axe des canaux (-1 ou 0).
+    :return: Luminance (hauteur, largeur) en float32.
+    """
+    if image.ndim == 2:
+        return image.astype(np.float32)
+    weights = resolve_weights(weights, image.shape[channel_axis])
+    subscripts = "c...,c->..." if channel_axis == 0 else "...c,c->..."
+    return np.einsum(subscripts, image, weights, dtype=np.float32, casting="same_kind")
+
+
 class LuminanceCalculator:
-    def __init__(self, image_path):
+    def __init__(self, image_path=None, weights="mean", reader=None):
         """
         Initialise la classe avec le chemin de l'image.
         :param image_path: chemin vers l'image .tif
+        :param weights: pondération des canaux : "rec709", "rec601", "mean" (par défaut, moyenne des canaux)
+                        ou suite de poids, un par canal.
+        :param reader: objet OpenGDAL (optionnel) : l'image est alors lue avec GDAL, et la luminance
+                       peut être calculée tuile par tuile (cf. iter_luminance_blocks).
+        """
+        self.image_path = image_path if image_path is not None else getattr(reader, "image_path", None)
+        self.weights = weights
+        self.reader = reader
+
+    @cached_property
+    def image(self):
+        """
+        Image chargée (une seule fois) : (hauteur, largeur, canaux) avec imageio,
+        (canaux, hauteur, largeur) avec un objet OpenGDAL.
         """
-        self.image_path = image_path
-        self.image = self.load_image()
-    
+        if self.reader is not None:
+            return self.reader.read_stack()
+        return self.load_image()
+
     def load_image(self):
         """
         Charge l'image à partir du fichier.
@@ -28,37 +84,43 @@ class LuminanceCalculator:
         except Exception as e:
             print(f"Erreur lors du chargement de l'image : {e}")
             return None
-    
-    def calculate_luminance(self):
+
+    @cached_property
+    def luminance(self):
         """
-        Calcule la luminance de l'image en utilisant une moyenne pondérée des canaux RGB.
-        :return: tableau numpy représentant la luminance de l'image
+        Luminance de l'image (float32), calculée une seule fois puis conservée.
         """
         if self.image is None:
             print("L'image n'a pas pu être chargée.")
             return None
-        
-        # Vérifier si l'image a trois canaux (RGB)
-        if len(self.image.shape) == 3 and self.image.shape[2] == 3:
-            # Extraire les canaux R, G, B
-            R = self.image[:, :, 0]
-            G = self.image[:, :, 1]
-            B = self.image[:, :, 2]
-
-            # Appliquer la formule de la luminance
-            # luminance = 0.2989 * R + 0.5870 * G + 0.1140 * B
-            luminance =(R + G + B)/3
-            return luminance
-        else:
-            print("L'image n'est pas en format RGB.")
-            return None
-    
+        return weighted_luminance(self.image, self.weights, channel_axis=0 if self.reader is not None else -1)
+
+    def calculate_luminance(self):
+        """
+        Calcule la luminance de l'image en utilisant une moyenne pondérée des canaux.
+        :return: tableau numpy (float32) représentant la luminance de l'image
+        """
+        return self.luminance
+
+    def iter_luminance_blocks(self, tile_size=None, bands=None):
+        """
+        Calcule la luminance tuile par tuile à partir des fenêtres de l'objet OpenGDAL,
+        sans charger l'image entière.
+        :param tile_size: taille des tuiles (cf. OpenGDAL.iter_blocks)
+        :param bands: bandes utilisées (cf. OpenGDAL.resolve_bands), par défaut toutes
+        :return: générateur de tuples (window, luminance float32 de la tuile)
+        """
+        if self.reader is None:
+            raise ValueError("La lecture par tuiles nécessite un objet OpenGDAL (paramètre reader).")
+        for window, stack in self.reader.iter_blocks(tile_size, normalize=False, bands=bands):
+            yield window, weighted_luminance(stack, self.weights, channel_axis=0)
+
     def save_luminance_image(self, output_path):
         """
         Sauvegarde l'image de luminance sous forme de fichier .tif.
         :param output_path: chemin où sauvegarder l'image luminance
         """
-        luminance = self.calculate_luminance()
+        luminance = self.luminance
         if luminance is not None:
             # Normaliser la luminance à 8 bits (0-255)
             luminance = np.clip(luminance, 0, 255).astype(np.uint8)